@@ -109,12 +109,18 @@ class clientIF(object):
         # visible to the rest of the code.
         self.channelListener = Listener(self.log)
         self.qga_poller = QemuGuestAgentPoller(self, log, scheduler)
+        self._libvirt_events = events.Dispatcher(
+            "libvirt/events", config.getint('vars', 'libvirt_event_workers'),
+            log=self.log)
         self.mom = None
         self.servers = {}
         self._broker_client = None
         self._subscriptions = defaultdict(list)
         self._scheduler = scheduler
         self._unknown_vm_ids = set()
+        # Images prepared in bulk during recovery, consumed by
+        # prepareVolumePath(). Keys are (domainID, imageID, volumeID).
+        self._prepared_images = {}
         if _glusterEnabled:
             self.gluster = gapi.GlusterApi()
         else:
@@ -127,6 +133,8 @@ class clientIF(object):
             self.mom = MomClient(config.get("mom", "socket_path"))
             self.mom.connect()
             secret.clear()
+            # Must be started before we connect to libvirt in recovery.
+            self._libvirt_events.start()
             concurrent.thread(self._recoverThread, name='vmrecovery').start()
             self.channelListener.settimeout(
                 config.getint('vars', 'guest_agent_timeout'))
@@ -392,6 +400,7 @@ class clientIF(object):
             secret.clear()
             self.channelListener.stop()
             self.qga_poller.stop()
+            self._libvirt_events.stop()
             if self.irs:
                 return self.irs.prepareForShutdown()
             else:
@@ -422,9 +431,13 @@ class clientIF(object):
             # PDIV drive format
             # Since version 4.2 cdrom may use a PDIV format
             if device in ("cdrom", "disk") and isVdsmImage(drive):
-                res = self.irs.prepareImage(
-                    drive['domainID'], drive['poolID'],
-                    drive['imageID'], drive['volumeID'])
+                res = self._prepared_images.pop(
+                    (drive['domainID'], drive['imageID'], drive['volumeID']),
+                    None)
+                if res is None:
+                    res = self.irs.prepareImage(
+                        drive['domainID'], drive['poolID'],
+                        drive['imageID'], drive['volumeID'])
 
                 if res['status']['code']:
                     raise vm.VolumeError(drive)
@@ -657,10 +670,20 @@ class clientIF(object):
         return eventid, v
 
     def dispatchLibvirtEvents(self, conn, dom, *args):
+        """
+        Called in the libvirt event loop thread. The event is handled later
+        by the libvirt events dispatcher, after the previous events of the
+        same VM.
+        """
         eventid, v = self.lookup_vm_from_event(dom, *args)
         if v is None:
             return
 
+        self._libvirt_events.dispatch(
+            v.id, eventid, partial(self._handleLibvirtEvent, v, dom, *args))
+
+    def _handleLibvirtEvent(self, v, dom, *args):
+        eventid = args[-1]
         try:
             # pylint cannot tell that unpacking the args tuple is safe, so we
             # must disbale this check here.
@@ -696,6 +719,9 @@ class clientIF(object):
                 v.onWatchdogEvent(action)
             elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED:
                 v.onJobCompleted(args)
+            elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_MIGRATION_ITERATION:
+                iteration, = args[:-1]
+                v.onMigrationIteration(iteration)
             elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED:
                 device_alias, = args[:-1]
                 v.onDeviceRemoved(device_alias)
@@ -738,19 +764,65 @@ class clientIF(object):
     def _preparePathsForRecoveredVMs(self):
         vm_objects = list(self.getVMs().values())
         num_vm_objects = len(vm_objects)
-        for idx, vm_obj in enumerate(vm_objects):
-            # Let's recover as much VMs as possible
+        self._prepareImagesForRecoveredVMs(vm_objects)
+        try:
+            for idx, vm_obj in enumerate(vm_objects):
+                # Let's recover as much VMs as possible
+                try:
+                    # Do not prepare volumes when system goes down
+                    if self._enabled:
+                        self.log.info(
+                            'recovery [%d/%d]: preparing paths for'
+                            ' domain %s', idx + 1, num_vm_objects, vm_obj.id)
+                        vm_obj.preparePaths()
+                except:
+                    self.log.exception(
+                        "recovery [%d/%d]: failed for vm %s",
+                        idx + 1, num_vm_objects, vm_obj.id)
+        finally:
+            self._prepared_images.clear()
+
+    def _prepareImagesForRecoveredVMs(self, vm_objects):
+        """
+        Prepare the images of all recovered VMs using a single bulk request,
+        so volumes on the same storage domain are activated together instead
+        of one image at a time.
+
+        Failures are not fatal; images which were not prepared here are
+        prepared by prepareVolumePath() as usual.
+        """
+        images = []
+        for vm_obj in vm_objects:
             try:
-                # Do not prepare volumes when system goes down
-                if self._enabled:
-                    self.log.info(
-                        'recovery [%d/%d]: preparing paths for'
-                        ' domain %s', idx + 1, num_vm_objects, vm_obj.id)
-                    vm_obj.preparePaths()
-            except:
+                drives = vm_obj.storage_drives()
+            except Exception:
                 self.log.exception(
-                    "recovery [%d/%d]: failed for vm %s",
-                    idx + 1, num_vm_objects, vm_obj.id)
+                    "recovery: cannot get drives for vm %s", vm_obj.id)
+                continue
+            for drive in drives:
+                if (drive.get('device') in ("cdrom", "disk") and
+                        isVdsmImage(drive)):
+                    images.append({
+                        'sdUUID': drive['domainID'],
+                        'spUUID': drive['poolID'],
+                        'imgUUID': drive['imageID'],
+                        'leafUUID': drive['volumeID'],
+                    })
+
+        if not images or not self._enabled:
+            return
+
+        self.log.info('recovery: preparing %d images', len(images))
+        res = self.irs.prepareImages(images)
+        if res['status']['code']:
+            self.log.warning('recovery: cannot prepare images: %s',
+                             res['status'])
+            return
+
+        for img, img_res in zip(images, res['images']):
+            if img_res['status']['code'] == 0:
+                key = (img['sdUUID'], img['imgUUID'], img['leafUUID'])
+                self._prepared_images[key] = img_res
 
     def _prepare_network_drive(self, drive, res):
         """
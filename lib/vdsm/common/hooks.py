@@ -24,6 +24,7 @@ from __future__ import division
 
 import glob
 import hashlib
+import importlib.util
 import itertools
 import json
 import logging
@@ -33,6 +34,9 @@ import pkgutil
 import subprocess
 import sys
 import tempfile
+import threading
+
+from xml.dom import minidom
 
 import six
 
@@ -48,7 +52,30 @@ _LAUNCH_FLAGS_PATH = os.path.join(
 )
 
 
-def _scriptsPerDir(dir_name):
+# Python hook plugins are installed in this sub directory of the hook
+# directory, e.g. /usr/libexec/vdsm/hooks/after_get_all_vm_stats/plugins/.
+_PLUGINS_DIR = 'plugins'
+
+# Set while running a hook plugin in this thread.
+_plugin_context = threading.local()
+
+
+class HookExit(SystemExit):
+    """
+    Raised by hooking.exit_hook() in hook plugins, keeping the message which
+    a script hook writes to stderr.
+    """
+
+    def __init__(self, message, code):
+        SystemExit.__init__(self, code)
+        self.message = message
+
+
+def running_plugin():
+    return getattr(_plugin_context, 'running', False)
+
+
+def _validateHookDir(dir_name):
     if os.path.isabs(dir_name):
         raise ValueError("Cannot use absolute path as hook directory")
     head = dir_name
@@ -56,15 +83,65 @@ def _scriptsPerDir(dir_name):
         head, tail = os.path.split(head)
         if tail == "..":
             raise ValueError("Hook directory paths cannot contain '..'")
+
+
+def _scriptsPerDir(dir_name):
+    _validateHookDir(dir_name)
     path = os.path.join(P_VDSM_HOOKS, dir_name, '*')
     return [s for s in glob.glob(path)
             if os.path.isfile(s) and os.access(s, os.X_OK)]
 
 
+def _pluginsPerDir(dir_name):
+    _validateHookDir(dir_name)
+    path = os.path.join(P_VDSM_HOOKS, dir_name, _PLUGINS_DIR, '*.py')
+    return [s for s in glob.glob(path) if os.path.isfile(s)]
+
+
 _DOMXML_HOOK = 1
 _JSON_HOOK = 2
 
 
+class _PluginCache(object):
+    """
+    Keep hook plugin modules imported, reloading a module only when the
+    plugin file was modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modules = {}  # {path: (mtime, module)}
+
+    def get(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._modules.get(path)
+            if entry is None or entry[0] != mtime:
+                entry = (mtime, self._load(path))
+                self._modules[path] = entry
+            return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._modules.clear()
+
+    def _load(self, path):
+        logging.info('Loading hook plugin %s', path)
+        hook_dir = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        plugin = os.path.splitext(os.path.basename(path))[0]
+        name = "vdsm_hook_plugin_%s_%s" % (hook_dir, plugin)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not callable(getattr(module, 'run', None)):
+            raise exception.HookError(
+                "Hook plugin %s does not define run()" % path)
+        return module
+
+
+_plugins = _PluginCache()
+
+
 def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
                  hookType=_DOMXML_HOOK):
     if errors is None:
@@ -73,7 +150,18 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
     scripts = _scriptsPerDir(dir)
     scripts.sort()
 
+    plugins = _pluginsPerDir(dir)
+    plugins.sort()
+
+    if plugins:
+        data, fatal = _runPlugins(data, plugins, vmconf, errors, params,
+                                  hookType)
+        if fatal:
+            scripts = []
+
     if not scripts:
+        if errors and raiseError:
+            raise exception.HookError(errors[-1])
         return data
 
     data_fd, data_filename = tempfile.mkstemp()
@@ -142,6 +230,80 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
         return json.loads(final_data)
 
 
+def _runPlugins(data, plugins, vmconf, errors, params, hookType):
+    """
+    Run Python hook plugins in process, in the same way scripts are run.
+
+    A plugin is a module defining a run(data, env) function. For domain xml
+    hooks data is a xml.dom.minidom.Document (or None if the hook has no
+    data), for JSON hooks data is the hook object. The plugin may modify data
+    in place, or return new data. env is a dict with the hook parameters and
+    vm custom properties, added to the environment of script hooks.
+
+    Like script hooks, a plugin fails by raising an exception, or by calling
+    hooking.exit_hook() or sys.exit() with a non-zero code. Exiting with code
+    2 skips the rest of the plugins and scripts.
+
+    Returns the modified data, and True if a plugin failed with a fatal
+    error.
+    """
+    env = dict(params)
+    env.update(vmconf.get('custom', {}))
+    if vmconf.get('vmId'):
+        env['vmId'] = vmconf.get('vmId')
+
+    if hookType == _DOMXML_HOOK:
+        obj = minidom.parseString(data.encode('utf-8')) if data else None
+    else:
+        obj = data
+
+    fatal = False
+    for path in plugins:
+        rc = 0
+        err = ''
+        try:
+            plugin = _plugins.get(path)
+            _plugin_context.running = True
+            try:
+                result = plugin.run(obj, env)
+            finally:
+                _plugin_context.running = False
+            if result is not None:
+                obj = result
+        except SystemExit as e:
+            if e.code is None:
+                rc = 0
+            elif isinstance(e.code, int):
+                rc = e.code
+            else:
+                rc = 1  # sys.exit(message)
+            if isinstance(e, HookExit):
+                err = e.message
+            else:
+                err = str(e.code) if rc else ''
+        except Exception as e:
+            logging.exception('Hook plugin %s failed', path)
+            rc = 1
+            err = str(e)
+
+        logging.info('%s: rc=%s err=%s', path, rc, err)
+        if rc != 0:
+            errors.append(err)
+
+        if rc == 2:
+            fatal = True
+            break
+        elif rc > 2:
+            logging.warning('hook returned unexpected return code %s', rc)
+
+    if hookType == _DOMXML_HOOK:
+        if obj is None:
+            return data, fatal
+        return obj.toxml(encoding='utf-8').decode('utf-8'), fatal
+    else:
+        return obj, fatal
+
+
 def before_device_create(devicexml, vmconf={}, customProperties={}):
     return _runHooksDir(devicexml, 'before_device_create', vmconf=vmconf,
                         params=customProperties)
@@ -471,8 +633,13 @@ def remove_vm_launch_flags_file(vm_id):
 
 
 def _getHookInfo(dir):
-    return dict((os.path.basename(script), _getScriptInfo(script))
+    info = dict((os.path.basename(script), _getScriptInfo(script))
                 for script in _scriptsPerDir(dir))
+    info.update(
+        (os.path.join(_PLUGINS_DIR, os.path.basename(plugin)),
+         _getScriptInfo(plugin))
+        for plugin in _pluginsPerDir(dir))
+    return info
 
 
 def installed():
@@ -190,6 +190,7 @@ def get(target=None, killOnFailure=True):
                            libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB_2,
                            libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG,
                            libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED,
+                           libvirt.VIR_DOMAIN_EVENT_ID_MIGRATION_ITERATION,
                            libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
                            libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_THRESHOLD,
                            libvirt.VIR_DOMAIN_EVENT_ID_AGENT_LIFECYCLE):
@@ -24,6 +24,7 @@ import logging
 
 from vdsm.common import cmdutils
 from vdsm.common import commands
+from vdsm.common.compat import subprocess
 
 _UDEVADM = cmdutils.CommandPath(
     "udevadm", "/sbin/udevadm", "/usr/sbin/udevadm")
@@ -105,6 +106,60 @@ def info(device):
     return out.decode('utf-8')
 
 
+class Monitor(object):
+    """
+    Report udev events using "udevadm monitor".
+
+    Iterating over the monitor yields a dict of the properties of every udev
+    event, until the monitor is stopped. Events are reported after udev
+    rules processing, so they include properties like DM_NAME.
+    """
+
+    def __init__(self, subsystem_matches=()):
+        self._subsystem_matches = subsystem_matches
+        self._proc = None
+
+    def start(self):
+        """
+        Start monitoring, returning when udevadm is ready to report events.
+
+        Raises cmdutils.Error if udevadm failed to start.
+        """
+        cmd = [_UDEVADM.cmd, 'monitor', '--udev', '--property']
+        for name in self._subsystem_matches:
+            cmd.append('--subsystem-match={}'.format(name))
+
+        self._proc = commands.start(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        # udevadm prints a header, and a line for every monitor it set up.
+        for line in self._proc.stdout:
+            if line.startswith(b'UDEV - '):
+                return
+
+        out, err = self._proc.communicate()
+        raise cmdutils.Error(cmd, self._proc.returncode, out, err)
+
+    def stop(self):
+        if self._proc is not None:
+            commands.terminate(self._proc)
+
+    def __iter__(self):
+        event = {}
+        for line in self._proc.stdout:
+            line = line.rstrip(b'\n')
+            if not line:
+                # Events are separated by an empty line.
+                if event:
+                    yield event
+                    event = {}
+                continue
+            name, sep, value = line.partition(b'=')
+            if sep:
+                event[name.decode('utf-8')] = value.decode(
+                    'utf-8', 'replace')
+
+
 def _run_command(args):
     cmd = [_UDEVADM.cmd]
     cmd.extend(args)
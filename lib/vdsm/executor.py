@@ -72,7 +72,7 @@ class Executor(object):
     _log = logging.getLogger('Executor')
 
     def __init__(self, name, workers_count, max_tasks, scheduler,
-                 max_workers=None, log=None):
+                 max_workers=None, log=None, wait_histogram=None):
         """
         :param name: Name of the executor; no special purpose, just for
           logging and debugging.
@@ -97,6 +97,9 @@ class Executor(object):
         :param log: logger instance to override the default logger. This is
           useful for testing
         :type log: logger as returned by logging.getLogger()
+        :param wait_histogram: if set, the time every task waited in the
+          queue before execution is added to this histogram.
+        :type wait_histogram: `vdsm.metrics.histogram.Histogram` instance
 
         """
         self._name = name
@@ -105,6 +108,7 @@ class Executor(object):
         self._worker_id = 0
         self._tasks = TaskQueue(name, max_tasks)
         self._scheduler = scheduler
+        self._wait_histogram = wait_histogram
         if log is not None:
             self._log = log
         self._workers = set()
@@ -243,6 +247,8 @@ class Executor(object):
         task = self._tasks.get()
         if task is _STOP:
             raise NotRunning()
+        if self._wait_histogram is not None:
+            self._wait_histogram.add(time.monotonic_time() - task.queued)
         return task
 
     # Private
@@ -378,6 +384,7 @@ class Task(object):
         self._callable = callable
         self.timeout = timeout
         self.discard = discard
+        self.queued = time.monotonic_time()
         self._start = None
 
     @property
@@ -22,16 +22,20 @@ from __future__ import absolute_import
 from __future__ import division
 
 import calendar
+import copy
 import errno
 import logging
 import os
 import socket
+import threading
 import time
 import xml.etree.ElementTree as etree
 
 from vdsm.common import cmdutils
 from vdsm.common import commands
 from vdsm.common.compat import subprocess
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
 from vdsm.network.netinfo import addresses
 
 from . import exception as ge
@@ -45,6 +49,10 @@ _TIME_ZONE = time.tzname[0]
 
 _DEFAULT_TIMEOUT = 120  # secs
 
+# Commands including any of these words do not modify the cluster.
+_READ_ONLY_WORDS = frozenset(
+    ["info", "status", "list", "get", "help-xml"])
+
 if hasattr(etree, 'ParseError'):
     _etreeExceptions = (etree.ParseError, AttributeError, ValueError)
 else:
@@ -106,11 +114,72 @@ class SnapshotStatus:
     DEACTIVATED = 'DEACTIVATED'
 
 
+class _ResultCache(object):
+    """
+    Keep results of gluster commands reporting the cluster status for ttl
+    seconds.
+
+    Engine polls volumes and peers status for every volume, running the
+    same slow commands many times. The cache is invalidated when running a
+    command that may modify the cluster, so vdsm reports its own changes
+    immediately.
+    """
+
+    def __init__(self, ttl, clock=monotonic_time):
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._results = {}
+        # Incremented on invalidation, so results of commands started
+        # before invalidation are not cached.
+        self._generation = 0
+
+    @property
+    def enabled(self):
+        return self._ttl > 0
+
+    def get(self, key, func):
+        """
+        Return the cached result for key, or call func and cache its result.
+        The returned value is shared and must not be modified.
+        """
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and entry[0] > self._clock():
+                return entry[1]
+            generation = self._generation
+
+        value = func()
+
+        if self.enabled:
+            with self._lock:
+                if generation == self._generation:
+                    self._results[key] = (self._clock() + self._ttl, value)
+
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._results.clear()
+
+
+_cache = _ResultCache(config.getint('gluster', 'cli_cache_ttl'))
+
+
+def _invalidateCache(cmd):
+    if not _READ_ONLY_WORDS.intersection(cmd[2:]):
+        _cache.invalidate()
+
+
 def _execGluster(cmd):
     try:
         return commands.run(cmd)
     except cmdutils.Error as e:
         raise ge.GlusterCmdFailedException(rc=e.rc, err=[e.msg])
+    finally:
+        # The command may have modified the cluster even if it failed.
+        _invalidateCache(cmd)
 
 
 def _getTree(out):
@@ -136,7 +205,19 @@ def _execGlusterXml(cmd):
 
 def _execGlusterXmlWithTimeout(cmd, timeout=_DEFAULT_TIMEOUT):
     cmd.append('--xml')
-    cmd = cmdutils.wrap_command(cmd)
+    try:
+        out, err, rc = _runWithTimeout(cmdutils.wrap_command(cmd), timeout)
+    finally:
+        # The command may have modified the cluster even if it failed.
+        _invalidateCache(cmd)
+
+    if rc != 0:
+        raise ge.GlusterCmdExecFailedException(rc, out, err)
+
+    return _getTree(out)
+
+
+def _runWithTimeout(cmd, timeout):
     logging.debug(cmdutils.command_log_line(cmd))
     proc = subprocess.Popen(
         cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -147,11 +228,7 @@ def _execGlusterXmlWithTimeout(cmd, timeout=_DEFAULT_TIMEOUT):
         raise ge.GlusterCommandTimeoutException(proc.returncode)
 
     logging.debug(cmdutils.retcode_log_line(proc.returncode, err))
-    if proc.returncode != 0:
-        raise ge.GlusterCmdExecFailedException(
-            proc.returncode, out, err)
-
-    return _getTree(out)
+    return out, err, proc.returncode
 
 
 def _getLocalIpAddress():
@@ -179,7 +256,7 @@ def hostUUIDGet():
     """
 
     command = _getGlusterSystemCmd() + ["uuid", "get"]
-    out = _execGluster(command)
+    out = _cache.get(("uuid",), lambda: _execGluster(command))
     out = out.decode("utf-8")
     if not out.startswith('UUID: '):
         raise ge.GlusterHostUUIDNotFoundException()
@@ -234,6 +311,21 @@ def _parseVolumeStatus(tree):
     return status
 
 
+def _splitVolumesStatus(tree):
+    """
+    Split output of "volume status all" to per volume trees, as reported by
+    "volume status VOLNAME".
+    """
+    trees = {}
+    for volume in tree.findall('volStatus/volumes/volume'):
+        root = etree.Element(tree.tag)
+        volumes = etree.SubElement(etree.SubElement(root, 'volStatus'),
+                                   'volumes')
+        volumes.append(volume)
+        trees[volume.find('volName').text] = root
+    return trees
+
+
 def _parseVolumeStatusDetail(tree):
     status = {'name': tree.find('volStatus/volumes/volume/volName').text,
               'bricks': []}
@@ -377,6 +469,14 @@ def volumeStatus(volumeName, brick=None, option=None):
                                    'padddedSizeOf': int,
                                    'poolMisses': int},...]}, ...]}
     """
+    if not brick and _cache.enabled:
+        # Get the status of all volumes in one command, used for the next
+        # calls for other volumes. Volumes which are not started are
+        # missing, so we run the command for the volume to report the error.
+        volumes = _allVolumesStatus(option)
+        if volumeName in volumes:
+            return copy.deepcopy(volumes[volumeName])
+
     command = _getGlusterVolCmd() + ["status", volumeName]
     if brick:
         command.append(brick)
@@ -387,18 +487,47 @@ def volumeStatus(volumeName, brick=None, option=None):
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeStatusFailedException(rc=e.rc, err=e.err)
     try:
-        if option == 'detail':
-            return _parseVolumeStatusDetail(xmltree)
-        elif option == 'clients':
-            return _parseVolumeStatusClients(xmltree)
-        elif option == 'mem':
-            return _parseVolumeStatusMem(xmltree)
-        else:
-            return _parseVolumeStatus(xmltree)
+        return _parseVolumeStatusOption(xmltree, option)
     except _etreeExceptions:  # pylint: disable=catching-non-exception
         raise ge.GlusterXmlErrorException(err=[etree.tostring(xmltree)])
 
 
+def _parseVolumeStatusOption(tree, option):
+    if option == 'detail':
+        return _parseVolumeStatusDetail(tree)
+    elif option == 'clients':
+        return _parseVolumeStatusClients(tree)
+    elif option == 'mem':
+        return _parseVolumeStatusMem(tree)
+    else:
+        return _parseVolumeStatus(tree)
+
+
+def _allVolumesStatus(option=None):
+    """
+    Return dict of volume name: status for all started volumes, or an empty
+    dict if the status could not be collected. The returned value is shared
+    and must not be modified.
+    """
+    def collect():
+        command = _getGlusterVolCmd() + ["status", "all"]
+        if option:
+            command.append(option)
+        try:
+            xmltree = _execGlusterXml(command)
+            return {name: _parseVolumeStatusOption(tree, option)
+                    for name, tree in _splitVolumesStatus(xmltree).items()}
+        except (ge.GlusterCmdFailedException,
+                ge.GlusterXmlErrorException) as e:
+            logging.debug("Cannot get status of all volumes: %s", e)
+            return {}
+        except _etreeExceptions:  # pylint: disable=catching-non-exception
+            logging.debug("Cannot parse status of all volumes")
+            return {}
+
+    return _cache.get(("volume-status", option), collect)
+
+
 def _parseVolumeInfo(tree):
     """
         {VOLUMENAME: {'brickCount': BRICKCOUNT,
@@ -529,6 +658,19 @@ def volumeInfo(volumeName=None, remoteServer=None):
                       'volumeStatus': STATUS,
                       'volumeType': TYPE}, ...}
     """
+    if not remoteServer:
+        # Info of all volumes is used for the next calls for any volume.
+        volumes = _cache.get(("volume-info",), _volumeInfo)
+        if not volumeName:
+            return copy.deepcopy(volumes)
+        if volumeName in volumes:
+            return {volumeName: copy.deepcopy(volumes[volumeName])}
+        # Report the error for missing volume.
+
+    return _volumeInfo(volumeName, remoteServer)
+
+
+def _volumeInfo(volumeName=None, remoteServer=None):
     command = _getGlusterVolCmd() + ["info"]
     if remoteServer:
         command += ['--remote-host=%s' % remoteServer]
@@ -946,7 +1088,8 @@ def peerStatus():
     """
     command = _getGlusterPeerCmd() + ["status"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _cache.get(("peer-status",),
+                             lambda: _execGlusterXml(command))
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterHostsListFailedException(rc=e.rc, err=e.err)
     try:
@@ -83,6 +83,9 @@ def exit_hook(message, return_code=2):
     error stream. A newline will be printed at the end.
     The default return code is 2 for signaling that an error occurred.
     """
+    if hooks.running_plugin():
+        # vdsm reports the message of the plugin in the hook error.
+        raise hooks.HookExit(message, return_code)
     sys.stderr.write(message + "\n")
     sys.exit(return_code)
 
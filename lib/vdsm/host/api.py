@@ -76,6 +76,7 @@ def get_stats(cif, sample, multipath=False):
     if ret['haStats']['configured']:
         # For backwards compatibility, will be removed in the future
         ret['haScore'] = ret['haStats']['score']
+    ret['samplingStats'] = metrics.histograms_info('sampling.')
 
     ret = hooks.after_get_stats(ret)
     return ret
@@ -96,6 +97,8 @@ def send_metrics(hoststats):
     except KeyError:
         logging.exception('Host metrics collection failed')
 
+    metrics.send_histograms('sampling.')
+
 
 def _readSwapTotalFree():
     meminfo = utils.readMemInfo()
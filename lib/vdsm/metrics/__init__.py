@@ -22,10 +22,16 @@ from __future__ import absolute_import
 from __future__ import division
 
 import importlib
+import threading
+
 from ..config import config
+from .histogram import Histogram
 
 _reporter = None
 
+_histograms = {}
+_histograms_lock = threading.Lock()
+
 
 def start():
     global _reporter
@@ -46,3 +52,40 @@ def stop():
 def send(report):
     if _reporter:
         _reporter.send(report)
+
+
+def get_histogram(name, bounds):
+    """
+    Return the histogram registered with name, registering a new histogram
+    with the given bucket bounds if needed.
+    """
+    with _histograms_lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram(bounds)
+        return hist
+
+
+def histograms_info(prefix=""):
+    """
+    Return a dict mapping the names of the registered histograms starting
+    with prefix to their info.
+    """
+    with _histograms_lock:
+        hists = list(_histograms.items())
+    return {name: hist.info() for name, hist in hists
+            if name.startswith(prefix)}
+
+
+def send_histograms(prefix=""):
+    """
+    Send the registered histograms starting with prefix to the reporter.
+    """
+    if _reporter:
+        with _histograms_lock:
+            hists = list(_histograms.items())
+        report = {}
+        for name, hist in hists:
+            if name.startswith(prefix):
+                report.update(hist.report(name))
+        send(report)
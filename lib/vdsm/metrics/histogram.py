@@ -0,0 +1,111 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import bisect
+import threading
+
+# Bucket bounds, in seconds, suitable for most latencies.
+TIME_BOUNDS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 15, 30, 60, 120)
+
+# Bucket bounds suitable for counts of items, e.g. domains.
+COUNT_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Label of the bucket of the values larger than all the bounds.
+INF = 'inf'
+
+
+class Histogram(object):
+    """
+    Count values in buckets with fixed upper bounds.
+
+    Buckets are cumulative: every bucket counts the values lower or equal to
+    its bound, so the last bucket counts all the values. Adding a value is
+    cheap and does not allocate memory, so histograms can be updated on hot
+    paths.
+    """
+
+    def __init__(self, bounds):
+        if list(bounds) != sorted(bounds):
+            raise ValueError("Bounds must be sorted: %s" % (bounds,))
+        self._bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0
+        self._max = 0
+
+    def add(self, value):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def info(self):
+        """
+        Return the histogram state:
+        {
+            "count": number of values,
+            "sum": sum of the values,
+            "max": largest value,
+            "buckets": {"bound": number of values <= bound, ..., "inf": count}
+        }
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            largest = self._max
+
+        buckets = {}
+        count = 0
+        for bound, bucket_count in zip(self._labels(), counts):
+            count += bucket_count
+            buckets[bound] = count
+
+        return {
+            "count": count,
+            "sum": float(total),
+            "max": float(largest),
+            "buckets": buckets,
+        }
+
+    def report(self, prefix):
+        """
+        Return the histogram as metrics report, sending every value as
+        prefix.name.
+        """
+        info = self.info()
+        report = {
+            prefix + ".count": info["count"],
+            prefix + ".sum": info["sum"],
+            prefix + ".max": info["max"],
+        }
+        for label, count in info["buckets"].items():
+            # Metric names use "." as separator.
+            report[prefix + ".le_" + label.replace(".", "_")] = count
+        return report
+
+    def _labels(self):
+        for bound in self._bounds:
+            yield "%g" % bound
+        yield INF
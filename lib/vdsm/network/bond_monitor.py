@@ -20,8 +20,7 @@
 import logging
 import threading
 
-from vdsm.common import concurrent
-from vdsm.network.netlink import monitor
+from vdsm.network.netlink import reactor
 
 _monitor_instance = None
 _monitor_lock = threading.Lock()
@@ -30,10 +29,7 @@ _monitor_lock = threading.Lock()
 class Monitor(object):
     def __init__(self):
         self._handlers = []
-        self._nl_monitor = monitor.ifla_monitor(groups=('link',))
-        self._thread = concurrent.thread(
-            self.serve_forever, name='bond-monitor'
-        )
+        self._subscription = None
 
     @staticmethod
     def instance():
@@ -46,14 +42,14 @@ class Monitor(object):
 
     def start(self):
         logging.info('Starting Bond monitor.')
-        self._nl_monitor.start()
-        self._thread.start()
+        self._subscription = reactor.Reactor.instance().subscribe(
+            ('link',), self.handle_event, event_filter=_is_ifla_event
+        )
 
     def stop(self):
         logging.info('Stopping Bond monitor.')
-        self._nl_monitor.stop()
-        self._nl_monitor.wait()
-        self._thread.join()
+        reactor.Reactor.instance().unsubscribe(self._subscription)
+        self._subscription = None
 
     def add_handler(self, handler):
         self._handlers.append(handler)
@@ -62,9 +58,9 @@ class Monitor(object):
         for handler in self._handlers:
             handler(event)
 
-    def serve_forever(self):
-        for event in self._nl_monitor:
-            self.handle_event(event)
+
+def _is_ifla_event(event):
+    return 'IFLA_EVENT' in event
 
 
 def initialize_monitor(cif):
@@ -119,28 +119,31 @@ def _fresh_qdisc_conf_out(dev, vlan_tag, class_id, qos):
         ):  # No ingress exists
             raise
 
-    tc.qdisc.add(
-        dev,
-        _SHAPING_QDISC_KIND,
-        handle='0x' + _ROOT_QDISC_HANDLE,
-        default='%#x' % _NON_VLANNED_ID,
-    )
-    tc.qdisc.add(dev, 'ingress')
+    with tc.batch():
+        tc.qdisc.add(
+            dev,
+            _SHAPING_QDISC_KIND,
+            handle='0x' + _ROOT_QDISC_HANDLE,
+            default='%#x' % _NON_VLANNED_ID,
+        )
+        tc.qdisc.add(dev, 'ingress')
 
-    # Add traffic classes
-    _add_hfsc_cls(dev, _ROOT_QDISC_HANDLE, class_id, **qos)
-    if class_id != _DEFAULT_CLASSID:  # We need to add a default class
-        _add_hfsc_cls(dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID, ls=qos['ls'])
+        # Add traffic classes
+        _add_hfsc_cls(dev, _ROOT_QDISC_HANDLE, class_id, **qos)
+        if class_id != _DEFAULT_CLASSID:  # We need to add a default class
+            _add_hfsc_cls(
+                dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID, ls=qos['ls']
+            )
 
-    # Add filters to move the traffic into the classes we just created
-    _add_non_vlanned_filter(dev, _ROOT_QDISC_HANDLE)
-    if class_id != _DEFAULT_CLASSID:
-        _add_vlan_filter(dev, vlan_tag, _ROOT_QDISC_HANDLE, class_id)
+        # Add filters to move the traffic into the classes we just created
+        _add_non_vlanned_filter(dev, _ROOT_QDISC_HANDLE)
+        if class_id != _DEFAULT_CLASSID:
+            _add_vlan_filter(dev, vlan_tag, _ROOT_QDISC_HANDLE, class_id)
 
-    # Add inside intra-class fairness qdisc (fq_codel)
-    _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, class_id)
-    if class_id != _DEFAULT_CLASSID:
-        _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID)
+        # Add inside intra-class fairness qdisc (fq_codel)
+        _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, class_id)
+        if class_id != _DEFAULT_CLASSID:
+            _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID)
 
 
 def _qdisc_conf_out(dev, root_qdisc_handle, vlan_tag, class_id, qos):
@@ -171,30 +174,34 @@ def _qdisc_conf_out(dev, root_qdisc_handle, vlan_tag, class_id, qos):
         if tce.errCode != errno.ENOENT:
             raise
 
-    _add_hfsc_cls(dev, root_qdisc_handle, class_id, **qos)
-    if class_id == _DEFAULT_CLASSID:
-        _add_non_vlanned_filter(dev, root_qdisc_handle)
-    else:
-        if not _is_explicit_defined_default_class(dev):
-            (default_class,) = [
-                c['hfsc']
-                for c in tc.classes(dev)
-                if c['handle'] == _ROOT_QDISC_HANDLE + _DEFAULT_CLASSID
-            ]
-            ls_max_rate = _max_hfsc_ls_rate(dev)
-            default_class['ls']['m2'] = ls_max_rate
-
-            tc.cls.delete(dev, classid=_ROOT_QDISC_HANDLE + _DEFAULT_CLASSID)
-            _add_hfsc_cls(
-                dev,
-                _ROOT_QDISC_HANDLE,
-                _DEFAULT_CLASSID,
-                ls=default_class['ls'],
-            )
-            _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID)
-
-        _add_vlan_filter(dev, vlan_tag, root_qdisc_handle, class_id)
-    _add_fair_qdisc(dev, root_qdisc_handle, class_id)
+    # Queries issued while batching send the queued requests first
+    with tc.batch():
+        _add_hfsc_cls(dev, root_qdisc_handle, class_id, **qos)
+        if class_id == _DEFAULT_CLASSID:
+            _add_non_vlanned_filter(dev, root_qdisc_handle)
+        else:
+            if not _is_explicit_defined_default_class(dev):
+                (default_class,) = [
+                    c['hfsc']
+                    for c in tc.classes(dev)
+                    if c['handle'] == _ROOT_QDISC_HANDLE + _DEFAULT_CLASSID
+                ]
+                ls_max_rate = _max_hfsc_ls_rate(dev)
+                default_class['ls']['m2'] = ls_max_rate
+
+                tc.cls.delete(
+                    dev, classid=_ROOT_QDISC_HANDLE + _DEFAULT_CLASSID
+                )
+                _add_hfsc_cls(
+                    dev,
+                    _ROOT_QDISC_HANDLE,
+                    _DEFAULT_CLASSID,
+                    ls=default_class['ls'],
+                )
+                _add_fair_qdisc(dev, _ROOT_QDISC_HANDLE, _DEFAULT_CLASSID)
+
+            _add_vlan_filter(dev, vlan_tag, root_qdisc_handle, class_id)
+        _add_fair_qdisc(dev, root_qdisc_handle, class_id)
 
 
 def _add_vlan_filter(dev, vlan_tag, root_qdisc_handle, class_id):
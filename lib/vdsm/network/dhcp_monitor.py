@@ -21,8 +21,7 @@ from contextlib import contextmanager
 import logging
 import threading
 
-from vdsm.common import concurrent
-from vdsm.network.netlink import monitor
+from vdsm.network.netlink import reactor
 from vdsm.network.ip.address import IPAddressData
 
 
@@ -74,12 +73,7 @@ class Monitor(object):
 
     def __init__(self):
         self._handlers = []
-        self._nl_monitor = monitor.object_monitor(
-            groups=('ipv4-ifaddr', 'ipv6-ifaddr')
-        )
-        self._thread = concurrent.thread(
-            self.serve_forever, name='dhcp-monitor'
-        )
+        self._subscription = None
 
     @staticmethod
     def instance(**kwargs):
@@ -92,14 +86,14 @@ class Monitor(object):
 
     def start(self):
         logging.info('Starting DHCP monitor.')
-        self._nl_monitor.start()
-        self._thread.start()
+        self._subscription = reactor.Reactor.instance().subscribe(
+            ('ipv4-ifaddr', 'ipv6-ifaddr'), self.handle_event
+        )
 
     def stop(self):
         logging.info('Stopping DHCP monitor.')
-        self._nl_monitor.stop()
-        self._nl_monitor.wait()
-        self._thread.join()
+        reactor.Reactor.instance().unsubscribe(self._subscription)
+        self._subscription = None
 
     def add_handler(self, handler):
         self._handlers.append(handler)
@@ -108,10 +102,6 @@ class Monitor(object):
         for handler in self._handlers:
             handler(event)
 
-    def serve_forever(self):
-        for event in self._nl_monitor:
-            self.handle_event(event)
-
 
 class EventField(object):
     class Scope(object):
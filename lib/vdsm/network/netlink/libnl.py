@@ -1082,6 +1082,77 @@ def rtnl_route_nh_get_gateway(next_hop):
     return _rtnl_route_nh_get_gateway(next_hop)
 
 
+def rtnl_qdisc_alloc_cache(socket):
+    """Allocate a qdisc cache and fill in all configured qdiscs.
+
+    @arg socket          Netlink socket.
+
+    @note The caller is responsible for destroying and freeing the
+          cache after using it.
+
+    @return Newly allocated cache with qdiscs obtained from kernel.
+    """
+    _rtnl_qdisc_alloc_cache = _libnl_route(
+        'rtnl_qdisc_alloc_cache', c_int, c_void_p, c_void_p
+    )
+    cache = c_void_p()
+    err = _rtnl_qdisc_alloc_cache(socket, byref(cache))
+    if err:
+        raise IOError(-err, nl_geterror(err))
+    return cache
+
+
+def rtnl_tc_get_ifindex(tc):
+    """Return interface index of traffic control object.
+
+    @arg tc              Traffic control object (qdisc, class or classifier)
+
+    @return Interface index.
+    """
+    _rtnl_tc_get_ifindex = _libnl_route(
+        'rtnl_tc_get_ifindex', c_int, c_void_p
+    )
+    return _rtnl_tc_get_ifindex(tc)
+
+
+def rtnl_tc_get_handle(tc):
+    """Return identifier of traffic control object.
+
+    @arg tc              Traffic control object (qdisc, class or classifier)
+
+    @return 32 bit handle, the major number in the upper 16 bits.
+    """
+    _rtnl_tc_get_handle = _libnl_route(
+        'rtnl_tc_get_handle', c_uint32, c_void_p
+    )
+    return _rtnl_tc_get_handle(tc)
+
+
+def rtnl_tc_get_parent(tc):
+    """Return parent identifier of traffic control object.
+
+    @arg tc              Traffic control object (qdisc, class or classifier)
+
+    @return 32 bit parent handle, TC_H_ROOT for root objects.
+    """
+    _rtnl_tc_get_parent = _libnl_route(
+        'rtnl_tc_get_parent', c_uint32, c_void_p
+    )
+    return _rtnl_tc_get_parent(tc)
+
+
+def rtnl_tc_get_kind(tc):
+    """Return kind of traffic control object.
+
+    @arg tc              Traffic control object (qdisc, class or classifier)
+
+    @return Kind (kernel's TCA_KIND) or None if not set.
+    """
+    _rtnl_tc_get_kind = _libnl_route('rtnl_tc_get_kind', c_char_p, c_void_p)
+    kind = _rtnl_tc_get_kind(tc)
+    return conversion_util.to_str(kind) if kind else None
+
+
 def c_object_argument(argument):
     """Prepare prepare Python object to be used as an C argument.
 
@@ -20,6 +20,7 @@
 from __future__ import absolute_import
 from __future__ import division
 from contextlib import closing, contextmanager
+import ctypes
 import logging
 import os
 import select
@@ -74,6 +75,14 @@ def ifla_monitor(groups=frozenset(), timeout=None, silent_timeout=False):
     return Monitor(_c_ifla_event_input, groups, timeout, silent_timeout)
 
 
+def event_monitor(groups=frozenset(), timeout=None, silent_timeout=False):
+    """
+    Monitor reporting both the events of object_monitor() and
+    ifla_monitor().
+    """
+    return Monitor(_c_all_event_input, groups, timeout, silent_timeout)
+
+
 class Monitor:
     """Netlink monitor. Usage:
 
@@ -298,6 +307,20 @@ def _event_input(msg, c_queue):
 _c_event_input = libnl.prepare_cfunction_for_nl_socket_modify_cb(_event_input)
 
 
+def _all_event_input(msg, c_queue):
+    """This function serves as a callback for netlink socket, reporting both
+    the IFLA event and the objects of the message.
+    """
+    _ifla_event_input(msg, ctypes.cast(c_queue, ctypes.py_object).value)
+    libnl.nl_msg_parse(msg, _c_object_input, c_queue)
+    return libnl.NlCbAction.NL_STOP
+
+
+_c_all_event_input = libnl.prepare_cfunction_for_nl_socket_modify_cb(
+    _all_event_input
+)
+
+
 @contextmanager
 def _monitoring_socket(queue, groups, epoll, c_callback_function):
     c_queue = libnl.c_object_argument(queue)
@@ -0,0 +1,79 @@
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from functools import partial
+import errno
+
+from . import _cache_manager
+from . import _pool
+from . import libnl
+from .link import _nl_link_cache, _link_index_to_name
+
+TC_H_ROOT = 0xFFFFFFFF
+
+
+def iter_qdiscs(dev=None):
+    """Generator that yields an information dictionary for each qdisc of dev,
+    or of all the devices if dev is None.
+
+    Only the general qdisc attributes are reported, formatted the same way
+    `tc qdisc show` formats them."""
+    with _pool.socket() as sock:
+        with _nl_qdisc_cache(sock) as qdisc_cache:
+            with _nl_link_cache(sock) as link_cache:  # for index to name
+                qdisc = libnl.nl_cache_get_first(qdisc_cache)
+                while qdisc:
+                    data = _qdisc_info(qdisc, link_cache=link_cache)
+                    if dev is None or data.get('dev') == dev:
+                        yield data
+                    qdisc = libnl.nl_cache_get_next(qdisc)
+
+
+def _qdisc_info(qdisc, link_cache=None):
+    """Returns a dictionary with the qdisc information."""
+    data = {
+        'kind': libnl.rtnl_tc_get_kind(qdisc),
+        'handle': '%x:' % (libnl.rtnl_tc_get_handle(qdisc) >> 16),
+    }
+    parent = libnl.rtnl_tc_get_parent(qdisc)
+    if parent == TC_H_ROOT:
+        data['root'] = True
+    elif parent:
+        data['parent'] = handle_str(parent)
+    try:
+        data['dev'] = _link_index_to_name(
+            libnl.rtnl_tc_get_ifindex(qdisc), cache=link_cache
+        )
+    except IOError as err:
+        if err.errno != errno.ENODEV:
+            raise
+    return data
+
+
+def handle_str(handle):
+    """Returns the textual representation of a 32 bit tc handle."""
+    major, minor = handle >> 16, handle & 0xFFFF
+    if not major:
+        return ':%x' % minor
+    if not minor:
+        return '%x:' % major
+    return '%x:%x' % (major, minor)
+
+
+_nl_qdisc_cache = partial(_cache_manager, libnl.rtnl_qdisc_alloc_cache)
@@ -0,0 +1,177 @@
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Shared netlink events reactor.
+
+Every netlink monitor opens a netlink socket and runs two threads, one
+receiving the events and one consuming them. Long running consumers
+subscribe to the reactor instead, sharing one monitor of all the groups
+the subscribers are interested in. Events are dispatched to the
+subscribers of the event group, matching the subscriber filter.
+
+Handlers are called from the reactor thread, so they must not block, and
+must not subscribe or unsubscribe.
+"""
+
+import logging
+import threading
+
+from vdsm.common import concurrent
+
+from . import monitor
+
+_reactor_instance = None
+_reactor_lock = threading.Lock()
+
+
+class Subscription(object):
+    def __init__(self, groups, handler, event_filter=None):
+        self.groups = frozenset(groups)
+        self.handler = handler
+        self.event_filter = event_filter
+
+    def matches(self, event, group):
+        if group is not None and group not in self.groups:
+            return False
+        return self.event_filter is None or self.event_filter(event)
+
+
+class Reactor(object):
+    def __init__(self, monitor_factory=monitor.event_monitor):
+        self._monitor_factory = monitor_factory
+        self._lock = threading.Lock()
+        # Replaced on updates, so the reactor thread can use it without
+        # taking the lock.
+        self._subscriptions = ()
+        self._groups = frozenset()
+        self._monitor = None
+        self._thread = None
+
+    @staticmethod
+    def instance():
+        global _reactor_instance
+        if _reactor_instance is None:
+            with _reactor_lock:
+                if _reactor_instance is None:
+                    _reactor_instance = Reactor()
+        return _reactor_instance
+
+    def subscribe(self, groups, handler, event_filter=None):
+        """
+        Call handler with every event of groups for which event_filter
+        returns True, until unsubscribed. Monitoring starts when the first
+        subscriber subscribes.
+
+        Returns a subscription to be used for unsubscribing.
+        """
+        subscription = Subscription(groups, handler, event_filter)
+        with self._lock:
+            self._subscriptions += (subscription,)
+            self._update_monitor()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop calling the subscription handler. Monitoring stops when the last
+        subscriber unsubscribes.
+        """
+        with self._lock:
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+            self._update_monitor()
+
+    def _update_monitor(self):
+        groups = frozenset()
+        for subscription in self._subscriptions:
+            groups |= subscription.groups
+
+        if groups == self._groups:
+            return
+
+        # The groups of a running monitor cannot be modified, so a new
+        # monitor replaces it. This happens only when subscribers of new
+        # groups subscribe, typically during startup.
+        self._stop_monitor()
+        self._groups = groups
+        if groups:
+            self._start_monitor()
+
+    def _start_monitor(self):
+        logging.info(
+            'Starting netlink reactor, groups: %s', sorted(self._groups)
+        )
+        nl_monitor = self._monitor_factory(groups=self._groups)
+        nl_monitor.start()
+        self._monitor = nl_monitor
+        self._thread = concurrent.thread(
+            self._run, args=(nl_monitor,), name='netlink/reactor'
+        )
+        self._thread.start()
+
+    def _stop_monitor(self):
+        if self._monitor is None:
+            return
+        logging.info('Stopping netlink reactor')
+        if not self._monitor.is_stopped():
+            self._monitor.stop()
+        self._monitor.wait()
+        self._thread.join()
+        self._monitor = None
+        self._thread = None
+
+    def _run(self, nl_monitor):
+        try:
+            for event in nl_monitor:
+                self._dispatch(event)
+        except monitor.MonitorError:
+            logging.exception('Netlink reactor monitor failed')
+
+    def _dispatch(self, event):
+        group = event_group(event)
+        for subscription in self._subscriptions:
+            try:
+                if subscription.matches(event, group):
+                    subscription.handler(event)
+            except Exception:
+                logging.exception(
+                    'Unhandled error in netlink event handler %s',
+                    subscription.handler,
+                )
+
+
+_ADDR_GROUPS = {'inet': 'ipv4-ifaddr', 'inet6': 'ipv6-ifaddr'}
+_ROUTE_GROUPS = {'inet': 'ipv4-route', 'inet6': 'ipv6-route'}
+
+
+def event_group(event):
+    """
+    Return the netlink group of event, or None if the group is unknown.
+    """
+    if 'IFLA_EVENT' in event:
+        return 'link'
+    event_type = event.get('event')
+    if event_type in ('new_link', 'del_link'):
+        return 'link'
+    if event_type in ('new_addr', 'del_addr'):
+        return _ADDR_GROUPS.get(event.get('family'))
+    if event_type in ('new_route', 'del_route'):
+        return _ROUTE_GROUPS.get(event.get('family'))
+    return None
@@ -86,10 +86,13 @@ def _setup_nmstate(networks, bondings, options, in_rollback):
     used (the Transaction context).
     """
     logging.info('Processing setup through nmstate')
-    desired_state = nmstate.generate_state(networks, bondings)
+    desired_state = nmstate.generate_minimal_state(networks, bondings)
     logging.info('Desired state: %s', desired_state)
     _setup_dynamic_src_routing(networks)
-    nmstate.setup(desired_state, verify_change=not in_rollback)
+    if desired_state:
+        nmstate.setup(desired_state, verify_change=not in_rollback)
+    else:
+        logging.info('Current state is the desired state, skipping setup')
     net_info = NetInfo(netinfo_get())
 
     with Transaction(in_rollback=in_rollback, persistent=False) as config:
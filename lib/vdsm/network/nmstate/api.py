@@ -39,6 +39,7 @@ from .route import generate_dynamic_source_route_rule_state
 from .schema import Interface
 from .sriov import create_sriov_state
 from .state import CurrentState
+from .state import minimize_state
 
 
 def setup(desired_state, verify_change):
@@ -47,8 +48,21 @@ def setup(desired_state, verify_change):
 
 def generate_state(networks, bondings):
     """Generate a new nmstate state given VDSM setup state format"""
-    rconfig = RunningConfig()
+    return _generate_state(networks, bondings, get_current_state())
+
+
+def generate_minimal_state(networks, bondings):
+    """
+    Generate a new nmstate state given VDSM setup state format, including
+    only the changes to the current state.
+    """
     current_state = get_current_state()
+    desired_state = _generate_state(networks, bondings, current_state)
+    return minimize_state(desired_state, current_state)
+
+
+def _generate_state(networks, bondings, current_state):
+    rconfig = RunningConfig()
 
     ovs_nets, linux_br_nets = split_switch_type(networks, rconfig.networks)
     ovs_bonds, linux_br_bonds = split_switch_type(bondings, rconfig.bonds)
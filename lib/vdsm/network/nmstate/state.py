@@ -196,6 +196,7 @@ class CurrentState(object):
         self._interfaces_state = self._get_interfaces_state(state)
         self._dns_state = self._get_dns_state(state)
         self._routes_state = self._get_routes_state(state)
+        self._config_routes_state = self._get_config_routes_state(state)
         self._rules_state = self._get_rules_state(state)
 
     @property
@@ -210,6 +211,10 @@ class CurrentState(object):
     def routes_state(self):
         return self._routes_state
 
+    @property
+    def config_routes_state(self):
+        return self._config_routes_state
+
     @property
     def rules_state(self):
         return self._rules_state
@@ -253,6 +258,105 @@ class CurrentState(object):
     def _get_routes_state(state):
         return state[Route.KEY].get(Route.RUNNING, {})
 
+    @staticmethod
+    def _get_config_routes_state(state):
+        return state[Route.KEY].get(Route.CONFIG, {})
+
     @staticmethod
     def _get_rules_state(state):
         return state[RouteRule.KEY].get(RouteRule.CONFIG, {})
+
+
+def minimize_state(desired_state, current_state):
+    """
+    Return desired state without the interfaces, routes, route rules and DNS
+    configuration already found in current state.
+
+    nmstate merges a partial desired state with the current state, so the
+    minimal state results in the same state, but nmstate configures and
+    verifies only the modified interfaces.
+    """
+    state = {}
+    ifstates = [
+        ifstate
+        for ifstate in desired_state.get(Interface.KEY, ())
+        if not _is_subset(
+            ifstate,
+            current_state.interfaces_state.get(ifstate[Interface.NAME]),
+        )
+        and not _is_absent_iface_missing(ifstate, current_state)
+    ]
+    if ifstates:
+        state[Interface.KEY] = ifstates
+
+    # Running routes may be added by DHCP or the kernel, so routes are
+    # compared with the configured routes, to keep them in the profiles.
+    routes = _missing_entries(
+        desired_state.get(Route.KEY, {}).get(Route.CONFIG, ()),
+        current_state.config_routes_state,
+        Route.STATE,
+    )
+    if routes:
+        state[Route.KEY] = {Route.CONFIG: routes}
+
+    rules = _missing_entries(
+        desired_state.get(RouteRule.KEY, {}).get(RouteRule.CONFIG, ()),
+        current_state.rules_state,
+        RouteRule.STATE,
+    )
+    if rules:
+        state[RouteRule.KEY] = {RouteRule.CONFIG: rules}
+
+    dns_state = desired_state.get(DNS.KEY)
+    if dns_state is not None and (
+        dns_state[DNS.CONFIG][DNS.SERVER] != current_state.dns_state
+    ):
+        state[DNS.KEY] = dns_state
+
+    if OvsDB.KEY in desired_state:
+        state[OvsDB.KEY] = desired_state[OvsDB.KEY]
+
+    return state
+
+
+def _is_absent_iface_missing(ifstate, current_state):
+    return (
+        is_iface_absent(ifstate)
+        and ifstate[Interface.NAME] not in current_state.interfaces_state
+    )
+
+
+def _missing_entries(desired_entries, current_entries, state_key):
+    """
+    Return the desired entries not found in current entries. Entries removing
+    existing entries are always kept, since they may match multiple entries.
+    """
+    current_entries = current_entries or ()
+    return [
+        entry
+        for entry in desired_entries
+        if state_key in entry
+        or not any(_is_subset(entry, current) for current in current_entries)
+    ]
+
+
+def _is_subset(desired, current):
+    """
+    Return True if the desired state is included in the current state. Lists
+    must have the same items, in any order.
+    """
+    if isinstance(desired, dict):
+        return isinstance(current, dict) and all(
+            key in current and _is_subset(value, current[key])
+            for key, value in desired.items()
+        )
+    if isinstance(desired, list):
+        return (
+            isinstance(current, list)
+            and len(desired) == len(current)
+            and all(
+                any(_is_subset(item, current_item) for current_item in current)
+                for item in desired
+            )
+        )
+    return desired == current
@@ -23,14 +23,18 @@ from __future__ import division
 from collections import namedtuple
 from functools import partial
 import errno
+import logging
 
 from vdsm.network import ipwrapper
+from vdsm.network.netlink import qdisc as nl_qdisc
 
 from . import filter as tc_filter
 from . import _parser
+from . import _wrapper
 from . import cls
 from . import qdisc
 from ._wrapper import TrafficControlException
+from ._wrapper import batch
 
 QDISC_INGRESS = 'ffff:'
 MISSING_OBJ_ERR_CODES = (errno.EINVAL, errno.ENOENT, errno.EOPNOTSUPP)
@@ -81,11 +85,12 @@ def setPortMirroring(network, target):
     this commands mirror all 'networkName' traffic to 'ifaceName'
     '''
     _qdisc_replace_ingress(network)
-    _addTarget(network, QDISC_INGRESS, target)
+    with batch():
+        _addTarget(network, QDISC_INGRESS, target)
 
-    qdisc.replace(network, 'prio', parent=None)
-    qdisc_id = next(_qdiscs_of_device(network))
-    _addTarget(network, qdisc_id, target)
+        qdisc.replace(network, 'prio', parent=None)
+        qdisc_id = next(_qdiscs_of_device(network))
+        _addTarget(network, qdisc_id, target)
     ipwrapper.getLink(network).promisc = True
 
 
@@ -101,12 +106,13 @@ def unsetPortMirroring(network, target):
     # TODO handle the case where we have partial definitions on device due to
     # vdsm crash
     '''
-    acts = _delTarget(network, QDISC_INGRESS, target)
-    try:
-        qdisc_id = next(_qdiscs_of_device(network))
-        acts += _delTarget(network, qdisc_id, target)
-    except StopIteration:
-        pass
+    with batch():
+        acts = _delTarget(network, QDISC_INGRESS, target)
+        try:
+            qdisc_id = next(_qdiscs_of_device(network))
+            acts += _delTarget(network, qdisc_id, target)
+        except StopIteration:
+            pass
 
     if not acts:
         _qdisc_del(network)
@@ -199,6 +205,30 @@ def _iterate(module, dev, out=None, **kwargs):
         yield module.parse(tokens)
 
 
+def qdiscs(dev, out=None):
+    """
+    Generates information dictionaries of the qdiscs of dev, or of all the
+    devices if dev is None.
+
+    The qdiscs are listed using netlink, reporting only the general qdisc
+    attributes. Kind specific attributes are reported only when parsing tc
+    output, either given in out or when netlink listing fails.
+    """
+    if out is None:
+        _wrapper.flush()
+        try:
+            return [
+                data
+                for data in nl_qdisc.iter_qdiscs(dev)
+                if data['kind'] != 'noqueue'
+            ]
+        except IOError:
+            logging.warning(
+                'Failed to list qdiscs using netlink, using tc',
+                exc_info=True,
+            )
+    return _iterate(qdisc, dev, out=out)
+
+
 _filters = partial(_iterate, tc_filter)  # kwargs: parent and pref
-qdiscs = partial(_iterate, qdisc)  # kwargs: dev
 classes = partial(_iterate, cls)  # kwargs: parent and classid
@@ -19,32 +19,107 @@
 
 from __future__ import absolute_import
 from __future__ import division
+from contextlib import contextmanager
 import errno
 import os
+import re
+import tempfile
+import threading
 
 from vdsm.network import cmd
 
 EXT_TC = '/sbin/tc'
 _TC_ERR_PREFIX = 'RTNETLINK answers: '
+_TC_BATCH_ERR = re.compile(r'^Command failed .*:(\d+)$', re.MULTILINE)
 _errno_trans = dict(((os.strerror(code), code) for code in errno.errorcode))
 
+_tls = threading.local()
+
 
 def process_request(command):
+    """
+    Run a tc command and return its output. Inside a batch() block
+    modifications are queued instead, and queries first send the queued
+    requests so they see their results.
+    """
+    requests = getattr(_tls, 'requests', None)
+    if requests is not None:
+        if command[1] != 'show':
+            requests.append(command)
+            return ''
+        flush()
     command.insert(0, EXT_TC)
     retcode, out, err = cmd.exec_sync(command)
     if retcode != 0:
         if retcode == 2 and err:
-            for err_line in err.splitlines():
-                if err_line.startswith(_TC_ERR_PREFIX):
-                    err = err_line
-                    retcode = _errno_trans.get(
-                        err[len(_TC_ERR_PREFIX) :].strip()  # noqa: E203
-                    )
-                    break
+            retcode, err = _translate_error(retcode, err)
         raise TrafficControlException(retcode, err, command)
     return out
 
 
+@contextmanager
+def batch():
+    """
+    Queue the tc modifications issued in the block, and send them to a single
+    tc process, in order, when the block ends. The first failing request
+    aborts the batch, raising TrafficControlException with the failing
+    command. Requests whose failure is expected and handled must not be
+    issued in a batch. Nested blocks join the outer batch.
+    """
+    if getattr(_tls, 'requests', None) is not None:
+        yield
+        return
+    _tls.requests = []
+    try:
+        yield
+        flush()
+    finally:
+        _tls.requests = None
+
+
+def flush():
+    """Send the requests queued by the current batch, if any."""
+    requests = getattr(_tls, 'requests', None)
+    if not requests:
+        return
+    _tls.requests = []
+    _process_batch(requests)
+
+
+def _process_batch(requests):
+    with tempfile.NamedTemporaryFile(
+        mode='w', prefix='vdsm-tc-', suffix='.batch'
+    ) as f:
+        for request in requests:
+            f.write(' '.join(_batch_arg(arg) for arg in request) + '\n')
+        f.flush()
+        command = [EXT_TC, '-batch', f.name]
+        retcode, _, err = cmd.exec_sync(command)
+    if retcode != 0:
+        match = _TC_BATCH_ERR.search(err)
+        if match and 0 < int(match.group(1)) <= len(requests):
+            command = [EXT_TC] + requests[int(match.group(1)) - 1]
+        retcode, err = _translate_error(retcode, err)
+        raise TrafficControlException(retcode, err, command)
+
+
+def _batch_arg(arg):
+    arg = str(arg)
+    return '"%s"' % arg if ' ' in arg else arg
+
+
+def _translate_error(retcode, err):
+    for err_line in err.splitlines():
+        if err_line.startswith(_TC_ERR_PREFIX):
+            return (
+                _errno_trans.get(
+                    err_line[len(_TC_ERR_PREFIX) :].strip()  # noqa: E203
+                ),
+                err_line,
+            )
+    return retcode, err
+
+
 class TrafficControlException(Exception):
     def __init__(self, errCode, message, command):
         self.errCode = errCode
@@ -157,6 +157,9 @@ METADATA_BASE_V5 = MiB
 # Size of metadata slot in v5
 METADATA_SLOT_SIZE_V5 = 8 * KiB
 
+# Reading metadata area in chunks of this size, aligned to this size.
+METADATA_READ_CHUNK = 8 * MiB
+
 
 def encodePVInfo(pvInfo):
     return (
@@ -255,6 +258,178 @@ def _occupied_metadata_slots(sdUUID):
     return occupiedSlots
 
 
+class MetadataSlots(object):
+    """
+    Occupancy bitmap of domain volumes metadata slots.
+
+    Slots before first_slot are reserved and never allocated.
+    """
+
+    def __init__(self, first_slot, occupied=()):
+        self.first_slot = first_slot
+        self._bitmap = bytearray()
+        # Index of the first byte that may have a free slot.
+        self._hint = 0
+        for slot in range(first_slot):
+            self._set(slot)
+        for slot in occupied:
+            self._set(slot)
+
+    def __contains__(self, slot):
+        index, bit = divmod(slot, 8)
+        return index < len(self._bitmap) and bool(
+            self._bitmap[index] & (1 << bit))
+
+    def occupied(self):
+        """
+        Return sorted list of occupied slots.
+        """
+        return [slot for slot in range(self.first_slot, len(self._bitmap) * 8)
+                if slot in self]
+
+    def allocate(self):
+        """
+        Mark the first free slot as occupied and return it.
+        """
+        index = self._hint
+        while index < len(self._bitmap) and self._bitmap[index] == 0xff:
+            index += 1
+        self._hint = index
+
+        slot = index * 8
+        while slot in self:
+            slot += 1
+
+        self._set(slot)
+        return slot
+
+    def free(self, slot):
+        if slot < self.first_slot or slot not in self:
+            return
+        index, bit = divmod(slot, 8)
+        self._bitmap[index] &= ~(1 << bit) & 0xff
+        self._hint = min(self._hint, index)
+
+    def _set(self, slot):
+        index, bit = divmod(slot, 8)
+        if index >= len(self._bitmap):
+            self._bitmap.extend(b"\0" * (index + 1 - len(self._bitmap)))
+        self._bitmap[index] |= 1 << bit
+
+
+# Occupied metadata slots per domain, updated when allocating a slot and when
+# removing a volume. Valid only on the SPM; dropped when starting the SPM,
+# since slots may have been allocated and released by the previous SPM.
+_metadata_slots_lock = threading.Lock()
+_metadata_slots = {}  # {sdUUID: MetadataSlots}
+
+
+def _allocate_metadata_slot(sdUUID, first_slot):
+    with _metadata_slots_lock:
+        slots = _metadata_slots.get(sdUUID)
+        if slots is None or slots.first_slot != first_slot:
+            log.debug("Loading occupied metadata slots in VG %s", sdUUID)
+            slots = MetadataSlots(
+                first_slot, _occupied_metadata_slots(sdUUID))
+            _metadata_slots[sdUUID] = slots
+        return slots.allocate()
+
+
+def _release_metadata_slots(sdUUID, slots):
+    """
+    Must be called only after the volumes using slots were removed.
+    """
+    with _metadata_slots_lock:
+        occupied = _metadata_slots.get(sdUUID)
+        if occupied is not None:
+            for slot in slots:
+                occupied.free(slot)
+
+
+def _volumes_metadata_slots(sdUUID, volUUIDs):
+    slots = []
+    for volUUID in volUUIDs:
+        try:
+            lv = lvm.getLV(sdUUID, volUUID)
+        except se.LogicalVolumeDoesNotExistError:
+            continue
+        mdslot = parse_lv_tags(lv).mdslot
+        if mdslot is not None:
+            slots.append(mdslot)
+    return slots
+
+
+def invalidate_metadata_slots(sdUUID=None):
+    """
+    Drop the occupied metadata slots of sdUUID, or of all domains if sdUUID
+    is None. The slots will be loaded from lvm tags on the next allocation.
+    """
+    with _metadata_slots_lock:
+        if sdUUID is None:
+            _metadata_slots.clear()
+        else:
+            _metadata_slots.pop(sdUUID, None)
+
+
+class MetadataArea(object):
+    """
+    Volumes metadata slots read from the metadata volume in few large aligned
+    reads, and parsed lazily when accessed.
+
+    Data is read using direct I/O, so it is never stale, but it reflects the
+    metadata area when the object was created.
+    """
+
+    def __init__(self, manifest, slots, version=None):
+        self._manifest = manifest
+        self._version = version
+        self.slots = sorted(slots)
+        self._parsed = {}
+        self._start = 0
+        self._data = b""
+        if self.slots:
+            self._read()
+
+    def read(self, slot):
+        """
+        Return raw metadata block of slot.
+        """
+        offset = self._offset(slot) - self._start
+        return bytes(self._data[offset:offset + sc.METADATA_SIZE])
+
+    def lines(self, slot):
+        return self.read(slot).rstrip(b"\0").splitlines()
+
+    def dump(self, slot):
+        """
+        Return parsed volume metadata dict of slot.
+        """
+        if slot not in self._parsed:
+            slot_md = volumemetadata.dump(self.lines(slot))
+            slot_md["mdslot"] = slot
+            self._parsed[slot] = slot_md
+        return self._parsed[slot]
+
+    def _offset(self, slot):
+        return self._manifest.metadata_offset(slot, version=self._version)
+
+    def _read(self):
+        start = self._offset(self.slots[0])
+        end = self._offset(self.slots[-1]) + sc.METADATA_SIZE
+
+        # Align start to chunk size so reads are large aligned I/Os.
+        start = start // METADATA_READ_CHUNK * METADATA_READ_CHUNK
+
+        path = self._manifest.metadata_volume_path()
+        data = bytearray()
+        for offset in range(start, end, METADATA_READ_CHUNK):
+            size = min(METADATA_READ_CHUNK, end - offset)
+            data += misc.readblock(path, offset, size)
+
+        self._start = start
+        self._data = data
+
+
 def parse_lv_tags(lv):
     image = None
     parent = None
@@ -308,7 +483,9 @@ def getAllVolumes(sdUUID):
 
 
 def deleteVolumes(sdUUID, vols):
+    slots = _volumes_metadata_slots(sdUUID, vols)
     lvm.removeLVs(sdUUID, vols)
+    _release_metadata_slots(sdUUID, slots)
 
 
 def zeroImgVolumes(sdUUID, imgUUID, volUUIDs, discard):
@@ -808,24 +985,30 @@ class BlockStorageDomainManifest(sd.StorageDomainManifest):
         # TODO: Check if the lock is needed when using
         # getVolumeMetadataOffsetFromPvMapping()
         with self._lvTagMetaSlotLock:
-            yield self._getFreeMetadataSlot()
+            slot = self._getFreeMetadataSlot()
+            try:
+                yield slot
+            except:
+                # We don't know if the slot was assigned to the volume, load
+                # occupied slots from lvm on the next allocation.
+                invalidate_metadata_slots(self.sdUUID)
+                raise
 
     def _getFreeMetadataSlot(self):
-        occupied_slots = _occupied_metadata_slots(self.sdUUID)
-        free_slot = self._first_available_slot()
-
-        # We have these cases:
-        # slot > free_slot: free_slot is free, use it.
-        # slot == free_slot: free_slot is occupied, try next slot (slot + 1).
-        # slot < free_slot: impossible.
-        for slot in occupied_slots:
-            if slot > free_slot:
-                break
-            free_slot = slot + 1
-
+        free_slot = _allocate_metadata_slot(
+            self.sdUUID, self._first_available_slot())
         self.log.debug("Found free slot %s in VG %s", free_slot, self.sdUUID)
         return free_slot
 
+    def getVolumesMetadataSlots(self, volUUIDs):
+        return _volumes_metadata_slots(self.sdUUID, volUUIDs)
+
+    def releaseVolumeMetadataSlots(self, slots):
+        """
+        Called after removing volumes to make their metadata slots available.
+        """
+        _release_metadata_slots(self.sdUUID, slots)
+
     def _first_available_slot(self):
         version = self.getVersion()
 
@@ -1335,6 +1518,19 @@ class BlockStorageDomain(sd.StorageDomain):
         volUUIDs = self._manifest._getImgExclusiveVols(imgUUID, allVols)
         lvm.deactivateLVs(self.sdUUID, volUUIDs)
 
+    def deactivateImages(self, imgUUIDs):
+        """
+        Deactivate all the volumes belonging to the images using a single lvm
+        command.
+        """
+        allVols = self.getAllVolumes()
+        volUUIDs = set()
+        for imgUUID in imgUUIDs:
+            self.removeImageLinks(imgUUID)
+            volUUIDs.update(
+                self._manifest._getImgExclusiveVols(imgUUID, allVols))
+        lvm.deactivateLVs(self.sdUUID, sorted(volUUIDs))
+
     def linkBCImage(self, imgPath, imgUUID):
         dst = self.getLinkBCImagePath(imgUUID)
         self.log.info("Creating symlink from %s to %s", imgPath, dst)
@@ -1407,6 +1603,22 @@ class BlockStorageDomain(sd.StorageDomain):
         vgDir = os.path.join("/dev", self.sdUUID)
         return self.createImageLinks(vgDir, imgUUID, volUUIDs)
 
+    def activateImages(self, images):
+        """
+        Activate the volumes of multiple images using a single lvm command.
+
+        images: dict {imgUUID: volUUIDs}
+
+        Return dict {imgUUID: imgPath}.
+        """
+        volUUIDs = set()
+        for imgVols in images.values():
+            volUUIDs.update(imgVols)
+        lvm.activateLVs(self.sdUUID, sorted(volUUIDs))
+        vgDir = os.path.join("/dev", self.sdUUID)
+        return {imgUUID: self.createImageLinks(vgDir, imgUUID, imgVols)
+                for imgUUID, imgVols in images.items()}
+
     def validateMasterMount(self):
         return mount.isMounted(self.getMasterDir())
 
@@ -1660,21 +1872,20 @@ class BlockStorageDomain(sd.StorageDomain):
         # Map v4 and v5 areas, read metadata from v4 metadata area, format v5
         # metadata, and write it to v5 metadata area. Since v5 metadata area is
         # zeroed, we need to write only the metadata block.
-        # To avoid reading stale data from page cache, mics.readblock() is used
-        # instead of reading the block from mmap.
-        offset = METADATA_BASE_V4
-        size = METADATA_BASE_V5 - METADATA_BASE_V4
-        src = misc.readblock(path, offset, size)
+        # To avoid reading stale data from page cache, MetadataArea reads the
+        # v4 area using direct I/O instead of reading the block from mmap.
+        src = MetadataArea(
+            self._manifest, _occupied_metadata_slots(self.sdUUID), version=4)
 
         with open(path, "rb+") as f:
             dst = mmap.mmap(f.fileno(), RESERVED_METADATA_SIZE)
             with closing(dst):
-                for slot in _occupied_metadata_slots(self.sdUUID):
+                for slot in src.slots:
                     v4_off = self._manifest.metadata_offset(slot)
 
                     self.log.debug("Reading v4 metadata slot %s offset=%s",
                                    slot, v4_off)
-                    v4_data = bytes(src[v4_off:v4_off + sc.METADATA_SIZE])
+                    v4_data = src.read(slot)
 
                     try:
                         md = VolumeMetadata.from_lines(
@@ -1789,31 +2000,9 @@ class BlockStorageDomain(sd.StorageDomain):
         return vols_md
 
     def _parse_volumes_metadata(self):
-        slots_md = {}
-        slots = _occupied_metadata_slots(self.sdUUID)
-        if len(slots) == 0:
-            return slots_md
-
-        # Slots are sorted in an increasing order,
-        # find slots start and end offsets to read from metadata.
-        start_offset = self._manifest.metadata_offset(slots[0])
-        end_offset = self._manifest.metadata_offset(
-            slots[-1]) + sc.METADATA_SIZE
-
-        # Read the metadata from starting offset to last offset end.
-        path = self._manifest.metadata_volume_path()
-        raw_md = misc.readblock(path, start_offset, end_offset - start_offset)
-
-        # Parse metadata per slot.
-        for slot in slots:
-            offset = self._manifest.metadata_offset(slot) - start_offset
-            slot_raw_md = raw_md[offset:offset + sc.METADATA_SIZE]
-            md_lines = slot_raw_md.rstrip(b"\0").splitlines()
-            slot_md = volumemetadata.dump(md_lines)
-            slot_md["mdslot"] = slot
-            slots_md[slot] = slot_md
-
-        return slots_md
+        area = MetadataArea(
+            self._manifest, _occupied_metadata_slots(self.sdUUID))
+        return {slot: area.dump(slot) for slot in area.slots}
 
     def _dump_leases(self):
         path = self.getLeasesFilePath()
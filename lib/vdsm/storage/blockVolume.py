@@ -641,11 +641,14 @@ class BlockVolume(volume.Volume):
         manifest.markForDelVols(self.sdUUID, self.imgUUID, [self.volUUID],
                                 sc.REMOVED_IMAGE_PREFIX)
 
+        slots = manifest.getVolumesMetadataSlots([self.volUUID])
         try:
             lvm.removeLVs(self.sdUUID, (self.volUUID,))
         except se.LogicalVolumeRemoveError as e:
             self.log.exception("Cannot remove logical volume, the logical "
                                "volume must be removed manually: %s", e)
+        else:
+            manifest.releaseVolumeMetadataSlots(slots)
 
         try:
             self.log.info("Unlinking %s", vol_path)
@@ -0,0 +1,235 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Inventory of multipath devices.
+
+Reading the info of a multipath device is expensive, requiring many sysfs
+reads and running scsi_id for every device, and reading the info of every
+path. On hosts with hundreds of devices and several paths per device,
+reading all the devices takes tens of seconds.
+
+The inventory reads all the devices once, and then reads again only the
+devices modified since the last read, detected using udev events. When
+the udev monitor is not running, all the devices are read every time.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import copy
+import logging
+import os
+import threading
+
+from vdsm.common import concurrent
+from vdsm.common import udevadm
+from vdsm.common.time import monotonic_time
+from vdsm.storage import multipath
+
+log = logging.getLogger("storage.devinventory")
+
+# Time to wait before restarting a failed udev monitor.
+_RESTART_DELAY = 10
+
+
+class Inventory(object):
+
+    def __init__(self, scan=multipath.pathListIter):
+        """
+        Arguments:
+            scan (callable): called with a tuple of device guids, or with an
+                empty tuple for all the devices, returning an iterable of
+                multipath device info dicts.
+        """
+        self._scan = scan
+        # Serializes scans, so concurrent callers use the same scan.
+        self._scan_lock = threading.Lock()
+        # Protects the state below, never held while scanning.
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._monitoring = False
+        self._valid = False
+        self._stale = set()
+
+    def devices(self, guids=()):
+        """
+        Return a list of device info dicts for the given device guids, or
+        for all the devices if guids is empty. The returned dicts are
+        owned by the caller.
+        """
+        with self._scan_lock:
+            with self._lock:
+                full = not (self._valid and self._monitoring)
+                if full and guids:
+                    # Read only the requested devices, in the requested
+                    # order, leaving the inventory invalid.
+                    full = False
+                    stale = list(dict.fromkeys(guids))
+                else:
+                    stale = self._stale
+                    self._stale = set()
+                    self._valid = True
+
+            try:
+                if full:
+                    self._update_all()
+                elif stale:
+                    self._update(stale)
+            except Exception:
+                # We don't know which devices were updated.
+                self.invalidate()
+                raise
+
+            with self._lock:
+                if guids:
+                    found = [self._devices[g] for g in guids
+                             if g in self._devices]
+                else:
+                    found = list(self._devices.values())
+                return copy.deepcopy(found)
+
+    def invalidate(self, guids=()):
+        """
+        Read the given device guids, or all the devices if guids is empty, on
+        the next call.
+        """
+        with self._lock:
+            if guids:
+                self._stale.update(guids)
+            else:
+                self._valid = False
+
+    def start_monitoring(self):
+        """
+        Called when udev events are monitored. Events before monitoring
+        started were lost, so all the devices are read on the next call.
+        """
+        with self._lock:
+            self._monitoring = True
+            self._valid = False
+
+    def stop_monitoring(self):
+        with self._lock:
+            self._monitoring = False
+
+    def handle_event(self, event):
+        """
+        Mark the devices modified by udev event as stale.
+        """
+        guid = _multipath_guid(event)
+        with self._lock:
+            if guid is not None:
+                log.debug("Multipath device %s %s",
+                          guid, event.get("ACTION"))
+                self._stale.add(guid)
+            elif event.get("DEVTYPE") == "disk" and "DEVNAME" in event:
+                # Path events; new paths are reported by a change event of
+                # the multipath device when multipathd adds the path.
+                physdev = os.path.basename(event["DEVNAME"])
+                for guid, dev in self._devices.items():
+                    if any(p["physdev"] == physdev for p in dev["paths"]):
+                        log.debug("Multipath device %s path %s %s",
+                                  guid, physdev, event.get("ACTION"))
+                        self._stale.add(guid)
+
+    def _update_all(self):
+        start = monotonic_time()
+        devices = {dev["guid"]: dev for dev in self._scan(())}
+        with self._lock:
+            self._devices = devices
+        log.debug("Read %d devices in %.2f seconds",
+                  len(devices), monotonic_time() - start)
+
+    def _update(self, guids):
+        start = monotonic_time()
+        # Removed devices are missing in the results.
+        updated = {dev["guid"]: dev for dev in self._scan(tuple(guids))}
+        with self._lock:
+            for guid in guids:
+                if guid in updated:
+                    self._devices[guid] = updated[guid]
+                else:
+                    self._devices.pop(guid, None)
+        log.debug("Read %d modified devices in %.2f seconds",
+                  len(guids), monotonic_time() - start)
+
+
+class Monitor(object):
+    """
+    Update the inventory using udev events of block devices.
+    """
+
+    def __init__(self, inventory):
+        self._inventory = inventory
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._udev = None
+        self._thread = concurrent.thread(self._run,
+                                         name="devinventory",
+                                         log=log)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        with self._lock:
+            if self._udev is not None:
+                self._udev.stop()
+
+    def wait(self):
+        self._thread.join()
+
+    def _run(self):
+        log.debug("Starting device inventory monitor")
+        while not self._done.is_set():
+            try:
+                self._monitor()
+            except Exception:
+                log.exception("Device inventory monitor failed")
+            if self._done.wait(_RESTART_DELAY):
+                break
+        log.debug("Device inventory monitor stopped")
+
+    def _monitor(self):
+        udev = udevadm.Monitor(subsystem_matches=("block",))
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._udev = udev
+        try:
+            udev.start()
+            if self._done.is_set():
+                return
+            self._inventory.start_monitoring()
+            for event in udev:
+                self._inventory.handle_event(event)
+        finally:
+            self._inventory.stop_monitoring()
+            with self._lock:
+                self._udev = None
+            udev.stop()
+
+
+def _multipath_guid(event):
+    if event.get("DM_UUID", "").startswith("mpath-"):
+        return event.get("DM_NAME")
+    return None
@@ -55,6 +55,7 @@ from vdsm.storage import blockSD
 from vdsm.storage import clusterlock
 from vdsm.storage import constants as sc
 from vdsm.storage import devicemapper
+from vdsm.storage import devinventory
 from vdsm.storage import dispatcher
 from vdsm.storage import exception as se
 from vdsm.storage import fileUtils
@@ -140,6 +141,9 @@ class HSM(object):
     """
     _pool = sp.DisconnectedPool()
     log = logging.getLogger('storage.hsm')
+    # (StatusSnapshot, stats) of the last computed domain monitor stats,
+    # replaced when the domain monitor publishes a new snapshot.
+    _repoStatsCache = (None, {})
 
     @classmethod
     def validateSdUUID(cls, sdUUID):
@@ -249,6 +253,13 @@ class HSM(object):
         self.mpathhealth_monitor = mpathhealth.Monitor(monitorInterval)
         self.mpathhealth_monitor.start()
 
+        self.device_inventory = devinventory.Inventory()
+        self.device_inventory_monitor = None
+        if config.getboolean('multipath', 'device_inventory'):
+            self.device_inventory_monitor = devinventory.Monitor(
+                self.device_inventory)
+            self.device_inventory_monitor.start()
+
         def storageRefresh():
             sdCache.refreshStorage()
             lvm.bootstrap(skiplvs=blockSD.SPECIAL_LVS_V4)
@@ -1784,6 +1795,7 @@ class HSM(object):
                        refresh=True):
         if refresh:
             sdCache.refreshStorage()
+            self.device_inventory.invalidate(guids)
         typeFilter = lambda dev: True
         if storageType:
             if sd.storageType(storageType) == sd.type2name(sd.ISCSI_DOMAIN):
@@ -1797,7 +1809,7 @@ class HSM(object):
         pvs = {os.path.basename(pv.name): pv for pv in lvm.getAllPVs()}
 
         # FIXME: pathListIter() should not return empty records
-        for dev in multipath.pathListIter(guids):
+        for dev in self.device_inventory.devices(guids):
             if not typeFilter(dev):
                 continue
 
@@ -2936,9 +2948,152 @@ class HSM(object):
 
         vars.task.getSharedLock(STORAGE, sdUUID)
 
-        imgVolumesInfo = []
         dom = sdCache.produce(sdUUID)
         allVols = dom.getAllVolumes()
+        imgVolumes = self._getPreparableImageVolumes(
+            dom, allVols, imgUUID, leafUUID, allowIllegal)
+
+        imgPath = dom.activateVolumes(imgUUID, imgVolumes)
+        return self._linkPreparedImage(
+            dom, spUUID, imgUUID, leafUUID, imgVolumes, imgPath)
+
+    @public
+    def prepareImages(self, images):
+        """
+        Prepare multiple images, activating the needed volumes.
+
+        Images are grouped by storage domain. Each domain is produced and its
+        volumes are listed once, and the volumes of all the images on the
+        domain are activated together. On block domains this activates all
+        the logical volumes in a single lvm command per volume group, instead
+        of one command per image.
+
+        Failure to prepare an image does not fail the entire request; the
+        error is reported in the image result.
+
+        Arguments:
+            images (list): list of dicts with the keys "sdUUID", "spUUID",
+                "imgUUID", "leafUUID", and optional "allowIllegal".
+
+        Returns:
+            dict with "images" key, holding a list of results in the same
+            order as the requested images. Each result has a "status" key,
+            and on success the keys returned by prepareImage().
+        """
+        results = [None] * len(images)
+
+        for sdUUID, requests in self._groupImagesByDomain(images):
+            try:
+                self._prepareDomainImages(sdUUID, requests, results)
+            except Exception as e:
+                self.log.exception("Error preparing images on domain %s",
+                                   sdUUID)
+                for i, _ in requests:
+                    if results[i] is None:
+                        results[i] = self._errorResponse(e)
+
+        return dict(images=results)
+
+    @public
+    def teardownImages(self, images):
+        """
+        Teardown multiple images, deactivating the volumes.
+
+        Images are grouped by storage domain. On block domains all the
+        logical volumes of the images are deactivated in a single lvm command
+        per volume group.
+
+        Arguments:
+            images (list): list of dicts with the keys "sdUUID", "spUUID" and
+                "imgUUID".
+
+        Returns:
+            dict with "images" key, holding a list of results in the same
+            order as the requested images. Each result has a "status" key.
+        """
+        results = [None] * len(images)
+
+        for sdUUID, requests in self._groupImagesByDomain(images):
+            try:
+                vars.task.getSharedLock(STORAGE, sdUUID)
+                dom = sdCache.produce(sdUUID)
+                imgUUIDs = [img["imgUUID"] for _, img in requests]
+                for imgUUID in imgUUIDs:
+                    dom.unlinkBCImage(imgUUID)
+                dom.deactivateImages(imgUUIDs)
+            except Exception as e:
+                self.log.exception("Error tearing down images on domain %s",
+                                   sdUUID)
+                response = self._errorResponse(e)
+            else:
+                response = dispatcher.Dispatcher.STATUS_OK.copy()
+
+            for i, _ in requests:
+                results[i] = response.copy()
+
+        return dict(images=results)
+
+    def _groupImagesByDomain(self, images):
+        """
+        Return list of (sdUUID, [(index, image), ...]) tuples, keeping the
+        order of the domains and images in the request.
+        """
+        domains = {}
+        for i, img in enumerate(images):
+            domains.setdefault(img["sdUUID"], []).append((i, img))
+        return list(domains.items())
+
+    def _prepareDomainImages(self, sdUUID, requests, results):
+        for spUUID in {img["spUUID"] for _, img in requests}:
+            if spUUID != sd.BLANK_UUID:
+                self.getPool(spUUID)
+
+        vars.task.getSharedLock(STORAGE, sdUUID)
+
+        dom = sdCache.produce(sdUUID)
+        allVols = dom.getAllVolumes()
+
+        # Resolve the volumes of all images before activating anything, so
+        # we can activate the volumes of all valid images together.
+        valid = []
+        for i, img in requests:
+            try:
+                imgVolumes = self._getPreparableImageVolumes(
+                    dom, allVols, img["imgUUID"], img["leafUUID"],
+                    img.get("allowIllegal", False))
+            except Exception as e:
+                results[i] = self._errorResponse(e)
+            else:
+                valid.append((i, img, imgVolumes))
+
+        if not valid:
+            return
+
+        imgPaths = dom.activateImages(
+            {img["imgUUID"]: imgVolumes for _, img, imgVolumes in valid})
+
+        for i, img, imgVolumes in valid:
+            try:
+                res = self._linkPreparedImage(
+                    dom, img["spUUID"], img["imgUUID"], img["leafUUID"],
+                    imgVolumes, imgPaths[img["imgUUID"]])
+            except Exception as e:
+                results[i] = self._errorResponse(e)
+            else:
+                results[i] = dispatcher.Dispatcher.STATUS_OK.copy()
+                results[i].update(res)
+
+    def _errorResponse(self, e):
+        if isinstance(e, se.GeneralException):
+            return e.response()
+        return se.generateResponse(e)
+
+    def _getPreparableImageVolumes(self, dom, allVols, imgUUID, leafUUID,
+                                   allowIllegal):
+        """
+        Return the volumes of image imgUUID, validating that leafUUID is part
+        of the image and that the volumes can be prepared.
+        """
         # Filter volumes related to this image
         imgVolumes = list(sd.getVolsOfImage(allVols, imgUUID))
 
@@ -2953,7 +3108,15 @@ class HSM(object):
                 else:
                     raise se.prepareIllegalVolumeError(volUUID)
 
-        imgPath = dom.activateVolumes(imgUUID, imgVolumes)
+        return imgVolumes
+
+    def _linkPreparedImage(self, dom, spUUID, imgUUID, leafUUID, imgVolumes,
+                           imgPath):
+        """
+        Complete preparing an image whose volumes were activated, returning
+        the prepareImage() result. The image is torn down on failure.
+        """
+        imgVolumesInfo = []
         try:
             for volUUID in imgVolumes:
                 dom.produceVolume(imgUUID, volUUID).updateInvalidatedSize()
@@ -2969,7 +3132,7 @@ class HSM(object):
             for volUUID in imgVolumes:
                 path = os.path.join(dom.domaindir, sd.DOMAIN_IMAGES, imgUUID,
                                     volUUID)
-                volInfo = {'domainID': sdUUID, 'imageID': imgUUID,
+                volInfo = {'domainID': dom.sdUUID, 'imageID': imgUUID,
                            'volumeID': volUUID, 'path': path}
 
                 lease = dom.getVolumeLease(imgUUID, volUUID)
@@ -3161,6 +3324,8 @@ class HSM(object):
             self.taskMng.prepareForShutdown()
             oop.stop()
             self.mpathhealth_monitor.stop()
+            if self.device_inventory_monitor:
+                self.device_inventory_monitor.stop()
         except:
             pass
 
@@ -3253,52 +3418,80 @@ class HSM(object):
         repoStats = {}
         statsGenTime = time.time()
 
-        for sdUUID, domStatus in domainMonitor.getDomainsStatus():
+        domainsStats = self._getDomainsRepoStats(domainMonitor)
+
+        for sdUUID, stats in six.iteritems(domainsStats):
             if domains and sdUUID not in domains:
                 continue
-            if domStatus.error is None:
-                code = 0
-            elif isinstance(domStatus.error, se.StorageException):
-                code = domStatus.error.code
-            else:
-                code = se.StorageException.code
-
-            disktotal, diskfree = domStatus.diskUtilization
-            vgmdtotal, vgmdfree = domStatus.vgMdUtilization
-            lastcheck = '%.1f' % (statsGenTime - domStatus.checkTime)
-
-            repoStats[sdUUID] = {
-                'finish': domStatus.checkTime,
-
-                'result': {
-                    'code': code,
-                    'lastCheck': lastcheck,
-                    'delay': str(domStatus.readDelay),
-                    'valid': (domStatus.error is None),
-                    'version': domStatus.version,
-                    # domStatus.hasHostId can also be None
-                    'acquired': domStatus.hasHostId is True,
-                    'actual': domStatus.actual
-                },
-
-                'disktotal': disktotal,
-                'diskfree': diskfree,
-
-                'mdavalid': domStatus.vgMdHasEnoughFreeSpace,
-                'mdathreshold': domStatus.vgMdFreeBelowThreashold,
-                'mdasize': vgmdtotal,
-                'mdafree': vgmdfree,
-
-                'masterValidate': {
-                    'mount': domStatus.masterMounted,
-                    'valid': domStatus.masterValid
-                },
-
-                'isoprefix': domStatus.isoPrefix,
-            }
+
+            # The cached stats are shared by all callers; copy what we modify.
+            domStats = stats.copy()
+            domStats['result'] = stats['result'].copy()
+            domStats['result']['lastCheck'] = \
+                '%.1f' % (statsGenTime - stats['finish'])
+            repoStats[sdUUID] = domStats
 
         return repoStats
 
+    def _getDomainsRepoStats(self, domainMonitor):
+        """
+        Return the stats of all monitored domains, without the time dependent
+        "lastCheck" value.
+
+        The stats are computed once for every domain monitor status snapshot
+        and reused until a monitor publishes a new status.
+        """
+        snapshot = domainMonitor.getStatusSnapshot()
+        cachedSnapshot, stats = self._repoStatsCache
+        if cachedSnapshot is snapshot:
+            return stats
+
+        stats = {sdUUID: self._domainRepoStats(domStatus)
+                 for sdUUID, domStatus in six.iteritems(snapshot.statuses)}
+
+        self._repoStatsCache = (snapshot, stats)
+        return stats
+
+    def _domainRepoStats(self, domStatus):
+        if domStatus.error is None:
+            code = 0
+        elif isinstance(domStatus.error, se.StorageException):
+            code = domStatus.error.code
+        else:
+            code = se.StorageException.code
+
+        disktotal, diskfree = domStatus.diskUtilization
+        vgmdtotal, vgmdfree = domStatus.vgMdUtilization
+
+        return {
+            'finish': domStatus.checkTime,
+
+            'result': {
+                'code': code,
+                'delay': str(domStatus.readDelay),
+                'valid': (domStatus.error is None),
+                'version': domStatus.version,
+                # domStatus.hasHostId can also be None
+                'acquired': domStatus.hasHostId is True,
+                'actual': domStatus.actual
+            },
+
+            'disktotal': disktotal,
+            'diskfree': diskfree,
+
+            'mdavalid': domStatus.vgMdHasEnoughFreeSpace,
+            'mdathreshold': domStatus.vgMdFreeBelowThreashold,
+            'mdasize': vgmdtotal,
+            'mdafree': vgmdfree,
+
+            'masterValidate': {
+                'mount': domStatus.masterMounted,
+                'valid': domStatus.masterValid
+            },
+
+            'isoprefix': domStatus.isoPrefix,
+        }
+
     @public
     def repoStats(self, domains=()):
         """
@@ -80,6 +80,11 @@ LV_ATTR = namedtuple("LV_ATTR", LV_ATTR_BITS)
 # Returned by vgs and pvs for missing pv or unknown vg name.
 UNKNOWN = "[unknown]"
 
+# udev properties set when udev did not probe the signatures of a device
+# mapper device.
+UDEV_NOSCAN_FLAGS = ("DM_NOSCAN", "DM_SUSPENDED",
+                     "DM_UDEV_DISABLE_OTHER_RULES_FLAG")
+
 
 class InvalidOutputLine(errors.Base):
     msg = "Invalid {self.command} command ouptut line: {self.line!r}"
@@ -1194,9 +1199,79 @@ def testPVCreate(devices, metadataSize):
 
     Should not affect the cache state.
 
+    Most devices are checked using the PVs cache, the device holders, and
+    the signatures found by udev, without running LVM commands. Running
+    "pvcreate --test" is needed only for the devices we cannot check.
+
     Receives guids iterable.
     Returns (un)pvables, (un)succeed guids.
     """
+    pvs = {pv.guid: pv for pv in getAllPVs() if not pv.is_stale()}
+
+    unusedDevs = set()
+    usedDevs = set()
+    uncheckedDevs = []
+
+    for guid in devices:
+        usable = _canCreatePV(guid, pvs.get(guid))
+        if usable is None:
+            uncheckedDevs.append(guid)
+        elif usable:
+            unusedDevs.add(guid)
+        else:
+            usedDevs.add(guid)
+
+    log.debug("Checked devices without pvcreate: unused: %s, used: %s, "
+              "unchecked: %s", len(unusedDevs), len(usedDevs),
+              len(uncheckedDevs))
+
+    if uncheckedDevs:
+        unused, used = _testPVCreate(uncheckedDevs, metadataSize)
+        unusedDevs.update(os.path.basename(d) for d in unused)
+        usedDevs.update(os.path.basename(d) for d in used)
+
+    return unusedDevs, usedDevs
+
+
+def _canCreatePV(guid, pv):
+    """
+    Return True if creating a PV on device guid should succeed, False if it
+    should fail, or None if we cannot tell without running pvcreate.
+    """
+    try:
+        dmId = devicemapper.getDmId(guid)
+        holders = devicemapper.getHolders(dmId)
+    except OSError:
+        return None
+
+    # Device used by active LVs or partitions mappings.
+    if holders:
+        return False
+
+    if pv is not None:
+        # pvcreate fails on a PV in a VG, but recreates an orphan PV.
+        if pv.vg_name == UNKNOWN:
+            return None
+        return not pv.vg_name
+
+    props = multipath.udev_properties(dmId)
+    if (props is None or
+            "DM_UDEV_RULES_VSN" not in props or
+            any(props.get(flag) == "1" for flag in UDEV_NOSCAN_FLAGS)):
+        return None
+
+    fsType = props.get("ID_FS_TYPE")
+
+    # A PV missing in the cache, maybe filtered by lvm.
+    if fsType == "LVM2_member":
+        return None
+
+    # pvcreate does not wipe existing signatures, and cannot use partitioned
+    # devices.
+    return not (fsType or "ID_PART_TABLE_TYPE" in props)
+
+
+def _testPVCreate(devices, metadataSize):
     devs = tuple("%s/%s" % (PV_PREFIX, dev) for dev in devices)
 
     options = ("--test",)
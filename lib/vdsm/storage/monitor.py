@@ -24,9 +24,14 @@ import logging
 import threading
 import time
 
+from collections import namedtuple
 
+from vdsm import executor
+from vdsm import schedule
 from vdsm import utils
 from vdsm.common import concurrent
+from vdsm.common import exception
+from vdsm.common.time import monotonic_time
 from vdsm.config import config
 from vdsm.storage import check
 from vdsm.storage import clusterlock
@@ -36,6 +41,17 @@ from vdsm.storage.sdc import sdCache
 
 log = logging.getLogger('storage.monitor')
 
+# Immutable snapshot of the status of all monitored domains, published by
+# DomainMonitor when a monitor updates its status, or when a domain is added
+# or removed. The version is incremented on every change, so readers can tell
+# if anything changed since the last snapshot they have seen. The statuses
+# dict must never be modified after the snapshot was published.
+StatusSnapshot = namedtuple("StatusSnapshot", "version, statuses")
+
+# Minimal delay (in seconds) before retrying to dispatch a scheduled monitor
+# cycle when the engine queue is full.
+DISPATCH_RETRY_DELAY = 1.0
+
 
 class Status(object):
 
@@ -139,6 +155,62 @@ class DomainStatus(object):
         self.version = -1
 
 
+class MonitorEngine(object):
+    """
+    Run domain monitors cycles using a bounded pool of worker threads,
+    instead of a thread per domain.
+
+    Each monitor runs one cycle at a time; when a cycle completes, the monitor
+    schedules the next cycle. If a cycle does not complete within timeout
+    seconds, the blocked worker is discarded and replaced by a new worker, so
+    a domain blocked on storage does not delay the other domains. The total
+    number of workers, including blocked workers, is limited by max_workers.
+    """
+
+    def __init__(self, workers, max_workers, timeout, max_tasks=1000):
+        self._timeout = timeout
+        self._scheduler = schedule.Scheduler(
+            name="monitor/scheduler", clock=monotonic_time)
+        self._executor = executor.Executor(
+            "monitor", workers, max_tasks, self._scheduler,
+            max_workers=max_workers, log=log)
+
+    def start(self):
+        self._scheduler.start()
+        self._executor.start()
+
+    def stop(self):
+        self._executor.stop(wait=False)
+        self._scheduler.stop()
+
+    def schedule(self, delay, func):
+        """
+        Run func in a worker after delay seconds. Returns a
+        schedule.ScheduledCall that can be used to cancel the call.
+        """
+        return self._scheduler.schedule(
+            delay, lambda: self._dispatch_scheduled(delay, func))
+
+    def dispatch(self, func):
+        """
+        Run func in a worker as soon as possible.
+        """
+        self._executor.dispatch(func, timeout=self._timeout)
+
+    def _dispatch_scheduled(self, delay, func):
+        """
+        Called in the scheduler thread. If the executor queue is full, the
+        cycle is scheduled again, so the monitor is not silently dropped.
+        """
+        try:
+            self.dispatch(func)
+        except exception.ResourceExhausted as e:
+            retry = max(delay, DISPATCH_RETRY_DELAY)
+            log.warning("Cannot dispatch %s: %s, retrying in %.1f seconds",
+                        func, e, retry)
+            self.schedule(retry, func)
+
+
 class DomainMonitor(object):
 
     def __init__(self, interval):
@@ -146,6 +218,20 @@ class DomainMonitor(object):
         self._shutting_down = False
         self._monitors = {}
         self._interval = interval
+        workers = config.getint("irs", "monitor_workers")
+        if workers > 0:
+            log.info("Monitoring domains using %s workers", workers)
+            self._engine = MonitorEngine(
+                workers,
+                config.getint("irs", "monitor_max_workers"),
+                config.getfloat("irs", "monitor_cycle_timeout"))
+            self._engine.start()
+        else:
+            self._engine = None
+        # Serializes publishing of new snapshots. Readers access the current
+        # snapshot without locking.
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = StatusSnapshot(0, {})
         # NOTE: This must be used in asynchronous mode to prevent blocking of
         # the checker event loop thread.
         self.onDomainStateChange = misc.Event(
@@ -196,9 +282,18 @@ class DomainMonitor(object):
                 hostId,
                 self._interval,
                 self.onDomainStateChange,
-                self._checker)
+                self._checker,
+                self._publishStatus,
+                self._engine)
             monitor.poolDomain = poolDomain
-            monitor.start()
+            # Add the domain to the snapshot before starting the monitor, so
+            # updates from the monitor thread are not dropped.
+            self._addStatus(sdUUID, monitor.getStatus())
+            try:
+                monitor.start()
+            except:
+                self._removeStatus(sdUUID)
+                raise
             # The domain should be added only after it successfully started.
             self._monitors[sdUUID] = monitor
 
@@ -217,9 +312,43 @@ class DomainMonitor(object):
         return sdUUID in self._monitors
 
     def getDomainsStatus(self):
-        with self._lock:
-            return [(sdUUID, monitor.getStatus()) for sdUUID, monitor in
-                    self._monitors.items()]
+        return list(self._snapshot.statuses.items())
+
+    def getStatusSnapshot(self):
+        """
+        Return the current StatusSnapshot. This does not take any lock and
+        does not copy anything, so it is cheap enough to call on every stats
+        request.
+        """
+        return self._snapshot
+
+    # Publishing status snapshots
+
+    def _addStatus(self, sdUUID, status):
+        with self._snapshot_lock:
+            self._replaceSnapshot(sdUUID, status)
+
+    def _removeStatus(self, sdUUID):
+        with self._snapshot_lock:
+            self._replaceSnapshot(sdUUID, None)
+
+    def _publishStatus(self, sdUUID, status):
+        """
+        Called by monitors when their status was updated. Status of domains
+        which are not monitored any more are ignored.
+        """
+        with self._snapshot_lock:
+            if sdUUID in self._snapshot.statuses:
+                self._replaceSnapshot(sdUUID, status)
+
+    def _replaceSnapshot(self, sdUUID, status):
+        # Must be called when holding self._snapshot_lock.
+        statuses = dict(self._snapshot.statuses)
+        if status is None:
+            statuses.pop(sdUUID, None)
+        else:
+            statuses[sdUUID] = status
+        self._snapshot = StatusSnapshot(self._snapshot.version + 1, statuses)
 
     def getHostStatus(self, domains):
         status = {}
@@ -253,6 +382,8 @@ class DomainMonitor(object):
 
         self._stopMonitors(list(self._monitors.values()), shutdown=True)
         self._checker.stop()
+        if self._engine:
+            self._engine.stop()
 
     def _stopMonitors(self, monitors, shutdown=False):
         # The domain monitor issues events that might become raceful if
@@ -278,13 +409,39 @@ class DomainMonitor(object):
             except KeyError:
                 log.warning("Montior for %s removed while stopping",
                             monitor.sdUUID)
+            self._removeStatus(monitor.sdUUID)
 
 
 class MonitorThread(object):
-
-    def __init__(self, sdUUID, hostId, interval, changeEvent, checker):
-        self.thread = concurrent.thread(self._run, log=log,
-                                        name="monitor/" + sdUUID[:7])
+    """
+    Monitor a storage domain.
+
+    The monitor runs monitoring cycles every interval seconds. The cycles are
+    run by a dedicated thread, or if engine is specified, by the engine
+    workers.
+
+    Monitor state machine:
+
+    - setting up: produce the domain, start checking the monitoring path and
+      detect iso domain, retrying every cycle until everything succeeds.
+    - monitoring: check domain status and acquire the host id if needed.
+    - stopped: stop checking the monitoring path, release the host id and
+      tear down the domain.
+    """
+
+    def __init__(self, sdUUID, hostId, interval, changeEvent, checker,
+                 publish=None, engine=None):
+        self.engine = engine
+        if engine is None:
+            self.thread = concurrent.thread(self._run, log=log,
+                                            name="monitor/" + sdUUID[:7])
+        else:
+            self.thread = None
+        # Used only when running in engine.
+        self._stepLock = threading.Lock()
+        self._inStep = False
+        self._nextStep = None
+        self._stopped = threading.Event()
         self.stopEvent = threading.Event()
         self.domain = None
         self.sdUUID = sdUUID
@@ -292,6 +449,7 @@ class MonitorThread(object):
         self.interval = interval
         self.changeEvent = changeEvent
         self.checker = checker
+        self.publish = publish or _NULL_PUBLISH
         self.lock = threading.Lock()
         self.monitoringPath = None
         # For backward compatibility, we must present a fake status before
@@ -306,18 +464,42 @@ class MonitorThread(object):
         self.refreshTime = \
             config.getfloat("irs", "repo_stats_cache_refresh_timeout")
         self.wasShutdown = False
+        self.isSetUp = False
         # Used for synchronizing during the tests
         self.cycleCallback = _NULL_CALLBACK
 
     def start(self):
-        self.thread.start()
+        if self.engine is None:
+            self.thread.start()
+        else:
+            log.debug("Domain monitor for %s started", self.sdUUID)
+            with self._stepLock:
+                self._nextStep = self.engine.schedule(0, self._step)
 
     def stop(self, shutdown=False):
         self.wasShutdown = shutdown
         self.stopEvent.set()
+        if self.engine is None:
+            return
+
+        with self._stepLock:
+            # If a cycle is running, it will stop the monitor when it
+            # completes.
+            if self._inStep:
+                return
+            if self._nextStep:
+                self._nextStep.cancel()
+            self._inStep = True
+
+        # Scheduled like a cycle, so the stop is retried if the engine queue
+        # is full, instead of leaving the monitor half stopped.
+        self.engine.schedule(0, self._stop)
 
     def join(self):
-        self.thread.join()
+        if self.engine is None:
+            self.thread.join()
+        else:
+            self._stopped.wait()
 
     def getStatus(self):
         return self.status
@@ -331,42 +513,96 @@ class MonitorThread(object):
         """ Accessed by methods decorated with @util.cancelpoint """
         return self.stopEvent.is_set()
 
+    # Running in a thread
+
     def _run(self):
         log.debug("Domain monitor for %s started", self.sdUUID)
         try:
-            self._setupLoop()
-            self._monitorLoop()
+            while True:
+                self._cycle()
+                if self.stopEvent.wait(self.interval):
+                    raise utils.Canceled
         except utils.Canceled:
             log.debug("Domain monitor for %s canceled", self.sdUUID)
         finally:
-            log.debug("Domain monitor for %s stopped (shutdown=%s)",
-                      self.sdUUID, self.wasShutdown)
-            self._stopCheckingPath()
-            if self._shouldReleaseHostId():
-                self._releaseHostId()
-            if self._shouldTeardownDomain():
-                self._teardownDomain()
-            self.domain = None
+            self._finish()
 
-    # Setting up
+    # Running in engine
 
-    def _setupLoop(self):
+    def _step(self):
         """
-        Set up the monitor, retrying on failures. Returns when the monitor is
-        ready.
+        Called in an engine worker to run one cycle and schedule the next
+        cycle, or stop the monitor if it was stopped during the cycle.
         """
-        while True:
+        with self._stepLock:
+            # stop() took over.
+            if self._inStep:
+                return
+            self._inStep = True
+
+        try:
+            if not self.stopEvent.is_set():
+                self._cycle()
+        except utils.Canceled:
+            log.debug("Domain monitor for %s canceled", self.sdUUID)
+
+        with self._stepLock:
+            if not self.stopEvent.is_set():
+                self._inStep = False
+                self._nextStep = self.engine.schedule(
+                    self.interval, self._step)
+                return
+
+        self._stop()
+
+    def _stop(self):
+        """
+        Called in an engine worker to stop the monitor.
+        """
+        try:
+            self._finish()
+        finally:
+            self._stopped.set()
+
+    # Monitor life cycle
+
+    def _cycle(self):
+        """
+        Run one monitor cycle, setting up the monitor if needed.
+        """
+        if not self.isSetUp:
             try:
                 self._setupMonitor()
-                return
             except Exception as e:
                 log.exception("Setting up monitor for %s failed", self.sdUUID)
                 domain_status = DomainStatus(error=e)
                 status = Status(self.status._path_status, domain_status)
                 self._updateStatus(status)
                 self.cycleCallback()
-                if self.stopEvent.wait(self.interval):
-                    raise utils.Canceled
+                return
+            self.isSetUp = True
+
+        try:
+            self._monitorDomain()
+        except Exception:
+            log.exception("Domain monitor for %s failed", self.sdUUID)
+        finally:
+            self.cycleCallback()
+
+    def _finish(self):
+        """
+        Called when the monitor was stopped, must not raise!
+        """
+        log.debug("Domain monitor for %s stopped (shutdown=%s)",
+                  self.sdUUID, self.wasShutdown)
+        self._stopCheckingPath()
+        if self._shouldReleaseHostId():
+            self._releaseHostId()
+        if self._shouldTeardownDomain():
+            self._teardownDomain()
+        self.domain = None
+
+    # Setting up
 
     def _setupMonitor(self):
         # Pick up changes in the domain, for example, domain upgrade.
@@ -404,20 +640,6 @@ class MonitorThread(object):
 
     # Monitoring
 
-    def _monitorLoop(self):
-        """
-        Monitor the domain peroidically until the monitor is stopped.
-        """
-        while True:
-            try:
-                self._monitorDomain()
-            except Exception:
-                log.exception("Domain monitor for %s failed", self.sdUUID)
-            finally:
-                self.cycleCallback()
-            if self.stopEvent.wait(self.interval):
-                raise utils.Canceled
-
     def _monitorDomain(self):
         # Pick up changes in the domain, for example, domain upgrade.
         if self._shouldRefreshDomain():
@@ -466,6 +688,8 @@ class MonitorThread(object):
         if self._statusDidChange(status):
             self._notifyStatusChanges(status)
         self.status = status
+        # NOTE: Called from the checker event loop thread, must not block.
+        self.publish(self.sdUUID, status)
 
     def _statusDidChange(self, status):
         # Wait until status contains actual data
@@ -615,3 +839,7 @@ class MonitorThread(object):
 
 def _NULL_CALLBACK():
     pass
+
+
+def _NULL_PUBLISH(sdUUID, status):
+    pass
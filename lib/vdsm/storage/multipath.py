@@ -36,8 +36,8 @@ from contextlib import closing
 from vdsm import utils
 from vdsm.common import cmdutils
 from vdsm.common import commands
+from vdsm.common import concurrent
 from vdsm.common import supervdsm
-from vdsm.common import udevadm
 from vdsm.common.compat import subprocess
 from vdsm.config import config
 from vdsm.storage import devicemapper
@@ -55,6 +55,16 @@ TOXIC_CHARS = '()*+?|^$.\\'
 
 POLL_INTERVAL = 1.0
 
+# Interval for checking if udev has processed new or resized devices.
+UDEV_POLL_INTERVAL = 0.1
+
+# udev database, having an entry for every device processed by udev.
+UDEV_DATA = "/run/udev/data"
+
+# multipathd handles one command at a time, but running several commands
+# concurrently hides the overhead of starting multipathd client.
+RESIZE_WORKERS = 8
+
 log = logging.getLogger("storage.multipath")
 
 _SCSI_ID = cmdutils.CommandPath("scsi_id",
@@ -84,26 +94,49 @@ def rescan():
     refresh the mapping table. New devices can be found under /dev/mapper
 
     Should only be called from hsm._rescanDevices()
+
+    Returns dict of phase name: duration in seconds.
     """
+    timings = {}
 
-    # First rescan iSCSI and FCP connections
-    iscsi.rescan()
-    hba.rescan()
+    # Used to find the disks resized by the rescan.
+    disks = _scsi_disks()
+
+    # First rescan iSCSI and FCP connections. They use different hosts, so
+    # we can scan them concurrently. Both scan all their hosts concurrently.
+    def scan(phase):
+        name, func = phase
+        start = time.monotonic()
+        func()
+        timings[name] = time.monotonic() - start
+
+    for res in concurrent.tmap(
+            scan, [("iscsi", iscsi.rescan), ("fc", hba.rescan)],
+            max_workers=2, name="rescan"):
+        if not res.succeeded:
+            log.error("Scanning devices failed: %s", res.value)
 
     # Now wait until multipathd is ready.
-    wait_until_ready()
+    timings.update(wait_until_ready(disks))
 
+    log.info("Rescanned devices (%s)", _format_timings(timings))
+    return timings
 
-def wait_until_ready():
+
+def wait_until_ready(disks=None):
     """
     Wait until multipathd is ready after new devices were added.
 
     SCSI rescan or connecting to new target trigger udev events when the
-    kernel add the new SCSI devices. We can use udevadm to wait for
-    these events.  We see in the logs that udevadm returns quickly,
-    before multipathd started to process the new devices, but we can use
-    "multipathd show status" to wait until multipathd processed all the
-    new devices.
+    kernel add the new SCSI devices, or when the size of a device changed.
+    We wait until udev processed the new devices, and the devices resized
+    since disks were collected by _scsi_disks(); unlike "udevadm settle",
+    this does not wait for events of unrelated devices. We see in the logs
+    that udev completes quickly, before multipathd started to process the
+    new devices, but we can use "multipathd show status" to wait until
+    multipathd processed all the new devices.
+
+    Returns dict of phase name: duration in seconds.
     """
     timeout = config.getint('multipath', 'wait_timeout')
     start = time.monotonic()
@@ -111,7 +144,9 @@ def wait_until_ready():
 
     log.info("Waiting until multipathd is ready")
 
-    udevadm.settle(timeout)
+    _wait_for_udev(deadline, disks)
+    udev_done = time.monotonic()
+    timings = {"udev": udev_done - start}
 
     # We treat multipath as ready it reaches steady state - reporting
     # that it is ready in the last 2 intervals.
@@ -132,11 +167,126 @@ def wait_until_ready():
             log.warning(
                 "Timeout waiting for multipathd (tries=%s, ready=%s)",
                 tries, ready)
+            break
+    else:
+        log.info(
+            "Waited %.2f seconds for multipathd (tries=%s, ready=%s)",
+            time.monotonic() - start, tries, ready)
+
+    timings["multipathd"] = time.monotonic() - udev_done
+    return timings
+
+
+def _wait_for_udev(deadline, disks=None):
+    """
+    Wait until udev processed all the SCSI disks, and the change events of
+    the disks resized since disks were collected, or until deadline.
+    """
+    pending = dict.fromkeys(_unprocessed_scsi_disks())
+    if disks:
+        pending.update(_resized_scsi_disks(disks))
+    if pending:
+        log.debug("Waiting until udev processes devices %s", sorted(pending))
+
+    while pending:
+        if time.monotonic() >= deadline:
+            log.warning("Timeout waiting for udev to process devices %s",
+                        sorted(pending))
             return
+        time.sleep(UDEV_POLL_INTERVAL)
+        pending = {name: mtime for name, mtime in pending.items()
+                   if not _udev_processed(name, mtime)}
+
+
+def _unprocessed_scsi_disks():
+    return {os.path.basename(path)
+            for path in glob(os.path.join(SYS_BLOCK, "sd*"))
+            if not _udev_processed(os.path.basename(path))}
+
+
+def _scsi_disks():
+    """
+    Return dict of SCSI disk name: (size, udev database entry mtime). The
+    mtime is None if udev did not process the disk yet.
+    """
+    disks = {}
+    for path in glob(os.path.join(SYS_BLOCK, "sd*")):
+        name = os.path.basename(path)
+        try:
+            with open(os.path.join(path, "size")) as f:
+                size = f.read().strip()
+        except FileNotFoundError:
+            continue
+        disks[name] = (size, _udev_mtime(name))
+    return disks
+
+
+def _resized_scsi_disks(disks):
+    """
+    Return dict of disk name: udev database entry mtime, for the disks
+    resized since disks were collected, whose change event was not
+    processed yet. udev updates the database entry when processing the
+    change event.
+    """
+    resized = {}
+    for name, (size, mtime) in _scsi_disks().items():
+        old_size, old_mtime = disks.get(name, (size, None))
+        if size != old_size and old_mtime is not None and mtime == old_mtime:
+            resized[name] = old_mtime
+    return resized
+
+
+def _udev_mtime(name):
+    try:
+        with open(os.path.join(SYS_BLOCK, name, "dev")) as f:
+            devno = f.read().strip()
+        return os.stat(os.path.join(UDEV_DATA, "b" + devno)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _udev_processed(name, mtime=None):
+    """
+    Return True if udev processed the block device, or if the device was
+    removed. If mtime is specified, return True if udev processed another
+    event since the udev database entry was modified at mtime.
+    """
+    try:
+        with open(os.path.join(SYS_BLOCK, name, "dev")) as f:
+            devno = f.read().strip()
+    except FileNotFoundError:
+        return True
+    try:
+        st = os.stat(os.path.join(UDEV_DATA, "b" + devno))
+    except FileNotFoundError:
+        return False
+    return mtime is None or st.st_mtime_ns != mtime
+
+
+def udev_properties(name):
+    """
+    Return the properties of block device name (e.g. "dm-3") from the udev
+    database, or None if udev did not process the device.
+    """
+    try:
+        with open(os.path.join(SYS_BLOCK, name, "dev")) as f:
+            devno = f.read().strip()
+        with open(os.path.join(UDEV_DATA, "b" + devno)) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+
+    props = {}
+    for line in lines:
+        if line.startswith("E:"):
+            key, _, value = line[2:].rstrip("\n").partition("=")
+            props[key] = value
+    return props
+
 
-    log.info(
-        "Waited %.2f seconds for multipathd (tries=%s, ready=%s)",
-        time.monotonic() - start, tries, ready)
+def _format_timings(timings):
+    return ", ".join("{}={:.2f}".format(name, timings[name])
+                     for name in sorted(timings))
 
 
 def is_ready():
@@ -218,16 +368,32 @@ def resize_devices():
     server after the initial discovery.
     """
     log.info("Resizing multipath devices")
-    with utils.stopwatch(
-            "Resizing multipath devices", level=logging.INFO, log=log):
-        for dmId, guid in getMPDevsIter():
-            try:
-                _resize_if_needed(guid)
-            except Exception:
-                log.exception("Could not resize device %s", guid)
+    start = time.monotonic()
+
+    # Checking sizes is quick, resizing is slow, so we check all devices
+    # first, and resize only the devices that need it in one batch.
+    names = []
+    for dmId, guid in getMPDevsIter():
+        try:
+            if _needs_resize(guid):
+                names.append(guid)
+        except Exception:
+            log.exception("Could not resize device %s", guid)
+
+    checked = time.monotonic()
+    timings = {"check": checked - start}
+
+    if names:
+        for name, error in resize_maps(names).items():
+            log.error("Could not resize device %s: %s", name, error)
+
+    timings["resize"] = time.monotonic() - checked
+    log.info("Resized %d multipath devices (%s)",
+             len(names), _format_timings(timings))
+    return timings
 
 
-def _resize_if_needed(guid):
+def _needs_resize(guid):
     name = devicemapper.getDmId(guid)
     slaves = [(slave, getDeviceSize(slave))
               for slave in devicemapper.getSlaves(name)]
@@ -246,10 +412,39 @@ def _resize_if_needed(guid):
 
     log.info("Resizing map %r (map_size=%d, slave_size=%d)",
              guid, map_size, slave_size)
-    resize_map(name)
     return True
 
 
+def resize_maps(names):
+    """
+    Invoke multipathd to resize devices, running up to RESIZE_WORKERS
+    commands concurrently.
+    Must run as root
+
+    Returns dict of name: error message for the maps that could not be
+    resized.
+    """
+    if os.geteuid() != 0:
+        return supervdsm.getProxy().multipath_resize_maps(names)
+
+    # Results are reported in completion order, so every result must
+    # include the map name.
+    def resize(name):
+        try:
+            resize_map(name)
+        except Exception as e:
+            return name, str(e)
+        return name, None
+
+    errors = {}
+    for res in concurrent.tmap(
+            resize, names, max_workers=RESIZE_WORKERS, name="resize"):
+        name, error = res.value
+        if error is not None:
+            errors[name] = error
+    return errors
+
+
 def resize_map(name):
     """
     Invoke multipathd to resize a device
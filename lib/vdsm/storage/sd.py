@@ -1066,6 +1066,27 @@ class StorageDomain(object):
     def getAllVolumes(self):
         return self._manifest.getAllVolumes()
 
+    def activateImages(self, images):
+        """
+        Activate the volumes of multiple images.
+
+        Arguments:
+            images (dict): {imgUUID: volUUIDs} of the images to activate.
+
+        Returns:
+            dict {imgUUID: imgPath}, mapping the images to the directory
+            holding the image volumes.
+        """
+        return {imgUUID: self.activateVolumes(imgUUID, volUUIDs)
+                for imgUUID, volUUIDs in images.items()}
+
+    def deactivateImages(self, imgUUIDs):
+        """
+        Deactivate all the volumes belonging to the images.
+        """
+        for imgUUID in imgUUIDs:
+            self.deactivateImage(imgUUID)
+
     def dump(self, full=False):
         return self._manifest.dump(full=full)
 
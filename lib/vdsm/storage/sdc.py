@@ -24,13 +24,17 @@ for keeping storage related data that is expensive to harvest, but needed often
 """
 from __future__ import absolute_import
 
+import functools
 import logging
+import os
 import threading
 
 from vdsm import utils
+from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import lvm
 from vdsm.storage import misc
+from vdsm.storage import mount
 from vdsm.storage import multipath
 
 
@@ -69,11 +73,17 @@ class StorageDomainCache:
         self.__inProgress = set()
         self.__staleStatus = self.STORAGE_STALE
         self.knownSDs = {}  # {sdUUID: mod.findDomain}
+        # Domains found by scanning all lookup sources, valid until the next
+        # storage refresh or invalidation.
+        self._indexLock = threading.Lock()
+        self.__epoch = 0
+        self.__index = None  # (epoch, {sdUUID: findMethod})
 
     def invalidateStorage(self):
         self.log.info("Invalidating storage domain cache")
         with self._syncroot:
             self.__staleStatus = self.STORAGE_STALE
+            self.__epoch += 1
 
     @misc.samplingmethod
     def refreshStorage(self, resize=True):
@@ -82,7 +92,9 @@ class StorageDomainCache:
                 "Refreshing storage domain cache",
                 level=logging.INFO,
                 log=self.log):
-            self.__staleStatus = self.STORAGE_REFRESHING
+            with self._syncroot:
+                self.__staleStatus = self.STORAGE_REFRESHING
+                self.__epoch += 1
 
             multipath.rescan()
             if resize:
@@ -156,6 +168,106 @@ class StorageDomainCache:
         return findMethod(sdUUID)
 
     def _findUnfetchedDomain(self, sdUUID):
+        """
+        Find a domain using the domains index, scanning all lookup sources
+        once per refresh epoch. Domains missing in the index are looked up
+        again, since they may have become available after the scan.
+        """
+        index = self._getIndex()
+        try:
+            findMethod = index[sdUUID]
+        except KeyError:
+            return self._lookupDomain(sdUUID)
+
+        return findMethod()
+
+    def _getIndex(self):
+        with self._indexLock:
+            with self._syncroot:
+                epoch = self.__epoch
+                if self.__index is not None and self.__index[0] == epoch:
+                    return self.__index[1]
+
+            index, complete = self._scanDomains()
+
+            # If the storage was invalidated during the scan, the index will
+            # be used only by the current lookups. An incomplete index is
+            # never reused, so the next lookup scans again.
+            if complete:
+                with self._syncroot:
+                    self.__index = (epoch, index)
+
+            return index
+
+    def _scanDomains(self):
+        """
+        Scan all block and file domains in one pass, returning a dict mapping
+        sdUUID to method returning the domain, and False if scanning some of
+        the lookup sources failed.
+
+        When a domain is found more than once, use the same order as
+        _lookupDomain: block, gluster, local and nfs domains.
+        """
+        from vdsm.storage import blockSD
+        from vdsm.storage import fileSD
+        from vdsm.storage import glusterSD
+        from vdsm.storage import localFsSD
+        from vdsm.storage import nfsSD
+        from vdsm.storage import sd
+
+        self.log.info("Scanning storage domains")
+        with utils.stopwatch(
+                "Scanning storage domains",
+                level=logging.INFO,
+                log=self.log):
+            found = {}  # {sdUUID: (order, findMethod)}
+            complete = True
+
+            def add(sdUUID, order, findMethod):
+                if sdUUID not in found or order < found[sdUUID][0]:
+                    found[sdUUID] = (order, findMethod)
+
+            try:
+                for vg in lvm.getAllVGs():
+                    if blockSD._isSD(vg):
+                        add(vg.name, 0, functools.partial(
+                            blockSD.BlockStorageDomain, vg.name))
+            except Exception:
+                self.log.error("Error while scanning block domains",
+                               exc_info=True)
+                complete = False
+
+            try:
+                mounted = {m.fs_file for m in mount.iterMounts()}
+
+                # Scans also gluster domains mounted under glusterSD/.
+                for sdUUID, domainPath in fileSD.scanDomains("*"):
+                    mountpoint = os.path.dirname(domainPath)
+                    client_name = os.path.relpath(
+                        mountpoint, sc.REPO_MOUNT_DIR)
+                    if client_name.startswith(sd.GLUSTERSD_DIR + "/"):
+                        if mountpoint in mounted:
+                            add(sdUUID, 1, functools.partial(
+                                glusterSD.GlusterStorageDomain, domainPath))
+                    elif client_name.startswith("_"):
+                        add(sdUUID, 2, functools.partial(
+                            localFsSD.LocalFsStorageDomain, domainPath))
+                    elif mountpoint in mounted:
+                        add(sdUUID, 3, functools.partial(
+                            nfsSD.NfsStorageDomain, domainPath))
+            except Exception:
+                self.log.error("Error while scanning file domains",
+                               exc_info=True)
+                complete = False
+
+        index = {sdUUID: findMethod
+                 for sdUUID, (_, findMethod) in found.items()}
+        return index, complete
+
+    def _lookupDomain(self, sdUUID):
+        """
+        Look up a single domain in all lookup sources.
+        """
         from vdsm.storage import blockSD
         from vdsm.storage import glusterSD
         from vdsm.storage import localFsSD
@@ -200,6 +312,35 @@ class StorageDomainCache:
         with self._syncroot:
             lvm.invalidateCache()
             self.__domainCache.clear()
+            self.__epoch += 1
+
+    def refreshDomain(self, sdUUID):
+        """
+        Look up sdUUID again and replace the cached domain, without
+        invalidating the rest of the cache or rescanning storage.
+
+        Raises se.StorageDomainDoesNotExist if the domain cannot be found.
+        """
+        self.log.info("Refreshing domain %s", sdUUID)
+        with self._syncroot:
+            while sdUUID in self.__inProgress:
+                self._syncroot.wait()
+            self.__domainCache.pop(sdUUID, None)
+            self.__inProgress.add(sdUUID)
+
+        try:
+            lvm.invalidateVG(sdUUID)
+            findMethod = self.knownSDs.get(sdUUID, self._lookupDomain)
+            domain = findMethod(sdUUID)
+
+            with self._syncroot:
+                self.__domainCache[sdUUID] = domain
+                return domain
+
+        finally:
+            with self._syncroot:
+                self.__inProgress.remove(sdUUID)
+                self._syncroot.notifyAll()
 
     def manuallyAddDomain(self, domain):
         self.log.info(
@@ -332,6 +332,10 @@ class StoragePool(object):
 
             self.log.debug("spm lock acquired successfully")
 
+            # The previous SPM may have allocated or released volume metadata
+            # slots.
+            blockSD.invalidate_metadata_slots()
+
             try:
                 self.lver = int(oldlver) + 1
 
@@ -1048,6 +1052,9 @@ class StoragePool(object):
                                                  mstVers)
 
                 dom.attach(self.spUUID)
+                # Another pool SPM may have allocated or released volume
+                # metadata slots while the domain was detached.
+                blockSD.invalidate_metadata_slots(sdUUID)
                 domains[sdUUID] = sd.DOM_ATTACHED_STATUS
                 self._backend.setDomainsMap(domains)
                 self._refreshDomainLinks(dom)
@@ -1081,6 +1088,7 @@ class StoragePool(object):
 
         self._backend.setDomainsMap(domains)
         self._cleanupDomainLinks(sdUUID)
+        blockSD.invalidate_metadata_slots(sdUUID)
 
         # If the domain that we are detaching is the master domain
         # we attempt to stop the SPM before releasing the host id
@@ -1205,6 +1213,7 @@ class StoragePool(object):
         if dom.getDomainClass() == sd.DATA_DOMAIN:
             self._convertDomain(dom)
 
+        blockSD.invalidate_metadata_slots(sdUUID)
         dom.activate()
         # set domains also do rebuild
         domainStatuses[sdUUID] = sd.DOM_ACTIVE_STATUS
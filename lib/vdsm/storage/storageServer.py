@@ -25,9 +25,11 @@ import logging
 from os.path import normpath
 import os
 import socket
+from collections import deque
 from collections import namedtuple
 import six
 import sys
+import threading
 
 from vdsm.config import config
 from vdsm import utils
@@ -35,6 +37,7 @@ from vdsm.common import concurrent
 from vdsm.common import supervdsm
 from vdsm.common import udevadm
 from vdsm.common.marks import deprecated
+from vdsm.common.time import monotonic_time
 from vdsm.gluster import cli as gluster_cli
 from vdsm.gluster import exception as ge
 from vdsm.storage import exception as se
@@ -81,22 +84,123 @@ log = logging.getLogger("storage.storageServer")
 
 class Connection:
 
+    # Connections with a connect thread still running, possibly from a
+    # previous call that timed out.
+    _connecting = set()
+    _connecting_lock = threading.Lock()
+
     @classmethod
     def connect_all(cls, connections):
-        results = []
+        return [(con, cls._connect(con)) for con in connections]
 
-        for con in connections:
-            try:
-                con.connect()
-            except Exception as err:
-                log.exception("Could not connect to storage server")
-                status, _ = cls.translate_error(err)
-            else:
-                status = 0
+    @classmethod
+    def _connect(cls, con):
+        try:
+            con.connect()
+        except Exception as err:
+            log.exception("Could not connect to storage server")
+            status, _ = cls.translate_error(err)
+        else:
+            status = 0
 
-            results.append((con, status))
+        return status
 
-        return results
+    @classmethod
+    def _connect_concurrently(cls, connections, max_workers, timeout, name):
+        """
+        Connect using up to max_workers threads, waiting up to timeout seconds
+        for every connection. Results are reported in the order of
+        connections.
+
+        A connection that did not complete in time is reported as failed.
+        Its thread is left running in the background and does not count as a
+        worker, so a hung connection does not delay other connections. Until
+        this thread completes, the connection is reported as failed without
+        connecting again.
+        """
+        # Connections are hashable and equal connections use the same
+        # resources, so connect only once to equal connections.
+        unique = list(dict.fromkeys(connections))
+
+        if max_workers < 1:
+            log.warning("Number of parallel connections (%d) is less then 1, "
+                        "using only one thread", max_workers)
+            max_workers = 1
+        max_workers = min(len(unique), max_workers)
+
+        log.info("Connecting to %s storage servers using %s workers",
+                 len(unique), max_workers)
+
+        cond = threading.Condition()
+        pending = deque(unique)
+        started = {}
+        statuses = {}
+        running = 0
+
+        def connect(con):
+            try:
+                status = cls._connect(con)
+            finally:
+                with Connection._connecting_lock:
+                    Connection._connecting.discard(con)
+            nonlocal running
+            with cond:
+                # Ignore connections that timed out.
+                if con not in statuses:
+                    statuses[con] = status
+                    running -= 1
+                cond.notify()
+
+        with cond:
+            while True:
+                while pending and running < max_workers:
+                    con = pending.popleft()
+                    with Connection._connecting_lock:
+                        in_progress = con in Connection._connecting
+                        if not in_progress:
+                            Connection._connecting.add(con)
+                    if in_progress:
+                        log.error("Connection to %s is still in progress",
+                                  con)
+                        status, _ = cls.translate_error(
+                            se.MountError("Connection to storage server is "
+                                          "still in progress"))
+                        statuses[con] = status
+                        continue
+                    started[con] = monotonic_time()
+                    running += 1
+                    concurrent.thread(
+                        connect,
+                        args=(con,),
+                        name="{}/{}".format(name, len(started)),
+                        log=log).start()
+
+                now = monotonic_time()
+                deadlines = []
+                for con, start in started.items():
+                    if con in statuses:
+                        continue
+                    deadline = start + timeout
+                    if now >= deadline:
+                        log.error("Timeout connecting to %s after %s seconds",
+                                  con, timeout)
+                        status, _ = cls.translate_error(
+                            se.MountError("Timeout connecting to storage "
+                                          "server"))
+                        statuses[con] = status
+                        running -= 1
+                    else:
+                        deadlines.append(deadline)
+
+                if len(statuses) == len(unique):
+                    break
+
+                if pending and running < max_workers:
+                    continue
+
+                cond.wait(min(deadlines) - now)
+
+        return [(con, statuses[con]) for con in connections]
 
     @classmethod
     def disconnect_all(cls, connections):
@@ -202,6 +306,14 @@ class MountConnection(Connection):
     def getLocalPathBase(cls):
         return cls.localPathBase
 
+    @classmethod
+    def connect_all(cls, connections):
+        return cls._connect_concurrently(
+            connections,
+            max_workers=config.getint("irs", "parallel_mounts"),
+            timeout=config.getint("irs", "mount_timeout"),
+            name="mount")
+
     @classmethod
     def translate_error(cls, e):
         if isinstance(e, mount.MountError):
@@ -520,6 +632,14 @@ class NFSConnection(Connection):
         optionsString = ",".join(options + extraOptions)
         self._mountCon = MountConnection(id, export, "nfs", optionsString)
 
+    @classmethod
+    def connect_all(cls, connections):
+        return cls._connect_concurrently(
+            connections,
+            max_workers=config.getint("irs", "parallel_mounts"),
+            timeout=config.getint("irs", "mount_timeout"),
+            name="mount")
+
     def connect(self):
         return self._mountCon.connect()
 
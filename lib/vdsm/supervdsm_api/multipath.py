@@ -29,6 +29,11 @@ def multipath_resize_map(name):
     return multipath.resize_map(name)
 
 
+@expose
+def multipath_resize_maps(names):
+    return multipath.resize_maps(names)
+
+
 @expose
 def multipath_is_ready():
     return multipath.is_ready()
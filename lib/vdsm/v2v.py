@@ -29,10 +29,14 @@ from __future__ import division
 
 from collections import namedtuple
 from contextlib import closing, contextmanager
+import copy
 import errno
+import hashlib
 import io
+import json
 import logging
 import os
+import queue
 import re
 import tarfile
 import time
@@ -56,6 +60,7 @@ from vdsm.common.logutils import traceback
 from vdsm.common.time import monotonic_time
 from vdsm.common.units import MiB
 from vdsm.constants import P_VDSM_LOG, P_VDSM_RUN, EXT_KVM_2_OVIRT
+from vdsm.storage import qemuimg
 from vdsm.utils import NICENESS, IOCLASS
 
 try:
@@ -67,6 +72,11 @@ except ImportError:
 _lock = threading.Lock()
 _jobs = {}
 
+# Configuration of external VMs by uri and VM name, used to avoid fetching
+# disks information of VMs which did not change since the last listing.
+_vms_cache_lock = threading.Lock()
+_vms_cache = {}
+
 _V2V_DIR = os.path.join(P_VDSM_RUN, 'v2v')
 _LOG_DIR = os.path.join(P_VDSM_LOG, 'import')
 _VIRT_V2V = cmdutils.CommandPath('virt-v2v', '/usr/bin/virt-v2v')
@@ -176,12 +186,10 @@ def get_external_vms(uri, username, password, vm_names=None):
                            'message': str(e)}}
 
     with closing(conn):
-        vms = []
-        for vm in _list_domains(conn):
-            if vm_names is not None and vm.name() not in vm_names:
-                # Skip this VM.
-                continue
-            _add_vm(conn, vms, vm)
+        domains = [vm for vm in _list_domains(conn)
+                   if vm_names is None or vm.name() in vm_names]
+        vms = _get_vms(conn, uri, username, password, domains,
+                       full=vm_names is None)
         return {'status': doneCode, 'vmList': vms}
 
 
@@ -219,8 +227,12 @@ def convert_external_vm(uri, username, password, vminfo, job_id, irs):
 
 
 def convert_ova(ova_path, vminfo, job_id, irs):
-    command = OvaCommand(ova_path, vminfo, job_id, irs)
-    job = ImportVm(job_id, command)
+    if vminfo.get('streaming', False):
+        command = OvaStreamCommand(ova_path, vminfo, job_id, irs)
+        job = OvaStreamImport(job_id, command)
+    else:
+        command = OvaCommand(ova_path, vminfo, job_id, irs)
+        job = ImportVm(job_id, command)
     job.start()
     _add_job(job_id, job)
     return response.success()
@@ -323,6 +335,12 @@ def _validate_job_finished(job):
         raise JobNotDone("Job %r is %s" % (job.id, job.status))
 
 
+def _write_ovf(job_id, ovf):
+    file_name = os.path.join(_V2V_DIR, "%s.ovf" % job_id)
+    with open(file_name, 'w') as f:
+        f.write(ovf)
+
+
 def _read_ovf(job_id):
     file_name = os.path.join(_V2V_DIR, "%s.ovf" % job_id)
     try:
@@ -624,6 +642,54 @@ class OvaCommand(V2VCommand):
             yield self._start_helper()
 
 
+class OvaStreamCommand(V2VCommand):
+    """
+    Copy the disks of a tar OVA to the prepared volumes without converting
+    the guest, for OVAs which do not need conversion, like OVAs exported by
+    oVirt.
+
+    The tar headers are read once to find the offsets of the OVA members,
+    and every disk is copied by qemu-img reading the disk range in the OVA,
+    so the OVA is read once and nothing is extracted.
+    """
+
+    def __init__(self, ova_path, vminfo, vmid, irs):
+        super(OvaStreamCommand, self).__init__(vminfo, vmid, irs)
+        self._ova_path = ova_path
+
+    @contextmanager
+    def execute(self):
+        """
+        Prepare the volumes and yield list of OvaDiskCopy, in the order of
+        the disks in vminfo.
+        """
+        members = _index_tar_ova(self._ova_path)
+        ovf = _read_ovf_from_ova_index(self._ova_path, members)
+        disks = _ova_disks(ovf, members)
+        if len(disks) != len(self._vminfo['disks']):
+            raise InvalidInputError(
+                'Job %r has %d disks, but the OVA has %d disks' %
+                (self._vmid, len(self._vminfo['disks']), len(disks)))
+
+        with self._volumes():
+            copies = []
+            for (member, fmt), drive in zip(disks, self._prepared_volumes):
+                operation = qemuimg.convert(
+                    _ova_member_image(self._ova_path, member),
+                    drive['path'],
+                    srcFormat=fmt,
+                    dstFormat=self._get_disk_format(),
+                    create=False)
+                copies.append(OvaDiskCopy(member.name, member.size,
+                                          operation))
+            yield copies
+            _write_ovf(self._vmid, ovf)
+
+    def _query_v2v_caps(self):
+        # virt-v2v is not used.
+        self._v2v_caps = frozenset()
+
+
 class XenCommand(V2VCommand):
     """
     Importing Xen via virt-v2v require to use xen+ssh protocol.
@@ -946,6 +1012,58 @@ class ImportVm(object):
                 self._proc.wait()
 
 
+class OvaStreamImport(ImportVm):
+    """
+    Import VM using OvaStreamCommand, reporting progress by the number of
+    bytes copied of all the disks.
+    """
+
+    def __init__(self, job_id, command):
+        super(OvaStreamImport, self).__init__(job_id, command)
+        self._total_size = 0
+        self._copied_size = 0
+        self._current = None
+
+    @property
+    def progress(self):
+        if not self._total_size:
+            return 0
+        copied = self._copied_size
+        current = self._current
+        if current is not None:
+            copied += current.size * current.operation.progress / 100
+        return int(copied * 100 // self._total_size)
+
+    def _import(self):
+        logging.info('Job %r starting streaming import', self._id)
+
+        with self._command.execute() as copies:
+            self._total_size = sum(c.size for c in copies)
+            for i, disk_copy in enumerate(copies, 1):
+                if self._aborted:
+                    raise V2VError('Job %r was aborted' % self._id)
+                self._status = STATUS.COPYING_DISK
+                self._description = 'Copying disk %d/%d' % (i, len(copies))
+                logging.info("Job %r copying disk %d/%d from %r (%d bytes)",
+                             self._id, i, len(copies), disk_copy.name,
+                             disk_copy.size)
+                self._current = disk_copy
+                disk_copy.operation.run()
+                self._current = None
+                self._copied_size += disk_copy.size
+
+        if self._status != STATUS.ABORTED:
+            self._status = STATUS.DONE
+            logging.info('Job %r finished import successfully', self._id)
+
+    def _abort(self):
+        self._aborted = True
+        current = self._current
+        if current is not None:
+            logging.debug('Job %r aborting copy of %r', self._id, current.name)
+            current.operation.abort()
+
+
 class OutputParser(object):
     COPY_DISK_RE = re.compile(br'.*(Copying disk (\d+)/(\d+)).*')
     DISK_PROGRESS_RE = re.compile(br'\s+\((\d+).*')
@@ -1038,48 +1156,213 @@ def _list_domains(conn):
                     yield vm
 
 
-def _add_vm(conn, vms, vm):
+class _ConnectionPool(object):
+    """
+    Connections to the external hypervisor, opened when needed.
+
+    Some hypervisors (e.g. VMware) handle one request at a time per
+    connection, so getting VMs information in parallel requires multiple
+    connections.
+    """
+
+    def __init__(self, conn, uri, username, password, size):
+        self._conn = conn
+        self._uri = uri
+        self._username = username
+        self._password = password
+        self._size = size
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._opened = []
+        self._idle = queue.Queue()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def lookup(self, conn, vm):
+        """
+        Return the domain of vm using conn.
+        """
+        if conn is self._conn:
+            return vm
+        try:
+            return conn.lookupByName(vm.name())
+        except libvirt.libvirtError as e:
+            logging.warning("Error looking up vm %r, using the main "
+                            "connection: %s", vm.name(), e)
+            return vm
+
+    def close(self):
+        for conn in self._opened:
+            try:
+                conn.close()
+            except libvirt.libvirtError:
+                logging.exception("Error closing connection to %s",
+                                  self._uri)
+
+    def _get(self):
+        try:
+            return self._idle.get(block=False)
+        except queue.Empty:
+            pass
+
+        # Reserve a slot before opening, so concurrent callers do not open
+        # more than size connections.
+        with self._lock:
+            can_open = self._reserved + 1 < self._size
+            if can_open:
+                self._reserved += 1
+
+        if can_open:
+            try:
+                conn = libvirtconnection.open_connection(
+                    uri=self._uri,
+                    username=self._username,
+                    passwd=self._password)
+            except libvirt.libvirtError as e:
+                logging.warning("Error opening connection to %s: %s",
+                                self._uri, e)
+                with self._lock:
+                    self._reserved -= 1
+            else:
+                with self._lock:
+                    self._opened.append(conn)
+                return conn
+
+        return self._idle.get()
+
+
+def _get_vms(conn, uri, username, password, domains, full):
+    """
+    Return list of VMs information for domains, in the order of domains,
+    getting the information of multiple VMs in parallel.
+    """
+    if not domains:
+        return []
+
+    size = min(len(domains), config.getint('v2v', 'inventory_connections'))
+    pool = _ConnectionPool(conn, uri, username, password, max(size, 1))
+
+    with _vms_cache_lock:
+        cache = dict(_vms_cache.get(uri, {}))
+
+    updated = {}
+
+    def get_vm(item):
+        index, vm = item
+        with pool.connection() as worker_conn:
+            params = _get_vm(worker_conn, pool.lookup(worker_conn, vm),
+                             cache, updated)
+        return index, params
+
+    start = monotonic_time()
+    try:
+        results = concurrent.tmap(
+            get_vm,
+            list(enumerate(domains)),
+            max_workers=max(size, 1),
+            name="v2v/inventory")
+        vms = [None] * len(domains)
+        for res in results:
+            if not res.succeeded:
+                raise res.value
+            index, params = res.value
+            vms[index] = params
+    finally:
+        pool.close()
+
+    # Drop VMs missing in a full listing.
+    if not full:
+        cache.update(updated)
+    else:
+        cache = updated
+    with _vms_cache_lock:
+        _vms_cache[uri] = cache
+
+    logging.info("Got information of %d external VMs in %.2f seconds "
+                 "(updated: %d)", len(domains), monotonic_time() - start,
+                 len(updated))
+
+    return [params for params in vms if params is not None]
+
+
+def _get_vm(conn, vm, cache, updated):
+    """
+    Return VM information, or None if the VM cannot be imported.
+
+    The configuration of the VM is taken from cache if the domain xml did
+    not change. Updated configuration is added to updated.
+    """
     params = {}
     try:
         _add_vm_info(vm, params)
     except libvirt.libvirtError as e:
         logging.error("error getting domain information: %s", e)
-        return
+        return None
     try:
         xml = vm.XMLDesc()
     except libvirt.libvirtError as e:
         logging.error("error getting domain xml for vm %r: %s",
                       vm.name(), e)
-        return
+        return None
+
+    name = params['vmName']
+    token = hashlib.sha256(
+        xml.encode("utf-8") if isinstance(xml, str) else xml).hexdigest()
+
+    entry = cache.get(name)
+    if entry is not None and entry[0] == token:
+        vm_config = entry[1]
+    else:
+        vm_config = _get_vm_config(conn, vm, xml)
+        if vm_config is None:
+            return None
+        # Different workers update different VMs.
+        updated[name] = (token, vm_config)
+
+    params.update(copy.deepcopy(vm_config))
+    _add_snapshot_info(conn, vm, params)
+    return params
+
+
+def _get_vm_config(conn, vm, xml):
+    """
+    Return the VM configuration from domain xml and disks information, or
+    None if the VM cannot be imported.
+    """
     try:
         root = ET.fromstring(xml)
     except ET.ParseError as e:
         logging.error('error parsing domain xml: %s', e)
-        return
+        return None
     if not _block_disk_supported(conn, root):
-        return
+        return None
+    params = {}
     try:
         _add_general_info(root, params)
     except InvalidVMConfiguration as e:
         logging.error("error adding general info: %s", e)
-        return
-    _add_snapshot_info(conn, vm, params)
+        return None
     _add_networks(root, params)
     _add_disks(root, params)
     _add_graphics(root, params)
     _add_video(root, params)
 
-    disk_info = None
     for disk in params['disks']:
         disk_info = _get_disk_info(conn, disk, vm)
         if disk_info is None:
-            break
+            logging.warning('Cannot add VM %s due to disk storage error',
+                            vm.name())
+            return None
         disk.update(disk_info)
-    if disk_info is not None:
-        vms.append(params)
-    else:
-        logging.warning('Cannot add VM %s due to disk storage error',
-                        vm.name())
+
+    return params
 
 
 def _block_disk_supported(conn, root):
@@ -1352,6 +1635,91 @@ def _read_ovf_from_zip_ova(ova_path):
     raise ClientError('OVA does not contains file with .ovf suffix')
 
 
+# File in a tar OVA; offset and size of the file data in the OVA in bytes.
+OvaMember = namedtuple('OvaMember', ['name', 'offset', 'size'])
+
+OvaDiskCopy = namedtuple('OvaDiskCopy', ['name', 'size', 'operation'])
+
+# Disk formats in OVF DiskSection format attribute.
+_OVF_DISK_FORMATS = (
+    ('vmdk', qemuimg.FORMAT.VMDK),
+    ('qcow', qemuimg.FORMAT.QCOW2),
+    ('wikipedia.org/wiki/Byte', qemuimg.FORMAT.RAW),
+)
+
+
+def _index_tar_ova(ova_path):
+    """
+    Return list of OvaMember for the files in uncompressed tar OVA, reading
+    only the tar headers.
+    """
+    try:
+        with tarfile.open(ova_path, 'r:') as tar:
+            return [OvaMember(os.path.normpath(m.name), m.offset_data, m.size)
+                    for m in tar if m.isfile()]
+    except tarfile.ReadError as e:
+        raise ClientError('Cannot index OVA %s: %s' % (ova_path, e))
+
+
+def _read_ovf_from_ova_index(ova_path, members):
+    for member in members:
+        if member.name.lower().endswith('.ovf'):
+            with open(ova_path, 'rb') as f:
+                f.seek(member.offset)
+                return f.read(member.size).decode('utf-8')
+    raise ClientError('OVA does not contains file with .ovf suffix')
+
+
+def _ova_disks(ovf, members):
+    """
+    Return list of (OvaMember, format) for the disks in the ovf.
+    """
+    ns = {'ovf': _OVF_NS}
+    try:
+        root = ET.fromstring(ovf)
+    except ET.ParseError as e:
+        raise V2VError('Error reading ovf from ova, position: %r' % e.position)
+
+    members = {m.name: m for m in members}
+    disks = []
+    for d in root.findall(".//ovf:DiskSection/ovf:Disk", ns):
+        fileref = d.attrib.get('{%s}fileRef' % _OVF_NS)
+        ref = root.find('.//ovf:References/ovf:File[@ovf:id="%s"]' %
+                        fileref, ns)
+        if ref is None:
+            raise V2VError('Error parsing ovf information: disk href info')
+        href = os.path.normpath(ref.attrib.get('{%s}href' % _OVF_NS))
+        if href not in members:
+            raise V2VError('OVA does not contain disk %r' % href)
+        disks.append((members[href],
+                      _ovf_disk_format(d.attrib.get('{%s}format' % _OVF_NS))))
+    return disks
+
+
+def _ovf_disk_format(uri):
+    for name, fmt in _OVF_DISK_FORMATS:
+        if uri and name in uri:
+            return fmt
+    raise V2VError('Unsupported disk format in ovf: %r' % uri)
+
+
+def _ova_member_image(ova_path, member):
+    """
+    Return qemu image filename reading member data from the OVA.
+    """
+    return 'json:' + json.dumps({
+        'file': {
+            'driver': 'raw',
+            'offset': member.offset,
+            'size': member.size,
+            'file': {
+                'driver': 'file',
+                'filename': ova_path,
+            },
+        },
+    })
+
+
 def _read_ovf_from_tar_ova(ova_path):
     with tarfile.open(ova_path) as tar:
         for member in tar:
@@ -22,6 +22,7 @@ from __future__ import absolute_import
 from __future__ import division
 
 from contextlib import contextmanager
+import copy
 import enum
 import xml.etree.ElementTree as etree
 
@@ -189,7 +190,7 @@ class MutableDomainDescriptor(object):
 
 class DomainDescriptor(MutableDomainDescriptor):
 
-    def __init__(self, xmlStr, xml_source=XmlSource.LIBVIRT):
+    def __init__(self, xmlStr, xml_source=XmlSource.LIBVIRT, generation=0):
         """
         :param xmlStr: Domain XML
         :type xmlStr: string
@@ -199,24 +200,30 @@ class DomainDescriptor(MutableDomainDescriptor):
           Device hash is None in such a case, to prevent Engine from
           retrieving and processing incomplete device information.
         :type xml_source: XmlSource
-        :type migration_src: bool
+        :param generation: Domain generation this XML was taken at, see
+          `Vm._domain_generation'.
+        :type generation: int
         """
         super(DomainDescriptor, self).__init__(xmlStr)
         self._xml = xmlStr
         self._xml_source = xml_source
+        self._generation = generation
         self._devices = super(DomainDescriptor, self).devices
-        if self._xml_source == XmlSource.INITIAL or \
-                self._xml_source == XmlSource.MIGRATION_SOURCE:
-            self._devices_hash = None
-        else:
-            self._devices_hash = super(DomainDescriptor, self).devices_hash
+        self._device_hashes = None
 
     @property
     def xml_source(self):
         return self._xml_source
 
+    @property
+    def generation(self):
+        return self._generation
+
     @property
     def xml(self):
+        # Descriptors created by the with_* methods serialize lazily.
+        if self._xml is None:
+            self._xml = xmlutils.tostring(self._dom, pretty=True)
         return self._xml
 
     @property
@@ -225,8 +232,118 @@ class DomainDescriptor(MutableDomainDescriptor):
 
     @property
     def devices_hash(self):
-        return self._devices_hash
+        if self._xml_source == XmlSource.INITIAL or \
+                self._xml_source == XmlSource.MIGRATION_SOURCE:
+            return None
+        return hash(self._get_device_hashes())
 
     @contextmanager
     def metadata_descriptor(self):
         yield metadata.Descriptor.from_tree(self._dom)
+
+    def find_device(self, alias):
+        """
+        Return the device element with the given alias.
+
+        :raises LookupError: if no such device exists
+        """
+        return self._devices[self._device_index(alias)]
+
+    # The methods below never modify this descriptor. They return a new
+    # descriptor sharing all the unchanged elements with this one, so the
+    # elements of a DomainDescriptor must be treated as read only.
+
+    def with_device_removed(self, alias, generation=None):
+        """
+        Return a new descriptor without the device with the given alias.
+
+        :param alias: alias of the device to remove
+        :type alias: string
+        :param generation: generation of the new descriptor, this
+          descriptor generation if not specified
+        :type generation: int
+        :raises LookupError: if no such device exists
+        """
+        index = self._device_index(alias)
+        return self._with_devices(
+            index, index + 1, (), generation=generation)
+
+    def with_metadata(self, md_elem, generation=None):
+        """
+        Return a new descriptor with the metadata element of the same
+        namespace, e.g. the one produced by metadata.Descriptor.to_tree(),
+        replaced by `md_elem'.
+
+        :param md_elem: metadata element, owned by the new descriptor
+        :type md_elem: DOM element
+        """
+        dom = copy.copy(self._dom)
+        old_md = vmxml.find_first(dom, 'metadata', None)
+        if old_md is None:
+            md = etree.Element('metadata')
+            dom.append(md)
+        else:
+            md = copy.copy(old_md)
+            dom[list(dom).index(old_md)] = md
+        for i, child in enumerate(md):
+            if child.tag == md_elem.tag:
+                md[i] = md_elem
+                break
+        else:
+            md.append(md_elem)
+        return self._derive(dom, self._devices, self._device_hashes,
+                            generation)
+
+    def _device_index(self, alias):
+        if self._devices is not None:
+            for i, dev in enumerate(self._devices):
+                if vmxml.find_attr(dev, 'alias', 'name') == alias:
+                    return i
+        raise LookupError("No device with alias %r" % alias)
+
+    def _with_devices(self, start, end, new_devices, generation=None):
+        devices = copy.copy(self._devices)
+        devices[start:end] = new_devices
+        dom = copy.copy(self._dom)
+        dom[list(dom).index(self._devices)] = devices
+        hashes = self._device_hashes
+        if hashes is not None:
+            # Only the new devices are hashed, the others keep their hash.
+            hashes = (hashes[:start] +
+                      tuple(_element_hash(dev) for dev in new_devices) +
+                      hashes[end:])
+        return self._derive(dom, devices, hashes, generation)
+
+    def _derive(self, dom, devices, device_hashes, generation):
+        desc = DomainDescriptor.__new__(DomainDescriptor)
+        desc._dom = dom
+        desc._id = self._id
+        desc._name = self._name
+        desc._xml = None
+        desc._xml_source = self._xml_source
+        desc._generation = (
+            self._generation if generation is None else generation)
+        desc._devices = devices
+        desc._device_hashes = device_hashes
+        return desc
+
+    def _get_device_hashes(self):
+        if self._devices is None:
+            return None
+        if self._device_hashes is None:
+            self._device_hashes = tuple(
+                _element_hash(dev) for dev in self._devices)
+        return self._device_hashes
+
+
+def _element_hash(element):
+    """
+    Return a structural hash of the element, insensitive to formatting
+    whitespace, without serializing it.
+    """
+    return hash((
+        element.tag,
+        frozenset(element.attrib.items()),
+        (element.text or '').strip(),
+        tuple(_element_hash(child) for child in element),
+    ))
@@ -21,8 +21,16 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections
+import logging
+import threading
+
 import libvirt
 
+from vdsm import metrics
+from vdsm.common import concurrent
+from vdsm.common.time import monotonic_time
+
 LIBVIRT_EVENTS = {
     libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE: 'LIFECYCLE',
     libvirt.VIR_DOMAIN_EVENT_ID_REBOOT: 'REBOOT',
@@ -33,7 +41,8 @@ LIBVIRT_EVENTS = {
     libvirt.VIR_DOMAIN_EVENT_GRAPHICS_INITIALIZE: 'GRAPHICS_INITIALIZE',
     libvirt.VIR_DOMAIN_EVENT_GRAPHICS_DISCONNECT: 'GRAPHICS_DISCONNECT',
     libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG: 'WATCHDOG',
-    libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED: 'JOB_COMPLETED'
+    libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED: 'JOB_COMPLETED',
+    libvirt.VIR_DOMAIN_EVENT_ID_MIGRATION_ITERATION: 'MIGRATION_ITERATION',
 }
 
 
@@ -42,3 +51,165 @@ def event_name(event_id):
         return LIBVIRT_EVENTS[event_id]
     except KeyError:
         return "Unknown id {!r}".format(event_id)
+
+
+# Handlers running longer than this (in seconds) are logged.
+_SLOW_HANDLER = 1.0
+
+
+class Dispatcher(object):
+    """
+    Run libvirt event handlers on a pool of worker threads, so slow
+    handlers do not block the libvirt event loop thread, or the events of
+    other VMs.
+
+    Events of the same VM are kept in a queue and handled in order, one at
+    a time. Workers take one event from each VM with pending events in
+    turn.
+
+    The time events wait in the queue, the handlers run time and the queue
+    depth are collected per event type, see stats(), and sent as metrics.
+    """
+
+    def __init__(self, name, workers, log=None):
+        self._name = name
+        self._workers = workers
+        self._log = log or logging.getLogger("virt.events")
+        self._cond = threading.Condition(threading.Lock())
+        self._running = False
+        self._threads = []
+        # vm_id: deque of (event_id, queued_time, func). A VM is in
+        # _queues while it has pending events, or while a worker handles
+        # its event; it is in _ready when a worker can take its next event.
+        self._queues = {}
+        self._ready = collections.deque()
+        self._stats = {}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self._workers):
+            t = concurrent.thread(
+                self._run, name="%s/%d" % (self._name, i), log=self._log)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """
+        Stop the workers. Pending events are dropped.
+        """
+        with self._cond:
+            self._running = False
+            self._queues.clear()
+            self._ready.clear()
+            self._cond.notify_all()
+        self._threads = []
+
+    def dispatch(self, vm_id, event_id, func):
+        """
+        Queue func for handling event event_id of VM vm_id.
+        """
+        with self._cond:
+            if not self._running:
+                self._log.warning(
+                    "Dropping event %s for vm %s, dispatcher is not running",
+                    event_name(event_id), vm_id)
+                return
+            queue = self._queues.get(vm_id)
+            if queue is None:
+                queue = self._queues[vm_id] = collections.deque()
+                self._ready.append(vm_id)
+                self._cond.notify()
+            queue.append((event_id, monotonic_time(), func))
+            stats = self._event_stats(event_id)
+            stats.queued += 1
+            stats.max_depth = max(stats.max_depth, len(queue))
+
+    def stats(self):
+        """
+        Return dict with statistics per event name. Latencies and handler
+        times are in seconds.
+        """
+        with self._cond:
+            return {
+                event_name(event_id): stats.info()
+                for event_id, stats in self._stats.items()
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ready:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                vm_id = self._ready.popleft()
+                event_id, queued, func = self._queues[vm_id].popleft()
+            start = monotonic_time()
+            try:
+                func()
+            except Exception:
+                self._log.exception(
+                    "Error handling event %s for vm %s",
+                    event_name(event_id), vm_id)
+            end = monotonic_time()
+            if end - start > _SLOW_HANDLER:
+                self._log.warning(
+                    "Handling event %s for vm %s took %.2f seconds",
+                    event_name(event_id), vm_id, end - start)
+            with self._cond:
+                self._event_stats(event_id).add(start - queued, end - start)
+                queue = self._queues.get(vm_id)
+                depth = len(queue) if queue else 0
+                if queue:
+                    self._ready.append(vm_id)
+                    self._cond.notify()
+                elif queue is not None:
+                    del self._queues[vm_id]
+            prefix = "events." + event_name(event_id)
+            metrics.send({
+                prefix + ".latency": start - queued,
+                prefix + ".time": end - start,
+                prefix + ".depth": depth,
+            })
+
+    def _event_stats(self, event_id):
+        # Must be called when holding _cond.
+        stats = self._stats.get(event_id)
+        if stats is None:
+            stats = self._stats[event_id] = _EventStats()
+        return stats
+
+
+class _EventStats(object):
+
+    def __init__(self):
+        self.queued = 0
+        self.handled = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, latency, handler_time):
+        self.handled += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_time += handler_time
+        self.max_time = max(self.max_time, handler_time)
+
+    def info(self):
+        handled = self.handled or 1
+        return {
+            "queued": self.queued,
+            "handled": self.handled,
+            "pending": self.queued - self.handled,
+            "max_depth": self.max_depth,
+            "avg_latency": self.total_latency / handled,
+            "max_latency": self.max_latency,
+            "avg_time": self.total_time / handled,
+            "max_time": self.max_time,
+        }
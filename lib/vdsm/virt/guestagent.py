@@ -33,7 +33,6 @@ import weakref
 
 import six
 
-from vdsm import utils
 from vdsm.common import filecontrol
 from vdsm.common import supervdsm
 from vdsm.common.units import MiB
@@ -342,6 +341,9 @@ class GuestAgent(object):
         if message == 'heartbeat':
             self.guestInfo['memUsage'] = int(args['free-ram'])
             if 'memory-stat' in args:
+                # Replace the stats instead of modifying them, they may be
+                # referenced by guest info returned from getGuestInfo().
+                memoryStats = dict(self.guestInfo['memoryStats'])
                 for k in ('mem_total', 'mem_unused', 'mem_buffers',
                           'mem_cached', 'swap_in', 'swap_out', 'pageflt',
                           'majflt'):
@@ -349,11 +351,11 @@ class GuestAgent(object):
                         continue
                     # Convert the value to string since 64-bit integer is not
                     # supported in XMLRPC
-                    self.guestInfo['memoryStats'][k] = str(
-                        args['memory-stat'][k])
+                    memoryStats[k] = str(args['memory-stat'][k])
                     if k == 'mem_unused':
-                        self.guestInfo['memoryStats']['mem_free'] = str(
+                        memoryStats['mem_free'] = str(
                             args['memory-stat']['mem_unused'])
+                self.guestInfo['memoryStats'] = memoryStats
 
             if 'apiVersion' in args:
                 # The guest agent supports API Versioning
@@ -457,6 +459,14 @@ class GuestAgent(object):
         return self.guestStatus
 
     def getGuestInfo(self):
+        """
+        Return a new dict with the guest information.
+
+        The values are shared with the agent state and with info returned
+        earlier. They are replaced, never modified, when the agents report
+        new data, so the caller may use them without copying, but must not
+        modify them. Replace a value to change it.
+        """
         # Prefer information from QEMU GA if available. Fall-back to oVirt GA
         # only for info that is not availble in QEMU GA.
         info = {
@@ -480,6 +490,8 @@ class GuestAgent(object):
                 info['guestFQDN'] = self.guestInfo['guestFQDN']
         qga = self._qgaGuestInfo()
         if qga is not None:
+            # The QEMU-GA info is a shared snapshot, copy before modifying.
+            qga = dict(qga)
             if 'diskMapping' in qga:
                 diskMapping.update(qga['diskMapping'])
                 del qga['diskMapping']
@@ -496,7 +508,7 @@ class GuestAgent(object):
                 del qga['appsList']
             info.update(qga)
         self.guestDiskMapping = diskMapping
-        return utils.picklecopy(info)
+        return info
 
     def onReboot(self):
         self.guestStatus = vmstatus.REBOOT_IN_PROGRESS
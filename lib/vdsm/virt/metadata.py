@@ -55,6 +55,7 @@ from contextlib import contextmanager
 import logging
 import operator
 import threading
+import types
 import xml.etree.ElementTree as ET
 
 import libvirt
@@ -86,6 +87,9 @@ _VM_CUSTOM = 'vm_custom'
 _VOLUME_CHAIN = 'volumeChain'
 _VOLUME_CHAIN_NODE = 'volumeChainNode'
 _VOLUME_INFO = 'volumeInfo'
+# Key of the values section in the Descriptor tree cache; device sections
+# are keyed by their index.
+_VALUES = 'values'
 _IGNORED_KEYS = (
     _VOLUME_INFO,
 )
@@ -407,6 +411,12 @@ class Descriptor(object):
         self._values = {}
         self._custom = {}
         self._devices = []
+        # True if the content was changed since it was loaded or dumped.
+        self._dirty = False
+        # (namespace, namespace_uri): {section: elements}. Elements built
+        # for the sections which did not change are reused.
+        self._trees = {}
+        self._flush_lock = threading.Lock()
 
     def __bool__(self):
         # custom properties may be missing, and that's fine.
@@ -508,13 +518,39 @@ class Descriptor(object):
         :param dom: domain to access
         :type dom: libvirt.Domain
         """
-        md_xml = self._build_xml()
-        dom.setMetadata(libvirt.VIR_DOMAIN_METADATA_ELEMENT,
-                        md_xml,
-                        self._namespace,
-                        self._namespace_uri)
-        self._log.debug(
-            'dumped metadata for %s: %s', dom.UUIDString(), md_xml)
+        with self._flush_lock:
+            with self._lock:
+                self._dirty = False
+                md_xml = xmlutils.tostring(self._build_tree(), pretty=True)
+            self._set_metadata(dom, md_xml)
+
+    def flush(self, dom):
+        """
+        Like dump(), but only if the content was changed since it was last
+        loaded or dumped. Concurrent flushes are coalesced: a flush waiting
+        for another one to finish does nothing if the changes were already
+        written by the other flush.
+
+        :param dom: domain to access
+        :type dom: libvirt.Domain
+        :returns: True if the metadata was written to the domain
+        :rtype: bool
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                self._dirty = False
+                md_xml = xmlutils.tostring(self._build_tree(), pretty=True)
+            self._set_metadata(dom, md_xml)
+            return True
+
+    @property
+    def dirty(self):
+        """
+        True if the content was changed since it was last loaded or dumped.
+        """
+        return self._dirty
 
     def to_xml(self):
         """
@@ -528,7 +564,8 @@ class Descriptor(object):
     def to_tree(self):
         """
         Produces a tree of Element representing the full content
-        of this Descriptor.
+        of this Descriptor. The tree shares elements with the trees
+        produced earlier, and must not be modified.
 
         :rtype: DOM element
         """
@@ -541,7 +578,7 @@ class Descriptor(object):
         Helper context manager to get and update the metadata of
         a given device.
         Any change performed to the device metadata is not committed
-        to the underlying libvirt.Domain until dump() is called.
+        to the underlying libvirt.Domain until dump() or flush() is called.
 
         :param dom: domain to access
         :type dom: libvirt.Domain
@@ -574,14 +611,19 @@ class Descriptor(object):
           'foo': 'bar'
         }
         """
-        dev_data = self._find_device(kwargs)
-        if dev_data is None:
-            dev_data = self._add_device(kwargs)
+        index = self._find_device(kwargs)
+        if index is None:
+            index = self._add_device(kwargs)
+        dev_data = self._devices[index][1]
         self._log.debug('device metadata: %s', dev_data)
         data = utils.picklecopy(dev_data)
         yield data
-        dev_data.clear()
-        dev_data.update(utils.picklecopy(data))
+        if data == dev_data:
+            return
+        with self._lock:
+            dev_data.clear()
+            dev_data.update(utils.picklecopy(data))
+            self._changed(index)
         self._log.debug('device metadata updated: %s', dev_data)
 
     @contextmanager
@@ -589,7 +631,7 @@ class Descriptor(object):
         """
         Helper context manager to get and update the metadata of the vm.
         Any change performed to the device metadata is not committed
-        to the underlying libvirt.Domain until dump() is called.
+        to the underlying libvirt.Domain until dump() or flush() is called.
 
         :rtype: Python dict, whose keys are always strings.
                 No nested objects are allowed.
@@ -599,10 +641,24 @@ class Descriptor(object):
         self._log.debug('values: %s', data)
         yield data
         with self._lock:
-            self._values.clear()
-            self._values.update(data)
+            if data == self._values:
+                return
+            # Replace, never modify, the values, see values_view().
+            self._values = data
+            self._changed(_VALUES)
         self._log.debug('values updated: %s', data)
 
+    def values_view(self):
+        """
+        Return a read only view of the metadata of the vm, for readers
+        which do not need the copy made by values(). The view is a
+        snapshot: later updates are not visible through it.
+
+        :rtype: Mapping, whose keys are always strings.
+        """
+        with self._lock:
+            return types.MappingProxyType(self._values)
+
     @property
     def custom(self):
         """
@@ -626,7 +682,12 @@ class Descriptor(object):
         :type values: dict, whose keys and values are strings.
                       No nesting allowed.
         """
-        self._custom.update(values)
+        with self._lock:
+            custom = self._custom.copy()
+            custom.update(values)
+            if custom != self._custom:
+                self._custom = custom
+                self._changed(_CUSTOM)
 
     def all_devices(self, **kwargs):
         """
@@ -705,17 +766,40 @@ class Descriptor(object):
             md_data.pop(_CUSTOM, None)
             md_data.pop(_DEVICE, None)
             self._values = md_data
+            self._dirty = False
+            self._trees = {}
+
+    def _changed(self, section):
+        # Must be called when holding _lock.
+        self._dirty = True
+        for tree in self._trees.values():
+            tree.pop(section, None)
 
     def _build_tree(self, namespace=None, namespace_uri=None):
+        # Must be called when holding _lock. Only the sections changed
+        # since the last build are dumped again, the elements of the other
+        # sections are shared with the previously built trees. This is safe
+        # since the built trees are never modified.
+        tree = self._trees.setdefault((namespace, namespace_uri), {})
         metadata_obj = Metadata(namespace, namespace_uri)
-        md_elem = metadata_obj.dump(self._name, **self._values)
-        for (attrs, data) in self._devices:
+        values = tree.get(_VALUES)
+        if values is None:
+            values = tree[_VALUES] = list(
+                metadata_obj.dump(self._name, **self._values))
+        md_elem = metadata_obj.make_element(self._name)
+        md_elem.extend(values)
+        for index, (attrs, data) in enumerate(self._devices):
             if data:
-                dev_elem = _dump_device(metadata_obj, data)
-                dev_elem.attrib.update(attrs)
+                dev_elem = tree.get(index)
+                if dev_elem is None:
+                    dev_elem = tree[index] = _dump_device(metadata_obj, data)
+                    dev_elem.attrib.update(attrs)
                 vmxml.append_child(md_elem, etree_child=dev_elem)
         if self._custom:
-            custom_elem = metadata_obj.dump(_CUSTOM, **self._custom)
+            custom_elem = tree.get(_CUSTOM)
+            if custom_elem is None:
+                custom_elem = tree[_CUSTOM] = metadata_obj.dump(
+                    _CUSTOM, **self._custom)
             vmxml.append_child(md_elem, etree_child=custom_elem)
         return md_elem
 
@@ -724,19 +808,36 @@ class Descriptor(object):
             md_elem = self._build_tree(namespace, namespace_uri)
             return xmlutils.tostring(md_elem, pretty=True)
 
+    def _set_metadata(self, dom, md_xml):
+        try:
+            dom.setMetadata(libvirt.VIR_DOMAIN_METADATA_ELEMENT,
+                            md_xml,
+                            self._namespace,
+                            self._namespace_uri)
+        except Exception:
+            with self._lock:
+                self._dirty = True
+            raise
+        self._log.debug(
+            'dumped metadata for %s: %s', dom.UUIDString(), md_xml)
+
     def _find_device(self, kwargs):
-        devices = list(self._matching_devices(kwargs))
-        if len(devices) > 1:
+        indexes = [
+            index for index, (dev_attrs, _) in enumerate(self._devices)
+            if _match_args(kwargs, dev_attrs)
+        ]
+        if len(indexes) > 1:
             raise MissingDevice()
-        if not devices:
+        if not indexes:
             return None
-        return devices[0]
+        return indexes[0]
 
     def _add_device(self, attrs):
-        data = {}
-        self._devices.append((attrs.copy(), data))
-        # yes, we want to return a mutable reference.
-        return data
+        # Devices are never removed, so the index of a device does not
+        # change until the next load.
+        with self._lock:
+            self._devices.append((attrs.copy(), {}))
+            return len(self._devices) - 1
 
 
 def _load_device(md_obj, dev):
@@ -24,6 +24,7 @@ from __future__ import division
 import io
 import collections
 import enum
+import operator
 import pickle
 import re
 import threading
@@ -34,7 +35,6 @@ import xml.etree.ElementTree as ET
 from vdsm.common import concurrent
 from vdsm.common import conv
 from vdsm.common import exception
-from vdsm.common import logutils
 from vdsm.common import response
 from vdsm import sslutils
 from vdsm import utils
@@ -43,11 +43,13 @@ from vdsm.config import config
 from vdsm.common import xmlutils
 from vdsm.common.define import NORMAL
 from vdsm.common.network.address import normalize_literal_addr
+from vdsm.common.time import monotonic_time
 from vdsm.common.units import MiB
 from vdsm.virt.utils import DynamicBoundedSemaphore
 from vdsm.virt.utils import VolumeSize
 
 from vdsm.virt import cpumanagement
+from vdsm.virt import migration_bandwidth
 from vdsm.virt import virdomain
 from vdsm.virt import vmexitreason
 from vdsm.virt import vmstatus
@@ -73,6 +75,15 @@ CONVERGENCE_SCHEDULE_SET_ABORT = "abort"
 ADDRESS = '0'
 PORT = 54321
 
+# Shortest interval (in seconds) between migration progress checks, when
+# the migration is about to converge.
+_MIN_MONITOR_INTERVAL = 1.0
+
+# Number of progress samples kept per migration.
+_MONITOR_HISTORY = 64
+
+_bandwidth_scheduler = migration_bandwidth.Scheduler()
+
 
 class MigrationDestinationSetupError(RuntimeError):
     """
@@ -224,6 +235,11 @@ class SourceThread(object):
                 (self._recovery and
                  self._vm.lastStatus == vmstatus.MIGRATION_SOURCE))
 
+    def on_migration_iteration(self, iteration):
+        monitor = self._monitorThread
+        if monitor is not None:
+            monitor.on_iteration(iteration)
+
     def needs_disk_refresh(self):
         """
         Return True if migrating to destination host, and the migration
@@ -728,9 +744,19 @@ class SourceThread(object):
 
     def _perform_with_conv_schedule(self, duri, muri):
         self._vm.log.debug('performing migration with conv schedule')
-        with utils.running(self._monitorThread):
-            self._perform_migration(duri, muri)
-        self._monitorThread.join()
+        scheduled = (self._maxBandwidth and
+                     config.getboolean('vars',
+                                       'migration_bandwidth_scheduling'))
+        if scheduled:
+            _bandwidth_scheduler.register(
+                self._vm.id, self._maxBandwidth, self._set_speed)
+        try:
+            with utils.running(self._monitorThread):
+                self._perform_migration(duri, muri)
+            self._monitorThread.join()
+        finally:
+            if scheduled:
+                _bandwidth_scheduler.unregister(self._vm.id)
 
     def _legacy_convergence_schedule(self, max_downtime):
         # Simplified emulation of legacy non-scheduled migrations.
@@ -757,6 +783,10 @@ class SourceThread(object):
         self._vm.log.debug('setting migration max bandwidth to %d', bandwidth)
         self._maxBandwidth = bandwidth
         self._dom.migrateSetMaxSpeed(bandwidth)  # pylint: disable=no-member
+        _bandwidth_scheduler.set_limit(self._vm.id, bandwidth)
+
+    def _set_speed(self, bandwidth):
+        self._dom.migrateSetMaxSpeed(bandwidth)  # pylint: disable=no-member
 
     def stop(self):
         # if its locks we are before the migrateToURI3()
@@ -834,125 +864,270 @@ def exponential_downtime(downtime, steps):
         yield downtime
 
 
+class MonitorService(object):
+    """
+    Drive the monitoring of all outgoing migrations from one thread.
+
+    Each monitor is checked when its next check is due, or sooner when it
+    is woken up, for example by a migration iteration event. The thread is
+    started when a monitor is added, and exits when no monitor is left.
+    """
+
+    def __init__(self, name='migmon', clock=monotonic_time):
+        self._name = name
+        self._clock = clock
+        self._cond = threading.Condition(threading.Lock())
+        # monitor: time of the next check
+        self._monitors = {}
+        self._thread = None
+
+    def add(self, monitor):
+        with self._cond:
+            self._monitors[monitor] = self._clock()
+            if self._thread is None:
+                self._thread = concurrent.thread(self._run, name=self._name)
+                self._thread.start()
+            self._cond.notify()
+
+    def wakeup(self, monitor):
+        """
+        Check the monitor as soon as possible. If the monitor is being
+        checked now, it is checked again right after that.
+        """
+        with self._cond:
+            if monitor in self._monitors:
+                self._monitors[monitor] = self._clock()
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                monitor = self._next_due()
+                if monitor is None:
+                    return
+                # A wakeup during the check moves the deadline from here.
+                self._monitors[monitor] = float('inf')
+            interval = monitor.check()
+            with self._cond:
+                if interval is None:
+                    del self._monitors[monitor]
+                else:
+                    self._monitors[monitor] = min(
+                        self._monitors[monitor], self._clock() + interval)
+
+    def _next_due(self):
+        # Must be called when holding _cond.
+        while True:
+            if not self._monitors:
+                self._thread = None
+                return None
+            monitor, deadline = min(
+                self._monitors.items(), key=operator.itemgetter(1))
+            now = self._clock()
+            if deadline <= now:
+                return monitor
+            self._cond.wait(deadline - now)
+
+
+_monitor_service = MonitorService()
+
+
+Sample = collections.namedtuple('Sample', [
+    'time_elapsed', 'data_remaining', 'dirty_rate', 'mem_bps',
+    'mem_iteration'
+])
+
+
 class MonitorThread(object):
+    """
+    Monitor an outgoing migration: report its progress, detect stalling
+    and execute the convergence schedule actions.
+
+    Despite the name, the monitor does not have its own thread; it is
+    checked periodically by the shared MonitorService, and immediately
+    on migration iteration events. Without the events, the monitor polls
+    more often when the migration is about to converge.
+    """
+
     _MIGRATION_MONITOR_INTERVAL = config.getint(
         'vars', 'migration_monitor_interval')  # seconds
 
-    def __init__(self, vm, startTime, conv_schedule):
+    def __init__(self, vm, startTime, conv_schedule, service=None):
         super(MonitorThread, self).__init__()
         self._stop = threading.Event()
+        self._done = threading.Event()
         self._vm = vm
         self._dom = DomainAdapter(self._vm)
         self._startTime = startTime
         self.daemon = True
         self.progress = None
         self._conv_schedule = conv_schedule
-        self._thread = concurrent.thread(
-            self.run, name='migmon/' + self._vm.id[:8])
+        self._service = service or _monitor_service
+        self._started = False
+        self._iteration_events = False
+        self._lowmark = None
+        self._initial_iteration = self._last_iteration = None
+        # Compact progress time series, for convergence decisions and for
+        # analyzing the migration after it finished.
+        self.history = collections.deque(maxlen=_MONITOR_HISTORY)
 
     def start(self):
-        self._thread.start()
+        if self.enabled:
+            self._vm.log.debug('starting migration monitor')
+            self._service.add(self)
+        else:
+            self._vm.log.info('migration monitor disabled'
+                              ' (monitoring interval set to 0)')
+            self._done.set()
 
     def join(self):
-        self._thread.join()
+        self._done.wait()
 
     @property
     def enabled(self):
         return MonitorThread._MIGRATION_MONITOR_INTERVAL > 0
 
-    @logutils.traceback()
-    def run(self):
-        if self.enabled:
-            self._vm.log.debug('starting migration monitor thread')
-            try:
-                self.monitor_migration()
-            except virdomain.NotConnectedError as e:
-                # In case the VM is stopped during migration, there is a race
-                # between domain disconnection and stopping the monitoring
-                # thread. Then the domain may no longer be connected when
-                # monitor_migration loop tries to access it. That's harmless
-                # and shouldn't bubble up, let's just finish the thread.
-                self._vm.log.debug('domain disconnected in monitor thread: %s',
-                                   e)
-            self._vm.log.debug('stopped migration monitor thread')
-        else:
-            self._vm.log.info('migration monitor thread disabled'
-                              ' (monitoring interval set to 0)')
-
-    def monitor_migration(self):
-        lowmark = None
-        initial_iteration = last_iteration = None
-
-        self._execute_init(self._conv_schedule['init'])
+    def on_iteration(self, iteration):
+        """
+        Called when libvirt reports a new migration iteration.
+        """
+        self._iteration_events = True
+        self._service.wakeup(self)
 
-        while not self._stop.isSet():
-            stopped = self._stop.wait(self._MIGRATION_MONITOR_INTERVAL)
-            if stopped:
-                break
+    def check(self):
+        """
+        Called by the monitor service.
 
-            try:
-                job_stats = self._vm.job_stats()
-            except libvirt.libvirtError as e:
-                if e.get_error_code() == libvirt.VIR_ERR_OPERATION_INVALID:
-                    # The migration stopped just now
-                    break
-                raise
-            # It may happen that the migration did not start yet
-            # so we'll keep waiting
-            if not ongoing(job_stats):
-                continue
-
-            progress = Progress.from_job_stats(job_stats)
-            if initial_iteration is None:
-                # The initial iteration number from libvirt is not
-                # fixed, since it may include iterations from
-                # previously cancelled migrations.
-                initial_iteration = last_iteration = progress.mem_iteration
-
-            self._vm.send_migration_status_event()
-
-            if self._vm.post_copy != PostCopyPhase.NONE:
-                # Post-copy mode is a final state of a migration -- it either
-                # completes or fails and stops the VM, there is no way to
-                # continue with the migration in either case.  So we won't
-                # handle any further schedule actions once post-copy is
-                # successfully started.  It's still recommended to put the
-                # abort action after the post-copy action in the schedule, for
-                # the case when it's not possible to switch to the post-copy
-                # mode for some reason.
-                if self._vm.post_copy == PostCopyPhase.RUNNING:
-                    # If post-copy is not RUNNING then we are in the interim
-                    # phase (which should be short) between initiating the
-                    # post-copy migration and the actual start of the post-copy
-                    # migration.  Nothing needs to be done in that case.
-                    self._vm.log.debug(
-                        'Post-copy migration still in progress: %d',
-                        progress.data_remaining
-                    )
-            elif (lowmark is None) or (lowmark > progress.data_remaining):
-                lowmark = progress.data_remaining
-            else:
-                self._vm.log.warn(
-                    'Migration stalling: remaining (%sMiB)'
-                    ' > lowmark (%sMiB).',
-                    progress.data_remaining // MiB, lowmark // MiB)
-
-            if not self._vm.post_copy and\
-               progress.mem_iteration > last_iteration:
-                last_iteration = progress.mem_iteration
-                current_iteration = last_iteration - initial_iteration
-                self._vm.log.debug('new iteration: %i', current_iteration)
-                self._next_action(current_iteration)
-
-            if self._stop.isSet():
-                break
+        :returns: seconds until the next check, or None if the monitoring
+          is finished.
+        """
+        try:
+            interval = self._check()
+        except virdomain.NotConnectedError as e:
+            # In case the VM is stopped during migration, there is a race
+            # between domain disconnection and stopping the monitor. Then
+            # the domain may no longer be connected when the monitor tries
+            # to access it. That's harmless and shouldn't bubble up, let's
+            # just finish the monitoring.
+            self._vm.log.debug('domain disconnected in monitor: %s', e)
+            interval = None
+        except Exception:
+            self._vm.log.exception('Error monitoring migration')
+            interval = None
+        if interval is None:
+            self._finish()
+        return interval
+
+    def _check(self):
+        if self._stop.is_set():
+            return None
+
+        if not self._started:
+            self._started = True
+            self._execute_init(self._conv_schedule['init'])
+            return self._MIGRATION_MONITOR_INTERVAL
 
-            self.progress = progress
-            self._vm.log.info('%s', progress)
+        try:
+            job_stats = self._vm.job_stats()
+        except libvirt.libvirtError as e:
+            if e.get_error_code() == libvirt.VIR_ERR_OPERATION_INVALID:
+                # The migration stopped just now
+                return None
+            raise
+        # It may happen that the migration did not start yet
+        # so we'll keep waiting
+        if not ongoing(job_stats):
+            return self._MIGRATION_MONITOR_INTERVAL
+
+        progress = Progress.from_job_stats(job_stats)
+        self.history.append(Sample(
+            progress.time_elapsed, progress.data_remaining,
+            progress.dirty_rate, progress.mem_bps, progress.mem_iteration))
+        if self._initial_iteration is None:
+            # The initial iteration number from libvirt is not
+            # fixed, since it may include iterations from
+            # previously cancelled migrations.
+            self._initial_iteration = progress.mem_iteration
+            self._last_iteration = progress.mem_iteration
+
+        self._vm.send_migration_status_event()
+
+        if self._vm.post_copy == PostCopyPhase.NONE:
+            dirty_rate = progress.dirty_rate * progress.mem_page_size
+        else:
+            # No more memory is dirtied on this side.
+            dirty_rate = 0
+        _bandwidth_scheduler.update(
+            self._vm.id, progress.data_remaining, dirty_rate)
+
+        if self._vm.post_copy != PostCopyPhase.NONE:
+            # Post-copy mode is a final state of a migration -- it either
+            # completes or fails and stops the VM, there is no way to
+            # continue with the migration in either case.  So we won't
+            # handle any further schedule actions once post-copy is
+            # successfully started.  It's still recommended to put the
+            # abort action after the post-copy action in the schedule, for
+            # the case when it's not possible to switch to the post-copy
+            # mode for some reason.
+            if self._vm.post_copy == PostCopyPhase.RUNNING:
+                # If post-copy is not RUNNING then we are in the interim
+                # phase (which should be short) between initiating the
+                # post-copy migration and the actual start of the post-copy
+                # migration.  Nothing needs to be done in that case.
+                self._vm.log.debug(
+                    'Post-copy migration still in progress: %d',
+                    progress.data_remaining
+                )
+        elif (self._lowmark is None or
+                self._lowmark > progress.data_remaining):
+            self._lowmark = progress.data_remaining
+        else:
+            self._vm.log.warn(
+                'Migration stalling: remaining (%sMiB)'
+                ' > lowmark (%sMiB).',
+                progress.data_remaining // MiB, self._lowmark // MiB)
+
+        if not self._vm.post_copy and\
+           progress.mem_iteration > self._last_iteration:
+            self._last_iteration = progress.mem_iteration
+            current_iteration = self._last_iteration - self._initial_iteration
+            self._vm.log.debug('new iteration: %i', current_iteration)
+            self._next_action(current_iteration)
+
+        if self._stop.is_set():
+            return None
+
+        self.progress = progress
+        self._vm.log.info('%s', progress)
+        return self._next_interval(progress)
+
+    def _next_interval(self, progress):
+        interval = self._MIGRATION_MONITOR_INTERVAL
+        if not self._iteration_events and progress.mem_bps > 0:
+            # Without iteration events, poll about once per iteration when
+            # the migration is about to converge, so the schedule actions
+            # are not delayed by the polling interval.
+            eta = progress.data_remaining / progress.mem_bps
+            interval = max(_MIN_MONITOR_INTERVAL, min(interval, eta))
+        return interval
+
+    def _finish(self):
+        if self.history:
+            self._vm.log.debug(
+                'Migration progress history (elapsed ms, remaining MiB,'
+                ' dirty rate, MiB/s, iteration): %s',
+                ' '.join(
+                    '%d,%d,%d,%d,%d' % (
+                        s.time_elapsed, s.data_remaining // MiB,
+                        s.dirty_rate, s.mem_bps // MiB, s.mem_iteration)
+                    for s in self.history))
+        self._vm.log.debug('stopped migration monitor')
+        self._done.set()
 
     def stop(self):
-        self._vm.log.debug('stopping migration monitor thread')
+        self._vm.log.debug('stopping migration monitor')
         self._stop.set()
+        self._service.wakeup(self)
 
     def _next_action(self, stalling):
         head = self._conv_schedule['stalling'][0]
@@ -994,7 +1169,7 @@ _Progress = collections.namedtuple('_Progress', [
     'data_processed', 'data_remaining',
     'mem_total', 'mem_processed', 'mem_remaining',
     'mem_bps', 'mem_constant', 'compression_bytes',
-    'dirty_rate', 'mem_iteration'
+    'dirty_rate', 'mem_iteration', 'mem_page_size'
 ])
 
 
@@ -1019,6 +1194,8 @@ class Progress(_Progress):
             stats.get('memory_dirty_rate', -1),
             # available since libvirt 1.3
             stats.get('memory_iteration', -1),
+            # available since libvirt 1.3
+            stats.get('memory_page_size', 4096),
         )
 
     def __str__(self):
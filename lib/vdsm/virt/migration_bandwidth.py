@@ -0,0 +1,222 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Host wide bandwidth scheduling of outgoing migrations.
+
+Engine limits the bandwidth of every outgoing migration, usually splitting
+the migration network bandwidth evenly between the concurrent migrations.
+With an even split, migrations of small VMs complete quickly while the
+migrations of large or busy VMs get the same bandwidth and finish much
+later.
+
+The scheduler keeps the sum of the limits, but redistributes it between
+the running migrations according to their remaining data and dirty rate,
+so all of them are expected to complete at the same time, minimizing the
+time needed to migrate all the VMs. The bandwidth is redistributed every
+time the progress of a migration is updated, and when a migration starts
+or ends. The bandwidth of completed migrations is given to the remaining
+ones, until all the migrations complete.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import collections
+import logging
+import threading
+
+from vdsm.common.units import MiB
+
+# Lowest bandwidth (MiB/s) given to a migration.
+MIN_BANDWIDTH = 1
+
+# Bandwidth changes smaller than this part of the current bandwidth are
+# not applied, to avoid calling libvirt for every small change.
+_MIN_CHANGE = 0.1
+
+
+Demand = collections.namedtuple('Demand', [
+    # Remaining data, in bytes.
+    'data_remaining',
+    # Rate of memory dirtying, in bytes per second.
+    'dirty_rate',
+])
+
+
+def allocate(total, demands):
+    """
+    Split total bandwidth between migrations, so all the migrations are
+    expected to complete at the same time.
+
+    Migration i with remaining data R(i) and dirty rate D(i) using bandwidth
+    B(i) is expected to complete in R(i) / (B(i) - D(i)). Solving for equal
+    completion times T, while using all the bandwidth:
+
+        B(i) = D(i) + R(i) / T
+        T = sum(R) / (total - sum(D))
+
+    If the bandwidth is not enough to catch up with the dirty rate of all
+    migrations, the bandwidth is split evenly.
+
+    :param total: total bandwidth, in MiB/s
+    :type total: int
+    :param demands: migration id: Demand
+    :type demands: dict
+    :returns: migration id: bandwidth in MiB/s. Every migration gets at
+      least MIN_BANDWIDTH.
+    :rtype: dict
+    """
+    if not demands:
+        return {}
+    total_bytes = total * MiB
+    dirty = sum(d.dirty_rate for d in demands.values())
+    remaining = sum(d.data_remaining for d in demands.values())
+    spare = total_bytes - dirty
+    if spare <= 0 or remaining <= 0:
+        share = max(MIN_BANDWIDTH, total // len(demands))
+        return {key: share for key in demands}
+    return {
+        key: max(MIN_BANDWIDTH, int(
+            (d.dirty_rate + d.data_remaining * spare / remaining) // MiB))
+        for key, d in demands.items()
+    }
+
+
+class _Migration(object):
+
+    def __init__(self, limit, set_speed):
+        self.limit = limit
+        self.set_speed = set_speed
+        self.bandwidth = limit
+        self.demand = None
+
+
+class Scheduler(object):
+    """
+    Redistribute the bandwidth limits of the running outgoing migrations.
+
+    Only migrations with a bandwidth limit take part; migrations with
+    unlimited bandwidth are not registered. The bandwidth of migrations
+    without progress information yet is their own limit.
+    """
+
+    _log = logging.getLogger('virt.migration.bandwidth')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._migrations = {}
+        # Highest sum of the limits since the first of the current
+        # migrations started.
+        self._budget = 0
+
+    def register(self, key, limit, set_speed):
+        """
+        Add a running migration.
+
+        :param key: migration id, e.g. the VM id
+        :param limit: bandwidth limit of the migration, in MiB/s
+        :type limit: int
+        :param set_speed: function changing the migration bandwidth,
+          accepting the bandwidth in MiB/s
+        :type set_speed: callable
+        """
+        with self._lock:
+            self._migrations[key] = _Migration(limit, set_speed)
+            self._budget = max(self._budget, self._limits())
+            changes = self._reschedule()
+        self._apply(changes)
+
+    def unregister(self, key):
+        with self._lock:
+            if self._migrations.pop(key, None) is None:
+                return
+            if not self._migrations:
+                self._budget = 0
+            changes = self._reschedule()
+        self._apply(changes)
+
+    def set_limit(self, key, limit):
+        """
+        Change the bandwidth limit of a migration, e.g. when Engine changes
+        it during the migration.
+        """
+        with self._lock:
+            migration = self._migrations.get(key)
+            if migration is None:
+                return
+            migration.limit = limit
+            # The limit may be lowered to make room for other traffic.
+            self._budget = self._limits()
+            changes = self._reschedule()
+        self._apply(changes)
+
+    def update(self, key, data_remaining, dirty_rate):
+        """
+        Update the progress of a migration.
+
+        :param data_remaining: remaining data, in bytes
+        :param dirty_rate: memory dirtying rate, in bytes per second
+        """
+        with self._lock:
+            migration = self._migrations.get(key)
+            if migration is None:
+                return
+            migration.demand = Demand(data_remaining, max(0, dirty_rate))
+            changes = self._reschedule()
+        self._apply(changes)
+
+    def bandwidth(self, key):
+        with self._lock:
+            return self._migrations[key].bandwidth
+
+    def _limits(self):
+        # Must be called when holding _lock.
+        return sum(m.limit for m in self._migrations.values())
+
+    def _reschedule(self):
+        # Must be called when holding _lock.
+        demands = {}
+        total = self._budget
+        for key, migration in self._migrations.items():
+            if migration.demand is None:
+                migration.bandwidth = migration.limit
+                total -= migration.limit
+            else:
+                demands[key] = migration.demand
+
+        changes = []
+        for key, bandwidth in allocate(total, demands).items():
+            migration = self._migrations[key]
+            if abs(bandwidth - migration.bandwidth) > \
+                    migration.bandwidth * _MIN_CHANGE:
+                migration.bandwidth = bandwidth
+                changes.append((key, migration.set_speed, bandwidth))
+        return changes
+
+    def _apply(self, changes):
+        for key, set_speed, bandwidth in changes:
+            self._log.debug(
+                'Setting migration %s bandwidth to %d MiB/s', key, bandwidth)
+            try:
+                set_speed(bandwidth)
+            except Exception:
+                self._log.exception(
+                    'Cannot set migration %s bandwidth', key)
@@ -33,11 +33,13 @@ import six
 
 from vdsm import executor
 from vdsm import host
+from vdsm import metrics
 from vdsm import throttledlog
 from vdsm.common import errors
 from vdsm.common import exception
 from vdsm.common import libvirtconnection
 from vdsm.config import config
+from vdsm.metrics import histogram
 from vdsm.virt import migration
 from vdsm.virt import recovery
 from vdsm.virt import sampling
@@ -94,7 +96,10 @@ def start(cif, scheduler):
                                   workers_count=_WORKERS,
                                   max_tasks=_TASKS,
                                   scheduler=scheduler,
-                                  max_workers=_MAX_WORKERS)
+                                  max_workers=_MAX_WORKERS,
+                                  wait_histogram=metrics.get_histogram(
+                                      'sampling.periodic.queue_wait',
+                                      histogram.TIME_BOUNDS))
 
     _executor.start()
 
@@ -478,18 +483,22 @@ def _create(cif, scheduler):
     ]
 
     if config.getboolean('sampling', 'enable'):
-        ops.extend([
-            # libvirt sampling using bulk stats can block, but unresponsive
-            # domains are handled inside VMBulkstatsMonitor for performance
-            # reasons; thus, does not need dispatching.
+        # libvirt sampling using bulk stats can block, but unresponsive
+        # domains are handled inside VMBulkstatsMonitor for performance
+        # reasons; thus, does not need dispatching. Expensive stats may be
+        # sampled less often, using a separate monitor.
+        ops.extend(
             Operation(
                 sampling.VMBulkstatsMonitor(
                     libvirtconnection.get(cif),
                     cif.getVMs,
-                    sampling.stats_cache),
-                config.getint('vars', 'vm_sample_interval'),
-                scheduler),
+                    sampling.stats_cache,
+                    stats_types=stats_types),
+                interval,
+                scheduler)
+            for stats_types, interval in sampling.stats_groups())
 
+        ops.extend([
             Operation(
                 sampling.HostMonitor(cif=cif),
                 config.getint('vars', 'host_sample_stats_interval'),
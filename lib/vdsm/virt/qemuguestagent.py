@@ -27,6 +27,7 @@ Periodic scheduler that polls QEMU Guest Agent for information.
 
 from collections import defaultdict
 import copy
+import functools
 import ipaddress
 import json
 import libvirt
@@ -37,6 +38,7 @@ import time
 
 from vdsm import utils
 from vdsm import executor
+from vdsm import metrics
 from vdsm.common import exception
 from vdsm.common.time import monotonic_time
 from vdsm.config import config
@@ -83,6 +85,9 @@ _HOTPLUG_CHECK_PERIOD = 10
 _INITIAL_INTERVAL = config.getint('guest_agent', 'qga_initial_info_interval')
 _TASK_TIMEOUT = config.getint('guest_agent', 'qga_task_timeout')
 _THROTTLING_INTERVAL = 60
+# The throttling interval doubles on each consecutive failure up to this
+# value.
+_MAX_THROTTLING_INTERVAL = 960
 
 
 # These values are needed internaly and are not defined by libvirt. Beware
@@ -177,12 +182,20 @@ class QemuGuestAgentPoller(object):
                                            scheduler=scheduler,
                                            max_workers=_MAX_WORKERS)
         self._operations = []
+        # The capabilities and guest info stores hold snapshots which are
+        # never modified once stored. Updates replace the snapshot, so the
+        # readers can use it without copying, but must not modify it.
         self._capabilities_lock = threading.Lock()
         self._capabilities = {}
         self._guest_info_lock = threading.Lock()
-        self._guest_info = defaultdict(dict)
+        self._guest_info = {}
         self._last_failure_lock = threading.Lock()
         self._last_failure = defaultdict(lambda: 0)
+        self._failure_count = defaultdict(int)
+        # VMs with a poll scheduled or running.
+        self._polling_lock = threading.Lock()
+        self._polling = set()
+        self._poll_stats = {}
         self._last_check_lock = threading.Lock()
         # Key is tuple (vm_id, command)
         self._last_check = defaultdict(lambda: 0)
@@ -191,6 +204,7 @@ class QemuGuestAgentPoller(object):
         self._channel_state_lock = threading.Lock()
         self._initial_interval = config.getint(
             'guest_agent', 'qga_initial_info_interval')
+        self._period = config.getint('guest_agent', 'qga_polling_period')
         self.log.info('Using libvirt for querying QEMU-GA')
 
     def start(self):
@@ -200,7 +214,7 @@ class QemuGuestAgentPoller(object):
             return
         self._operation = periodic.Operation(
             self._poller,
-            config.getint('guest_agent', 'qga_polling_period'),
+            self._period,
             self._scheduler,
             timeout=_TASK_TIMEOUT,
             executor=self._executor,
@@ -222,13 +236,16 @@ class QemuGuestAgentPoller(object):
         }
 
     def get_caps(self, vm_id):
-        with self._capabilities_lock:
-            caps = self._capabilities.get(vm_id, None)
-            if caps is None:
-                caps = self._empty_caps()
-                self._capabilities[vm_id] = caps
-            # Return a copy so the caller has a stable representation
-            return utils.picklecopy(caps)
+        """
+        Return the capabilities snapshot of the VM. The caller must not
+        modify it.
+        """
+        caps = self._capabilities.get(vm_id, None)
+        if caps is None:
+            with self._capabilities_lock:
+                caps = self._capabilities.setdefault(
+                    vm_id, self._empty_caps())
+        return caps
 
     def update_caps(self, vm_id, caps):
         if caps is None:
@@ -237,17 +254,27 @@ class QemuGuestAgentPoller(object):
             self.log.info(
                 "New QEMU-GA capabilities for vm_id=%s, qemu-ga=%s,"
                 " commands=%r", vm_id, caps['version'], caps['commands'])
+            # Copy once here so the caller cannot modify the snapshot.
+            caps = utils.picklecopy(caps)
             with self._capabilities_lock:
                 self._capabilities[vm_id] = caps
 
     def get_guest_info(self, vm_id):
-        with self._guest_info_lock:
-            # Return a copy so the caller has a stable representation
-            return utils.picklecopy(self._guest_info.get(vm_id, None))
+        """
+        Return the guest info snapshot of the VM, or None if there is no
+        information about the VM. The caller must not modify it.
+        """
+        return self._guest_info.get(vm_id, None)
 
     def update_guest_info(self, vm_id, info):
+        """
+        Publish a new guest info snapshot, merging `info` into the current
+        one. The values in `info` are owned by the store after this call.
+        """
         with self._guest_info_lock:
-            self._guest_info[vm_id].update(info)
+            new_info = dict(self._guest_info.get(vm_id, ()))
+            new_info.update(info)
+            self._guest_info[vm_id] = new_info
 
     def last_failure(self, vm_id):
         return self._last_failure[vm_id]
@@ -256,10 +283,32 @@ class QemuGuestAgentPoller(object):
         with self._last_failure_lock:
             if vm_id in self._last_failure:
                 del self._last_failure[vm_id]
+            self._failure_count.pop(vm_id, None)
 
     def set_failure(self, vm_id):
         with self._last_failure_lock:
             self._last_failure[vm_id] = monotonic_time()
+            self._failure_count[vm_id] += 1
+
+    def throttling_interval(self, vm_id):
+        """
+        Return the time (in sec) to skip the VM after the last failure.
+        The interval grows exponentially with consecutive failures, so
+        unresponsive agents do not slow down polling of the other VMs.
+        """
+        count = self._failure_count.get(vm_id, 0)
+        if count == 0:
+            return 0
+        return min(_THROTTLING_INTERVAL * 2 ** min(count - 1, 16),
+                   _MAX_THROTTLING_INTERVAL)
+
+    def poll_stats(self, vm_id):
+        """
+        Return dict with the duration (in sec) of the last poll of the VM
+        and the age (in sec) of the guest information at that time, or None
+        if the VM was not polled yet.
+        """
+        return self._poll_stats.get(vm_id)
 
     def last_check(self, vm_id, command):
         return self._last_check[(vm_id, command)]
@@ -420,89 +469,167 @@ class QemuGuestAgentPoller(object):
             self.set_last_check(vm.id, VDSM_GUEST_INFO_NETWORK, now)
 
     def _poller(self):
+        """
+        Dispatch polling of VMs with some work to do. The polls are spread
+        across the polling period, so the agents of many VMs are not
+        queried at the same time.
+        """
+        now = monotonic_time()
+        vms = []
         for vm_id, vm_obj in six.viewitems(self._cif.getVMs()):
-            now = monotonic_time()
-            # Check if there is any state hint to accept/reject
-            if self._channel_state_hint[vm_id] != CHANNEL_UNKNOWN:
-                # This does not need a lock because we don't care for the
-                # small race here. If we accept this hint we don't care for
-                # another and if we don't accept this hint we would reject
-                # another hint in the next run anyway.
-                hint = self._channel_state_hint[vm_id]
-                self._channel_state_hint[vm_id] = CHANNEL_UNKNOWN
-                hint_accepted = False
-                with self._channel_state_lock:
-                    # Note that we always prefer information we already have
-                    # to make sure we don't lose state changes that come from
-                    # events.
-                    if self._channel_state[vm_id] == CHANNEL_UNKNOWN:
-                        self._channel_state[vm_id] = hint
-                        hint_accepted = True
-                self.log.debug(
-                    '%s channel state hint for vm_id=%s, hint=%r',
-                    'Accepted' if hint_accepted else 'Rejected',
-                    vm_id, channel_state_to_str(hint))
+            self._accept_channel_state_hint(vm_id)
+            if self._poll_needed(vm_obj, now):
+                with self._polling_lock:
+                    if vm_id in self._polling:
+                        # Previous poll not finished yet.
+                        continue
+                    self._polling.add(vm_id)
+                vms.append(vm_obj)
+        for i, vm_obj in enumerate(vms):
+            delay = self._period * i / len(vms)
+            self._scheduler.schedule(
+                delay, functools.partial(self._dispatch_poll, vm_obj))
+        # Remove stale info
+        self._cleanup()
 
-            # Ensure we know guest agent's capabilities
-            self._on_boot(vm_obj, now)
-            if not self._runnable_on_vm(vm_obj):
-                self.log.debug(
-                    'Skipping vm-id=%s in this run and not querying QEMU-GA',
-                    vm_id)
-                continue
+    def _accept_channel_state_hint(self, vm_id):
+        # Check if there is any state hint to accept/reject
+        if self._channel_state_hint[vm_id] != CHANNEL_UNKNOWN:
+            # This does not need a lock because we don't care for the
+            # small race here. If we accept this hint we don't care for
+            # another and if we don't accept this hint we would reject
+            # another hint in the next run anyway.
+            hint = self._channel_state_hint[vm_id]
+            self._channel_state_hint[vm_id] = CHANNEL_UNKNOWN
+            hint_accepted = False
+            with self._channel_state_lock:
+                # Note that we always prefer information we already have
+                # to make sure we don't lose state changes that come from
+                # events.
+                if self._channel_state[vm_id] == CHANNEL_UNKNOWN:
+                    self._channel_state[vm_id] = hint
+                    hint_accepted = True
+            self.log.debug(
+                '%s channel state hint for vm_id=%s, hint=%r',
+                'Accepted' if hint_accepted else 'Rejected',
+                vm_id, channel_state_to_str(hint))
+
+    def _poll_needed(self, vm, now):
+        if time.time() - vm.start_time <= _INITIAL_INTERVAL:
+            # _on_boot() queries the agent on every run.
+            return True
+        if not self._runnable_on_vm(vm):
+            return False
+        if (now - self.last_check(vm.id, VDSM_GUEST_INFO)
+                >= _QEMU_COMMAND_PERIODS[VDSM_GUEST_INFO]):
+            return True
+        caps = self.get_caps(vm.id)
+        return self._due_commands(vm, caps, now) != 0
+
+    def _dispatch_poll(self, vm):
+        try:
+            self._executor.dispatch(
+                functools.partial(self._poll, vm), timeout=_TASK_TIMEOUT)
+        except Exception as e:
+            self.log.warning('Cannot poll QEMU-GA for vm_id=%s: %s',
+                             vm.id, e)
+            with self._polling_lock:
+                self._polling.discard(vm.id)
+
+    def _poll(self, vm):
+        start = monotonic_time()
+        try:
+            self._poll_vm(vm, start)
+        finally:
+            with self._polling_lock:
+                self._polling.discard(vm.id)
+        end = monotonic_time()
+        last_check = self.last_check(vm.id, None)
+        if self._failure_count.get(vm.id, 0) and last_check >= start and \
+                self.last_failure(vm.id) < start:
+            # The agent responds again.
+            self.reset_failure(vm.id)
+        stats = {
+            'latency': end - start,
+            'staleness': end - last_check if last_check > 0 else None,
+        }
+        self._poll_stats[vm.id] = stats
+        prefix = 'vms.%s.qga' % vm.id
+        report = {prefix + '.poll_latency': stats['latency']}
+        if stats['staleness'] is not None:
+            report[prefix + '.staleness'] = stats['staleness']
+        metrics.send(report)
+
+    def _poll_vm(self, vm_obj, now):
+        vm_id = vm_obj.id
+        # Ensure we know guest agent's capabilities
+        self._on_boot(vm_obj, now)
+        if not self._runnable_on_vm(vm_obj):
+            self.log.debug(
+                'Skipping vm-id=%s in this run and not querying QEMU-GA',
+                vm_id)
+            return
+        caps = self.get_caps(vm_id)
+        # Update capabilities -- if we just got the caps above then this
+        # will fall through
+        if (now - self.last_check(vm_id, VDSM_GUEST_INFO)
+                >= _QEMU_COMMAND_PERIODS[VDSM_GUEST_INFO]):
+            self._qga_capability_check(vm_obj, now)
             caps = self.get_caps(vm_id)
-            # Update capabilities -- if we just got the caps above then this
-            # will fall through
-            if (now - self.last_check(vm_id, VDSM_GUEST_INFO)
-                    >= _QEMU_COMMAND_PERIODS[VDSM_GUEST_INFO]):
-                self._qga_capability_check(vm_obj, now)
-                caps = self.get_caps(vm_id)
-            if caps['version'] is None:
-                # If we don't know about the agent there is no reason to
-                # proceed any further
-                continue
-            # Update guest info
-            types = 0
+        if caps['version'] is None:
+            # If we don't know about the agent there is no reason to
+            # proceed any further
+            return
+        due = self._due_commands(vm_obj, caps, now)
+        # Commands that have special handling go here
+        if due & VDSM_GUEST_INFO_DRIVERS:
+            self.update_guest_info(
+                vm_id, self._qga_call_get_devices(vm_obj))
+            self.set_last_check(vm_id, VDSM_GUEST_INFO_DRIVERS, now)
+        if due & VDSM_GUEST_INFO_NETWORK:
+            self.update_guest_info(
+                vm_id, self._qga_call_network_interfaces(vm_obj))
+            self.set_last_check(vm_id, VDSM_GUEST_INFO_NETWORK, now)
+        # Commands handled by libvirt guestInfo() are sent in one call
+        types = due & ~(VDSM_GUEST_INFO_DRIVERS | VDSM_GUEST_INFO_NETWORK)
+        if types == 0:
+            # Nothing to do
+            return
+        info = self._libvirt_get_guest_info(vm_obj, types)
+        if info is None:
+            self.log.debug('Failed to query QEMU-GA for vm=%s', vm_id)
+            self.set_failure(vm_id)
+        else:
+            self.update_guest_info(vm_id, info)
             for command in _QEMU_COMMANDS.keys():
-                if _QEMU_COMMANDS[command] not in caps['commands']:
-                    continue
-                after_hotplug = \
-                    command == VIR_DOMAIN_GUEST_INFO_FILESYSTEM and \
-                    vm_obj.last_disk_hotplug() is not None and \
-                    (now - vm_obj.last_disk_hotplug() >=
-                        _HOTPLUG_CHECK_PERIOD) and \
-                    (self.last_check(vm_id, command) <
-                        vm_obj.last_disk_hotplug() + _HOTPLUG_CHECK_PERIOD)
-                if now - self.last_check(vm_id, command) \
-                        < _QEMU_COMMAND_PERIODS[command] and \
-                        not after_hotplug:
-                    continue
-                # Commands that have special handling go here
-                if command == VDSM_GUEST_INFO_DRIVERS:
-                    self.update_guest_info(
-                        vm_id, self._qga_call_get_devices(vm_obj))
-                    self.set_last_check(vm_id, command, now)
-                elif command == VDSM_GUEST_INFO_NETWORK:
-                    self.update_guest_info(
-                        vm_id, self._qga_call_network_interfaces(vm_obj))
+                if types & command:
                     self.set_last_check(vm_id, command, now)
-                # Commands handled by libvirt guestInfo() go here
-                else:
-                    types |= command
-            if types == 0:
-                # Nothing to do
+
+    def _due_commands(self, vm_obj, caps, now):
+        """
+        Return the commands due for the VM as mask of command flags.
+
+        Commands becoming due before the next run are included, so the
+        commands of a VM are sent together instead of in consecutive runs.
+        """
+        vm_id = vm_obj.id
+        due = 0
+        for command in _QEMU_COMMANDS.keys():
+            if _QEMU_COMMANDS[command] not in caps['commands']:
                 continue
-            info = self._libvirt_get_guest_info(vm_obj, types)
-            if info is None:
-                self.log.debug('Failed to query QEMU-GA for vm=%s', vm_id)
-                self.set_failure(vm_id)
-            else:
-                self.update_guest_info(vm_id, info)
-                for command in _QEMU_COMMANDS.keys():
-                    if types & command:
-                        self.set_last_check(vm_id, command, now)
-        # Remove stale info
-        self._cleanup()
+            after_hotplug = \
+                command == VIR_DOMAIN_GUEST_INFO_FILESYSTEM and \
+                vm_obj.last_disk_hotplug() is not None and \
+                (now - vm_obj.last_disk_hotplug() >=
+                    _HOTPLUG_CHECK_PERIOD) and \
+                (self.last_check(vm_id, command) <
+                    vm_obj.last_disk_hotplug() + _HOTPLUG_CHECK_PERIOD)
+            if now + self._period - self.last_check(vm_id, command) \
+                    <= _QEMU_COMMAND_PERIODS[command] and \
+                    not after_hotplug:
+                continue
+            due |= command
+        return due
 
     def _libvirt_get_guest_info(self, vm, types):
         guest_info = {}
@@ -653,6 +780,14 @@ class QemuGuestAgentPoller(object):
                 if vm_id not in vm_container:
                     del self._last_failure[vm_id]
                     removed.add(vm_id)
+            for vm_id in copy.copy(self._failure_count):
+                if vm_id not in vm_container:
+                    del self._failure_count[vm_id]
+                    removed.add(vm_id)
+        for vm_id in copy.copy(self._poll_stats):
+            if vm_id not in vm_container:
+                del self._poll_stats[vm_id]
+                removed.add(vm_id)
         with self._last_check_lock:
             for vm_id, command in copy.copy(self._last_check):
                 if vm_id not in vm_container:
@@ -672,7 +807,8 @@ class QemuGuestAgentPoller(object):
 
     def _runnable_on_vm(self, vm):
         last_failure = self.last_failure(vm.id)
-        if (monotonic_time() - last_failure) < _THROTTLING_INTERVAL:
+        if (monotonic_time() - last_failure) < \
+                self.throttling_interval(vm.id):
             return False
         if not vm.isDomainRunning():
             return False
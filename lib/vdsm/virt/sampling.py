@@ -37,6 +37,7 @@ import threading
 import time
 
 from vdsm import hugepages
+from vdsm import metrics
 from vdsm import numa
 from vdsm import utils
 import vdsm.common.time
@@ -44,6 +45,7 @@ from vdsm.common.units import KiB, MiB
 from vdsm.config import config
 from vdsm.constants import P_VDSM_RUN
 from vdsm.host import api as hostapi
+from vdsm.metrics import histogram
 from vdsm.virt.utils import ExpiringCache
 
 
@@ -245,6 +247,15 @@ _StatsSample = namedtuple('StatsSample',
 
 
 class StatsSample(_StatsSample):
+
+    def __new__(cls, first_value, last_value, interval, stats_age,
+                intervals=None):
+        self = super(StatsSample, cls).__new__(
+            cls, first_value, last_value, interval, stats_age)
+        # Libvirt stats type: interval, for stats types sampled separately.
+        self.intervals = intervals
+        return self
+
     def is_empty(self):
         return (
             self.first_value is None and
@@ -285,9 +296,13 @@ class StatsCache(object):
     def __init__(self, clock=vdsm.common.time.monotonic_time):
         self._clock = clock
         self._lock = threading.Lock()
-        self._samples = SampleWindow(size=2, timefn=self._clock)
-        self._last_sample_time = 0
+        # Stats types (None meaning all the stats): _StatsGroup. Groups are
+        # sampled independently, and merged when stats are requested.
+        self._groups = {}
+        # Time the VM was added, used until every group sampled it.
         self._vm_last_timestamp = defaultdict(int)
+        self._stats_age = metrics.get_histogram(
+            'sampling.vms.stats_age', histogram.TIME_BOUNDS)
 
     def add(self, vmid):
         """
@@ -304,46 +319,117 @@ class StatsCache(object):
         """
         with self._lock:
             del self._vm_last_timestamp[vmid]
+            for group in self._groups.values():
+                group.vm_timestamps.pop(vmid, None)
 
     def get(self, vmid):
         """
         Return the available StatSample for the given VM.
         """
+        timeout = config.getint('vars', 'vm_command_timeout')
+        delays = _sampling_delays()
         with self._lock:
-            first_batch, last_batch, interval = self._samples.stats()
-            stats_age = self._clock() - self._vm_last_timestamp[vmid]
-
-            if first_batch is None:
-                return StatsSample(None, None, None, stats_age)
-
-            first_sample = first_batch.get(vmid)
-            last_sample = last_batch.get(vmid)
-
-            if first_sample is None or last_sample is None:
-                return StatsSample(None, None, None, stats_age)
-
-            return StatsSample(first_sample, last_sample,
-                               interval, stats_age)
+            batches = self._batches()
+            sample = self._merge(
+                vmid, batches, self._clock(), timeout, delays)
+        self._stats_age.add(sample.stats_age)
+        return sample
 
     def get_batch(self):
         """
         Return the available StatSample for the all VMs.
         """
+        timeout = config.getint('vars', 'vm_command_timeout')
+        delays = _sampling_delays()
         with self._lock:
-            first_batch, last_batch, interval = self._samples.stats()
-
-            if first_batch is None:
+            batches = self._batches()
+            if not batches:
                 return None
 
+            vm_ids = set(batches[0][1])
+            for _, last_batch, _, _, _ in batches[1:]:
+                vm_ids.update(last_batch)
+
             ts = self._clock()
-            return {
-                vm_id: StatsSample(
-                    first_batch[vm_id], last_batch[vm_id], interval,
-                    ts - self._vm_last_timestamp[vm_id]
-                )
-                for vm_id in last_batch if (vm_id in first_batch and
-                                            vm_id in self._vm_last_timestamp)
-            }
+            samples = {}
+            for vm_id in vm_ids:
+                # Skip removed VMs.
+                if not any(vm_id in group.vm_timestamps
+                           for group in self._groups.values()):
+                    continue
+                sample = self._merge(vm_id, batches, ts, timeout, delays)
+                if not sample.is_empty():
+                    samples[vm_id] = sample
+            return samples
+
+    def _batches(self):
+        # Must be called when holding _lock.
+        batches = []
+        for stats_types, group in self._groups.items():
+            first_batch, last_batch, interval = group.samples.stats()
+            if first_batch is not None:
+                batches.append(
+                    (first_batch, last_batch, interval, stats_types, group))
+        # Stats of the group sampled most often first.
+        batches.sort(key=lambda batch: batch[2])
+        return batches
+
+    def _group_stats_age(self, vmid, stats_types, group, now, delays):
+        # Must be called when holding _lock.
+        last_timestamp = max(group.vm_timestamps.get(vmid, 0),
+                             self._vm_last_timestamp[vmid])
+        return now - last_timestamp - delays.get(stats_types, 0)
+
+    def _merge(self, vmid, batches, now, timeout, delays):
+        # Merge the samples of the groups into one first and one last
+        # sample. The keys of the groups are distinct, so the merged samples
+        # are consistent, but groups are sampled at different times, so each
+        # group has its own interval.
+        # The age of the stats is the age of the oldest group, so a group
+        # stuck on storage makes the VM unresponsive even if other groups are
+        # sampled. The age of a group sampled less often is reduced by its
+        # delay, so it is not older than the other groups when sampled on
+        # time. Samples of groups older than timeout are stale, and are not
+        # reported.
+        if self._groups:
+            stats_age = max(
+                self._group_stats_age(vmid, stats_types, group, now, delays)
+                for stats_types, group in self._groups.items())
+        else:
+            stats_age = now - self._vm_last_timestamp[vmid]
+        first_sample = last_sample = interval = None
+        merged = False
+        intervals = {}
+        for first_batch, last_batch, group_interval, stats_types, group \
+                in batches:
+            if self._group_stats_age(
+                    vmid, stats_types, group, now, delays) > timeout:
+                continue
+            first = first_batch.get(vmid)
+            last = last_batch.get(vmid)
+            if first is None or last is None:
+                continue
+            if interval is None:
+                # Common case, no need to copy.
+                first_sample, last_sample = first, last
+                interval = group_interval
+            else:
+                if not merged:
+                    first_sample = dict(first_sample)
+                    last_sample = dict(last_sample)
+                    merged = True
+                first_sample.update(first)
+                last_sample.update(last)
+            if stats_types is not None:
+                for stats_type in _STATS_TYPES:
+                    if stats_types & stats_type:
+                        intervals[stats_type] = group_interval
+
+        if interval is None:
+            return StatsSample(None, None, None, stats_age)
+
+        return StatsSample(first_sample, last_sample,
+                           interval, stats_age, intervals or None)
 
     def clock(self):
         """
@@ -351,31 +437,44 @@ class StatsCache(object):
         """
         return self._clock()
 
-    def put(self, bulk_stats, monotonic_ts):
+    def put(self, bulk_stats, monotonic_ts, stats_types=None):
         """
         Add a new bulk sample to the collection.
         `monotonic_ts' is the sample time which must be associated with
         the sample.
+        `stats_types' are the libvirt stats types sampled, if only some of
+        the stats are sampled.
         Discard silently out of order samples, which are assumed to be
         returned by unblocked stuck calls, to avoid overwrite fresh data
         with stale one.
         """
         with self._lock:
-            last_sample_time = self._last_sample_time
+            group = self._groups.get(stats_types)
+            if group is None:
+                group = self._groups[stats_types] = _StatsGroup(self._clock)
+            last_sample_time = group.last_sample_time
             if monotonic_ts >= last_sample_time:
-                self._samples.append(bulk_stats)
-                self._last_sample_time = monotonic_ts
+                group.samples.append(bulk_stats)
+                group.last_sample_time = monotonic_ts
 
-                self._update_ts(bulk_stats, monotonic_ts)
+                group.update_ts(bulk_stats, monotonic_ts)
             else:
                 self._log.warning(
                     'dropped stale old sample: sampled %f stored %f',
                     monotonic_ts, last_sample_time)
 
-    def _update_ts(self, bulk_stats, monotonic_ts):
+
+class _StatsGroup(object):
+
+    def __init__(self, clock):
+        self.samples = SampleWindow(size=2, timefn=clock)
+        self.last_sample_time = 0
+        self.vm_timestamps = {}
+
+    def update_ts(self, bulk_stats, monotonic_ts):
         # FIXME: this is expected to be costly performance-wise.
         for vmid in bulk_stats:
-            self._vm_last_timestamp[vmid] = monotonic_ts
+            self.vm_timestamps[vmid] = monotonic_ts
 
 
 stats_cache = StatsCache()
@@ -391,6 +490,15 @@ stats_cache = StatsCache()
 _TTL = 40.0
 
 
+_STATS_TYPES = (
+    libvirt.VIR_DOMAIN_STATS_STATE,
+    libvirt.VIR_DOMAIN_STATS_CPU_TOTAL,
+    libvirt.VIR_DOMAIN_STATS_BALLOON,
+    libvirt.VIR_DOMAIN_STATS_VCPU,
+    libvirt.VIR_DOMAIN_STATS_INTERFACE,
+    libvirt.VIR_DOMAIN_STATS_BLOCK,
+)
+
 BULK_STATS_TYPES = (
     libvirt.VIR_DOMAIN_STATS_STATE |
     libvirt.VIR_DOMAIN_STATS_CPU_TOTAL |
@@ -400,6 +508,42 @@ BULK_STATS_TYPES = (
     libvirt.VIR_DOMAIN_STATS_BLOCK
 )
 
+# Stats types with their own sampling interval option. The other stats are
+# sampled every vm_sample_interval.
+_STATS_INTERVALS = (
+    (libvirt.VIR_DOMAIN_STATS_VCPU, 'vm_sample_vcpu_interval'),
+    (libvirt.VIR_DOMAIN_STATS_BLOCK, 'vm_sample_block_interval'),
+)
+
+
+def stats_groups():
+    """
+    Return a list of (stats_types, interval) tuples, grouping the bulk
+    stats types sampled together, since they have the same interval.
+    """
+    default = config.getint('vars', 'vm_sample_interval')
+    groups = {default: BULK_STATS_TYPES}
+    for stats_type, option in _STATS_INTERVALS:
+        interval = config.getint('vars', option)
+        if interval != default:
+            groups[default] &= ~stats_type
+            groups[interval] = groups.get(interval, 0) | stats_type
+    return sorted((stats_types, interval)
+                  for interval, stats_types in groups.items())
+
+
+def _sampling_delays():
+    """
+    Return dict of stats_types: delay, for the groups returned by
+    stats_groups() sampled less often than vm_sample_interval. The delay is
+    the time (in seconds) between the group samples, beyond
+    vm_sample_interval.
+    """
+    default = config.getint('vars', 'vm_sample_interval')
+    return {stats_types: interval - default
+            for stats_types, interval in stats_groups()
+            if interval > default}
+
 
 class VMBulkstatsMonitor(object):
     def __init__(self, conn, get_vms, stats_cache,
@@ -410,6 +554,10 @@ class VMBulkstatsMonitor(object):
         self._stats_types = stats_types
         self._skip_doms = ExpiringCache(ttl)
         self._sampling = threading.Semaphore()  # used as glorified counter
+        self._duration = metrics.get_histogram(
+            'sampling.vms.duration', histogram.TIME_BOUNDS)
+        self._skipped = metrics.get_histogram(
+            'sampling.vms.skipped', histogram.COUNT_BOUNDS)
         self._log = logging.getLogger("virt.sampling.VMBulkstatsMonitor")
 
     def __call__(self):
@@ -420,6 +568,7 @@ class VMBulkstatsMonitor(object):
         # *is* costly so we should avoid it if we can.
         fast_path = acquired and not self._skip_doms
         responsive_doms = []
+        skipped = 0
         flags = libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_RUNNING
         if _NOWAIT_ENABLED:
             flags |= libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_NOWAIT
@@ -432,7 +581,7 @@ class VMBulkstatsMonitor(object):
             else:
                 # A previous call got stuck, or not every domain
                 # has properly recovered. Thus we query only responsive ones.
-                responsive_doms = self._get_responsive_doms()
+                responsive_doms, skipped = self._get_responsive_doms()
                 if responsive_doms:
                     bulk_stats = self._conn.domainListGetStats(
                         responsive_doms, stats=self._stats_types, flags=flags)
@@ -442,15 +591,21 @@ class VMBulkstatsMonitor(object):
             self._log.exception("vm sampling failed")
             log_status = False
         else:
-            self._stats_cache.put(_translate(bulk_stats), timestamp)
+            self._stats_cache.put(
+                _translate(bulk_stats), timestamp, self._stats_types)
         finally:
             if acquired:
                 self._sampling.release()
         if log_status:
+            elapsed = self._stats_cache.clock() - timestamp
+            self._duration.add(elapsed)
+            self._skipped.add(skipped)
             self._log.debug(
-                'sampled timestamp %r elapsed %.3f acquired %r domains %s',
-                timestamp, self._stats_cache.clock() - timestamp, acquired,
-                'all' if fast_path else len(responsive_doms))
+                'sampled timestamp %r elapsed %.3f acquired %r domains %s '
+                'skipped %d stats %#x',
+                timestamp, elapsed, acquired,
+                'all' if fast_path else len(responsive_doms),
+                skipped, self._stats_types)
 
     def _get_responsive_doms(self):
         vms = self._get_vms()
@@ -466,7 +621,7 @@ class VMBulkstatsMonitor(object):
                 # domain has died just after checking isDomainReadyForCommands
                 # succeeded.
                 doms.append(vm_obj._dom.dom)
-        return doms
+        return doms, len(vms) - len(doms)
 
 
 HOST_STATS_AVERAGING_WINDOW = 2
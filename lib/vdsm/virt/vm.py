@@ -418,11 +418,11 @@ class Vm(object):
         self._guestCpuRunning = False
         self._guestCpuLock = TimedAcquireLock(self.id)
         if recover:
-            with self._md_desc.values() as md:
-                if 'startTime' in md:
-                    self._startTime = md['startTime']
-                else:
-                    self._startTime = time.time()
+            md = self._md_desc.values_view()
+            if 'startTime' in md:
+                self._startTime = md['startTime']
+            else:
+                self._startTime = time.time()
         else:
             self._startTime = time.time() - elapsedTimeOffset
 
@@ -435,6 +435,11 @@ class Vm(object):
         self._incoming_migration_prepared = threading.Event()
         self._devices = vmdevices.common.empty_dev_map()
         self._hotunplugged_devices = {}  # { alias: device_object }
+        # Incremented on changes of the libvirt domain which are applied to
+        # self._domain only once reported by libvirt, see
+        # _syncDomainDescriptor().
+        self._domain_generation = 0
+        self._domain_lock = threading.Lock()
 
         self.volume_monitor = thinp.VolumeMonitor(
             self, self.log, enabled=False)
@@ -559,44 +564,44 @@ class Vm(object):
 
     def _init_from_metadata(self):
         self._custom['custom'] = self._md_desc.custom
-        with self._md_desc.values() as md:
-            self._destroy_on_reboot = (
-                md.get('destroy_on_reboot', False) or
-                self._domain.on_reboot_config() == 'destroy'
-            )
-            # can be None, and it is fine.
-            self._guest_agent_api_version = md.get('guestAgentAPIVersion')
-            exit_info = {}
-            for key in ('exitCode', 'exitMessage', 'exitReason',):
-                value = md.get(key)
-                if value is not None:
-                    exit_info[key] = value
-            self._exit_info.update(exit_info)
-            # start with sane defaults:
-            self._mem_guaranteed_size_mb = 0
-            mem_guaranteed_size = md.get('minGuaranteedMemoryMb')
-            if mem_guaranteed_size is not None:
-                # data from Engine prevails:
-                self._mem_guaranteed_size_mb = mem_guaranteed_size
-            else:
-                # if this is missing, let's try using what we may have saved
-                self._mem_guaranteed_size_mb = md.get('memGuaranteedSize', 0)
-            self._drive_merger.load_jobs(json.loads(md.get('jobs', '{}')))
-            self._cluster_version = extract_cluster_version(md)
-            self._launch_paused = conv.tobool(md.get('launchPaused', False))
-            self._resume_behavior = md.get('resumeBehavior',
-                                           ResumeBehavior.AUTO_RESUME)
-            self._snapshot_job = json.loads(md.get('snapshot_job', '{}'))
-            self._pause_time = md.get('pauseTime')
-            self._balloon_target = md.get('balloonTarget')
-            self._ballooning_enabled = conv.tobool(
-                md.get('ballooningEnabled', True))
-            # Store CPU policy related information
-            self._cpu_policy = md.get('cpuPolicy', None)
-            self._manually_pinned_cpus = None
-            pinned = md.get('manuallyPinedCPUs', None)
-            if pinned is not None:
-                self._manually_pinned_cpus = taskset.cpulist_parse(pinned)
+        md = self._md_desc.values_view()
+        self._destroy_on_reboot = (
+            md.get('destroy_on_reboot', False) or
+            self._domain.on_reboot_config() == 'destroy'
+        )
+        # can be None, and it is fine.
+        self._guest_agent_api_version = md.get('guestAgentAPIVersion')
+        exit_info = {}
+        for key in ('exitCode', 'exitMessage', 'exitReason',):
+            value = md.get(key)
+            if value is not None:
+                exit_info[key] = value
+        self._exit_info.update(exit_info)
+        # start with sane defaults:
+        self._mem_guaranteed_size_mb = 0
+        mem_guaranteed_size = md.get('minGuaranteedMemoryMb')
+        if mem_guaranteed_size is not None:
+            # data from Engine prevails:
+            self._mem_guaranteed_size_mb = mem_guaranteed_size
+        else:
+            # if this is missing, let's try using what we may have saved
+            self._mem_guaranteed_size_mb = md.get('memGuaranteedSize', 0)
+        self._drive_merger.load_jobs(json.loads(md.get('jobs', '{}')))
+        self._cluster_version = extract_cluster_version(md)
+        self._launch_paused = conv.tobool(md.get('launchPaused', False))
+        self._resume_behavior = md.get('resumeBehavior',
+                                       ResumeBehavior.AUTO_RESUME)
+        self._snapshot_job = json.loads(md.get('snapshot_job', '{}'))
+        self._pause_time = md.get('pauseTime')
+        self._balloon_target = md.get('balloonTarget')
+        self._ballooning_enabled = conv.tobool(
+            md.get('ballooningEnabled', True))
+        # Store CPU policy related information
+        self._cpu_policy = md.get('cpuPolicy', None)
+        self._manually_pinned_cpus = None
+        pinned = md.get('manuallyPinedCPUs', None)
+        if pinned is not None:
+            self._manually_pinned_cpus = taskset.cpulist_parse(pinned)
 
     def min_cluster_version(self, major, minor):
         """
@@ -1096,9 +1101,15 @@ class Vm(object):
         time.sleep(1)
 
     def preparePaths(self):
-        drives = vmdevices.common.storage_device_params_from_domain_xml(
+        self._preparePathsForDrives(self.storage_drives())
+
+    def storage_drives(self):
+        """
+        Return the parameters of the storage devices of the VM, as found in
+        the domain XML.
+        """
+        return vmdevices.common.storage_device_params_from_domain_xml(
             self.id, self.domain, self._md_desc, self.log)
-        self._preparePathsForDrives(drives)
 
     def _preparePathsForDrives(self, drives):
         for drive in drives:
@@ -1791,7 +1802,9 @@ class Vm(object):
                     if 'memoryStats' not in oga_stats:
                         oga_stats['memoryStats'] = stats['memoryStats']
                     else:
-                        oga_stats['memoryStats'].update(stats['memoryStats'])
+                        # The guest stats are shared with the guest agent.
+                        oga_stats['memoryStats'] = dict(
+                            oga_stats['memoryStats'], **stats['memoryStats'])
                     if oga_stats['memUsage'] == '0':
                         # Compute memUsage from balloon stats
                         oga_stats['memUsage'] = str(int(
@@ -1857,7 +1870,8 @@ class Vm(object):
             decStats = vmstats.produce(self,
                                        vm_sample.first_value,
                                        vm_sample.last_value,
-                                       vm_sample.interval)
+                                       vm_sample.interval,
+                                       vm_sample.intervals)
             if monitorable:
                 self._setUnresponsiveIfTimeout(stats, vm_sample.stats_age)
         except Exception:
@@ -2171,6 +2185,10 @@ class Vm(object):
             status['progress'] = 100
         return status
 
+    def onMigrationIteration(self, iteration):
+        self.log.debug('Migration iteration %d', iteration)
+        self._migrationSourceThread.on_migration_iteration(iteration)
+
     def onJobCompleted(self, args):
         if (not self._migrationSourceThread.started and
             not self._migrationSourceThread.recovery) or \
@@ -2573,6 +2591,9 @@ class Vm(object):
         else:
             self._clear_device_metadata(attrs)
             self.sync_metadata()
+            md_elem = self._md_desc.to_tree()
+            with self._domain_lock:
+                self._domain = self._domain.with_metadata(md_elem)
 
     def _set_device_metadata(self, attrs, dev_conf):
         """
@@ -3036,6 +3057,7 @@ class Vm(object):
 
     def _hotunplug_device(self, device_xml, device, device_hwclass,
                           update_metadata=False):
+        self._domainChanged()
         try:
             self._dom.detachDevice(device_xml)
             self._waitForDeviceRemoval(device)
@@ -3049,7 +3071,7 @@ class Vm(object):
             raise
         if update_metadata:
             self._hotunplug_device_metadata(device_hwclass, device)
-            self._updateDomainDescriptor()
+            self._syncDomainDescriptor()
 
     @api.guard(_not_migrating)
     # This hot plug must be able to take multiple devices so that
@@ -3626,7 +3648,9 @@ class Vm(object):
             return {}
 
     def io_tune_policy(self):
-        return utils.picklecopy(self._ioTuneInfo)
+        # _ioTuneInfo is replaced on updates and never modified, so we can
+        # return it without copying. The caller must not modify it.
+        return self._ioTuneInfo
 
     def io_tune_values(self):
         resultList = []
@@ -3920,7 +3944,7 @@ class Vm(object):
         # libvirt doesn't generate a device removal event on lease hot
         # unplug, so we must update domain descriptor here.
         # See https://bugzilla.redhat.com/1639228.
-        self._updateDomainDescriptor()
+        self._syncDomainDescriptor()
 
         return response.success(vmList={})
 
@@ -5194,18 +5218,57 @@ class Vm(object):
         self._updateDomainDescriptor()
 
     def _updateDomainDescriptor(self, xml=None):
+        # Changes made while we read the XML may be missing from it, so the
+        # descriptor gets the generation from before the read.
+        generation = self._domain_generation
         domxml = self._dom.XMLDesc() if xml is None else xml
         self._domain = DomainDescriptor(
             domxml,
             xml_source=(
                 XmlSource.INITIAL if xml is not None else
-                XmlSource.LIBVIRT))
+                XmlSource.LIBVIRT),
+            generation=generation)
         if xml is None:
             for name, _, state in self._domain.all_channels():
                 if name == vmchannels.QEMU_GA_DEVICE_NAME and \
                         state is not None:
                     self.cif.qga_poller.channel_state_hint(self.id, state)
 
+    def _domainChanged(self):
+        """
+        Called before changing the libvirt domain in a way we expect libvirt
+        to report with an event, making the domain descriptor stale until
+        the event is handled.
+        """
+        with self._domain_lock:
+            self._domain_generation += 1
+
+    def _syncDomainDescriptor(self):
+        """
+        Read the domain XML from libvirt only if the domain descriptor
+        misses some change of the domain.
+        """
+        if self._domain.generation != self._domain_generation:
+            self._updateDomainDescriptor()
+
+    def _domainDeviceRemoved(self, alias):
+        """
+        Remove the device from the domain descriptor without reading the
+        domain XML, when libvirt reports the device removal. Removing memory
+        changes also the domain memory size, so in this case and for unknown
+        devices the domain XML is read from libvirt.
+        """
+        with self._domain_lock:
+            try:
+                device = self._domain.find_device(alias)
+            except LookupError:
+                device = None
+            if device is not None and vmxml.tag(device) != 'memory':
+                self._domain = self._domain.with_device_removed(
+                    alias, generation=self._domain_generation)
+                return
+        self._updateDomainDescriptor()
+
     def _updateMetadataDescriptor(self):
         # load will overwrite any existing content, as per doc.
         self._md_desc.load(self._dom)
@@ -5254,7 +5317,9 @@ class Vm(object):
     def sync_metadata(self):
         if self._external:
             return
-        self._md_desc.dump(self._dom)
+        # Unchanged metadata is not written again, and concurrent syncs
+        # are coalesced into one libvirt call.
+        self._md_desc.flush(self._dom)
 
     def releaseVm(self, gracefulAttempts=1):
         """
@@ -6044,15 +6109,19 @@ class Vm(object):
                 # such a case.
                 self.log.warning("Removed device not found in devices: %s",
                                  device_alias)
-                self._updateDomainDescriptor()
+                self._domainDeviceRemoved(device_alias)
                 return
             else:
                 self._devices[device_hwclass].remove(device)
         try:
             device.teardown()
         finally:
-            device.hotunplug_event.set()
-        self._updateDomainDescriptor()
+            # Update the domain descriptor before waking up the hotunplug
+            # flow, so it finds the descriptor up to date.
+            try:
+                self._domainDeviceRemoved(device_alias)
+            finally:
+                device.hotunplug_event.set()
 
     # Accessing storage
 
@@ -24,6 +24,7 @@ from __future__ import division
 import contextlib
 import logging
 
+import libvirt
 import six
 
 from vdsm.common.time import monotonic_time
@@ -35,20 +36,33 @@ from vdsm.virt.utils import isVdsmImage
 _log = logging.getLogger('virt.vmstats')
 
 
-def produce(vm, first_sample, last_sample, interval):
+def produce(vm, first_sample, last_sample, interval, intervals=None):
     """
     Translates vm samples into stats.
+
+    `intervals' maps libvirt stats types to the time between their two
+    samplings, if the stats types were sampled at different times;
+    `interval' is used for the stats types missing in `intervals'.
     """
 
     stats = {}
 
-    cpu(stats, first_sample, last_sample, interval)
-    networks(vm, stats, first_sample, last_sample, interval)
-    disks(vm, stats, first_sample, last_sample, interval)
+    def interval_of(stats_type):
+        if intervals:
+            return intervals.get(stats_type, interval)
+        return interval
+
+    cpu(stats, first_sample, last_sample,
+        interval_of(libvirt.VIR_DOMAIN_STATS_CPU_TOTAL))
+    networks(vm, stats, first_sample, last_sample,
+             interval_of(libvirt.VIR_DOMAIN_STATS_INTERFACE))
+    disks(vm, stats, first_sample, last_sample,
+          interval_of(libvirt.VIR_DOMAIN_STATS_BLOCK))
     balloon(vm, stats, last_sample)
     cpu_count(stats, last_sample)
     tune_io(vm, stats)
-    memory(stats, first_sample, last_sample, interval)
+    memory(stats, first_sample, last_sample,
+           interval_of(libvirt.VIR_DOMAIN_STATS_BALLOON))
 
     return stats
 
@@ -65,6 +65,8 @@ class FakeClientIF(clientIF.clientIF):
         self.vmRequests = {}
         self.servers = {}
         self._recovery = False
+        self._enabled = True
+        self._prepared_images = {}
 
     def createVm(self, vmParams, vmRecover=False):
         self.vmRequests[vmParams['vmId']] = (vmParams, vmRecover)
@@ -334,6 +336,90 @@ class TestPrepareNetworkDrive(TestCaseBase):
         self.assertEqual(drive['volumeChain'], expected_chain)
 
 
+class FakeRecoveredVm(object):
+
+    def __init__(self, cif, vm_id, drives):
+        self.cif = cif
+        self.id = vm_id
+        self.drives = drives
+
+    def storage_drives(self):
+        return [dict(drive) for drive in self.drives]
+
+    def preparePaths(self):
+        for drive in self.storage_drives():
+            drive['path'] = self.cif.prepareVolumePath(drive, self.id)
+
+
+class CountingIRS(fake.IRS):
+
+    def __init__(self):
+        super(CountingIRS, self).__init__()
+        self.prepare_image_calls = 0
+        self.prepare_images_calls = 0
+
+    def prepareImage(self, *args, **kwargs):
+        self.prepare_image_calls += 1
+        return super(CountingIRS, self).prepareImage(*args, **kwargs)
+
+    def prepareImages(self, images):
+        self.prepare_images_calls += 1
+        return super(CountingIRS, self).prepareImages(images)
+
+
+def vdsm_image_drive(sd_id, img_id, vol_id):
+    return {
+        'device': 'disk',
+        'domainID': sd_id,
+        'poolID': 'pool',
+        'imageID': img_id,
+        'volumeID': vol_id,
+    }
+
+
+class TestRecoveryPreparePaths(TestCaseBase):
+
+    def test_prepare_images_in_bulk(self):
+        cif = FakeClientIF()
+        cif.irs = CountingIRS()
+        cif.vmContainer = {
+            'vm1': FakeRecoveredVm(cif, 'vm1', [
+                vdsm_image_drive('sd1', 'img1', 'vol1'),
+                vdsm_image_drive('sd2', 'img2', 'vol2'),
+            ]),
+            'vm2': FakeRecoveredVm(cif, 'vm2', [
+                vdsm_image_drive('sd1', 'img3', 'vol3'),
+            ]),
+        }
+
+        cif._preparePathsForRecoveredVMs()
+
+        self.assertEqual(cif.irs.prepare_images_calls, 1)
+        self.assertEqual(
+            sorted(cif.irs.prepared_volumes),
+            [('sd1', 'img1', 'vol1'), ('sd1', 'img3', 'vol3'),
+             ('sd2', 'img2', 'vol2')])
+        # Bulk prepared images are not prepared again.
+        self.assertEqual(cif.irs.prepare_image_calls, 0)
+        self.assertEqual(cif._prepared_images, {})
+
+    def test_bulk_prepare_failure(self):
+        cif = FakeClientIF()
+        cif.irs = CountingIRS()
+        cif.irs.prepareImages = lambda images: response.error('noVM')
+        cif.vmContainer = {
+            'vm1': FakeRecoveredVm(cif, 'vm1', [
+                vdsm_image_drive('sd1', 'img1', 'vol1'),
+            ]),
+        }
+
+        cif._preparePathsForRecoveredVMs()
+
+        # Images are prepared one by one.
+        self.assertEqual(cif.irs.prepare_image_calls, 1)
+        self.assertIn(('sd1', 'img1', 'vol1'), cif.irs.prepared_volumes)
+
+
 class FakeConnection(vmfakecon.Connection):
 
     def __init__(self, known_uuids, error=libvirt.VIR_ERR_NO_DOMAIN):
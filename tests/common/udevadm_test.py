@@ -0,0 +1,98 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import pytest
+
+from vdsm.common import cmdutils
+from vdsm.common import udevadm
+
+MONITOR_OUTPUT = """\
+monitor will print the received events for:
+UDEV - the event which udev sends out after rule processing
+
+UDEV  [1234.567890] change   /devices/virtual/block/dm-3 (block)
+ACTION=change
+DEVPATH=/devices/virtual/block/dm-3
+SUBSYSTEM=block
+DM_NAME=360014052e1b3ff3ef6544a0a3a2c5a6c
+DM_UUID=mpath-360014052e1b3ff3ef6544a0a3a2c5a6c
+DEVNAME=/dev/dm-3
+DEVTYPE=disk
+
+UDEV  [1234.678901] remove   /devices/platform/host6/block/sdf (block)
+ACTION=remove
+DEVNAME=/dev/sdf
+DEVTYPE=disk
+ID_MODEL=LIO=ORG
+
+"""
+
+
+@pytest.fixture
+def fake_udevadm(tmpdir, monkeypatch):
+    script = tmpdir.join("udevadm")
+    script.write("#!/bin/sh\ncat <<'EOF'\n" + MONITOR_OUTPUT + "EOF\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(
+        udevadm, "_UDEVADM", cmdutils.CommandPath("udevadm", str(script)))
+    return script
+
+
+def test_monitor_events(fake_udevadm):
+    monitor = udevadm.Monitor(subsystem_matches=("block",))
+    monitor.start()
+    try:
+        events = list(monitor)
+    finally:
+        monitor.stop()
+
+    assert events == [
+        {
+            "ACTION": "change",
+            "DEVPATH": "/devices/virtual/block/dm-3",
+            "SUBSYSTEM": "block",
+            "DM_NAME": "360014052e1b3ff3ef6544a0a3a2c5a6c",
+            "DM_UUID": "mpath-360014052e1b3ff3ef6544a0a3a2c5a6c",
+            "DEVNAME": "/dev/dm-3",
+            "DEVTYPE": "disk",
+        },
+        {
+            "ACTION": "remove",
+            "DEVNAME": "/dev/sdf",
+            "DEVTYPE": "disk",
+            "ID_MODEL": "LIO=ORG",
+        },
+    ]
+
+
+def test_monitor_start_failure(tmpdir, monkeypatch):
+    script = tmpdir.join("udevadm")
+    script.write("#!/bin/sh\necho 'no monitor for you' >&2\nexit 1\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(
+        udevadm, "_UDEVADM", cmdutils.CommandPath("udevadm", str(script)))
+
+    monitor = udevadm.Monitor()
+    with pytest.raises(cmdutils.Error):
+        monitor.start()
@@ -32,6 +32,7 @@ from vdsm import utils
 from vdsm.common import concurrent
 from vdsm.common import exception
 from vdsm.common import pthread
+from vdsm.metrics import histogram
 
 from fakelib import FakeLogger
 from testValidation import slowtest
@@ -57,6 +58,32 @@ class ExecutorTests(TestCaseBase):
         self.executor.stop()
         self.scheduler.stop()
 
+    def test_wait_histogram(self):
+        hist = histogram.Histogram(histogram.TIME_BOUNDS)
+        exc = executor.Executor('test',
+                                workers_count=1,
+                                max_tasks=self.max_tasks,
+                                scheduler=self.scheduler,
+                                wait_histogram=hist)
+        exc.start()
+        try:
+            event = threading.Event()
+            blocked = Task(event=event)
+            waiting = Task()
+            exc.dispatch(blocked)
+            exc.dispatch(waiting)
+            time.sleep(0.1)
+            event.set()
+            waiting.executed.wait(1)
+            self.assertTrue(waiting.executed.is_set())
+        finally:
+            exc.stop()
+
+        info = hist.info()
+        self.assertEqual(info['count'], 2)
+        # The second task waited until the first completed.
+        self.assertGreaterEqual(info['max'], 0.1)
+
     def test_repr_defaults(self):
         # we are using the kwargs syntax, but we are omitting arguments
         # with default values - thus using their defaults.
@@ -51,3 +51,175 @@ def test_getTree(relative_filepath, expected):
 def test_get_tree_empty_input():
     with pytest.raises(ge.GlusterXmlErrorException):
         cli._getTree("")
+
+
+VOLUMES_STATUS_XML = """\
+<cliOutput>
+  <opRet>0</opRet>
+  <opErrno>0</opErrno>
+  <opErrstr/>
+  <volStatus>
+    <volumes>
+      <volume>
+        <volName>vol-1</volName>
+        <node>
+          <hostname>host1</hostname>
+          <path>/bricks/vol-1</path>
+          <peerid>uuid-1</peerid>
+          <status>1</status>
+          <port>49152</port>
+          <ports><tcp>49152</tcp><rdma>N/A</rdma></ports>
+          <pid>1234</pid>
+        </node>
+      </volume>
+      <volume>
+        <volName>vol-2</volName>
+        <node>
+          <hostname>host1</hostname>
+          <path>/bricks/vol-2</path>
+          <peerid>uuid-1</peerid>
+          <status>0</status>
+          <port>N/A</port>
+          <ports><tcp>N/A</tcp><rdma>N/A</rdma></ports>
+          <pid>-1</pid>
+        </node>
+      </volume>
+    </volumes>
+  </volStatus>
+</cliOutput>
+"""
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_gluster(monkeypatch):
+    commands = []
+
+    def execGlusterXml(cmd):
+        commands.append(cmd[3:])
+        if cmd[3:5] == ["status", "all"]:
+            return cli._getTree(VOLUMES_STATUS_XML)
+        raise ge.GlusterCmdFailedException(rc=2, err=["Volume not started"])
+
+    monkeypatch.setattr(cli, "_cache", cli._ResultCache(5))
+    monkeypatch.setattr(
+        cli, "_getGlusterVolCmd",
+        lambda: ["gluster", "--mode=script", "volume"])
+    monkeypatch.setattr(cli, "_execGlusterXml", execGlusterXml)
+    return commands
+
+
+def test_cache_ttl():
+    clock = FakeClock()
+    cache = cli._ResultCache(5, clock=clock)
+    values = iter(range(10))
+
+    assert cache.get("key", lambda: next(values)) == 0
+    clock.now = 4
+    assert cache.get("key", lambda: next(values)) == 0
+    clock.now = 5
+    assert cache.get("key", lambda: next(values)) == 1
+
+
+def test_cache_disabled():
+    cache = cli._ResultCache(0, clock=FakeClock())
+    values = iter(range(10))
+    assert cache.get("key", lambda: next(values)) == 0
+    assert cache.get("key", lambda: next(values)) == 1
+
+
+def test_cache_invalidate_while_running():
+    cache = cli._ResultCache(5, clock=FakeClock())
+
+    def func():
+        # Simulate another thread modifying the cluster while we run.
+        cache.invalidate()
+        return "old"
+
+    assert cache.get("key", func) == "old"
+    assert cache.get("key", lambda: "new") == "new"
+
+
+@pytest.mark.parametrize("args, invalidated", [
+    (["volume", "status", "vol"], False),
+    (["volume", "info"], False),
+    (["peer", "status"], False),
+    (["volume", "set", "help-xml"], False),
+    (["volume", "start", "vol"], True),
+    (["volume", "set", "vol", "key", "value"], True),
+    (["peer", "probe", "host"], True),
+])
+def test_invalidate_cache(monkeypatch, args, invalidated):
+    cache = cli._ResultCache(5, clock=FakeClock())
+    monkeypatch.setattr(cli, "_cache", cache)
+    cache.get("key", lambda: "value")
+
+    cli._invalidateCache(["gluster", "--mode=script"] + args)
+
+    assert (cache.get("key", lambda: "new") == "new") == invalidated
+
+
+def test_volume_status_batched(fake_gluster):
+    status1 = cli.volumeStatus("vol-1")
+    status2 = cli.volumeStatus("vol-2")
+
+    assert fake_gluster == [["status", "all"]]
+    assert status1["name"] == "vol-1"
+    assert status1["bricks"][0]["brick"] == "host1:/bricks/vol-1"
+    assert status1["bricks"][0]["status"] == "ONLINE"
+    assert status2["name"] == "vol-2"
+    assert status2["bricks"][0]["status"] == "OFFLINE"
+
+
+def test_volume_status_owned_by_caller(fake_gluster):
+    cli.volumeStatus("vol-1")["bricks"].clear()
+    assert len(cli.volumeStatus("vol-1")["bricks"]) == 1
+
+
+def test_volume_status_not_started(fake_gluster):
+    with pytest.raises(ge.GlusterVolumeStatusFailedException):
+        cli.volumeStatus("vol-3")
+
+    # Missing volume reported by running the command for the volume.
+    assert fake_gluster == [["status", "all"], ["status", "vol-3"]]
+
+
+def test_volume_status_brick(fake_gluster):
+    with pytest.raises(ge.GlusterVolumeStatusFailedException):
+        cli.volumeStatus("vol-1", brick="host1:/bricks/vol-1")
+
+    # Brick status is not batched.
+    assert fake_gluster == [["status", "vol-1", "host1:/bricks/vol-1"]]
+
+
+def test_volume_status_cache_disabled(fake_gluster, monkeypatch):
+    monkeypatch.setattr(cli, "_cache", cli._ResultCache(0))
+    with pytest.raises(ge.GlusterVolumeStatusFailedException):
+        cli.volumeStatus("vol-1")
+
+    # Status of all volumes is not collected without caching.
+    assert fake_gluster == [["status", "vol-1"]]
+
+
+def test_invalidate_after_command_with_timeout(monkeypatch):
+    cache = cli._ResultCache(5, clock=FakeClock())
+    monkeypatch.setattr(cli, "_cache", cache)
+
+    def run(cmd, timeout):
+        # Another thread reads the status while the command runs.
+        cache.get("key", lambda: "old")
+        return VOLUMES_STATUS_XML, "", 0
+
+    monkeypatch.setattr(cli, "_runWithTimeout", run)
+    cli._execGlusterXmlWithTimeout(
+        ["gluster", "--mode=script", "volume", "start", "vol"])
+
+    assert cache.get("key", lambda: "new") == "new"
@@ -0,0 +1,98 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import pytest
+
+from vdsm import metrics
+from vdsm.metrics import histogram
+
+
+def test_empty():
+    hist = histogram.Histogram((1, 10))
+    assert hist.info() == {
+        "count": 0,
+        "sum": 0.0,
+        "max": 0.0,
+        "buckets": {"1": 0, "10": 0, "inf": 0},
+    }
+
+
+def test_add():
+    hist = histogram.Histogram((0.5, 1, 10))
+    for value in (0.1, 0.5, 0.7, 1, 20):
+        hist.add(value)
+    info = hist.info()
+    assert info["count"] == 5
+    assert info["sum"] == pytest.approx(22.3)
+    assert info["max"] == 20
+    # Buckets are cumulative, and include their bound.
+    assert info["buckets"] == {"0.5": 2, "1": 4, "10": 4, "inf": 5}
+
+
+def test_unsorted_bounds():
+    with pytest.raises(ValueError):
+        histogram.Histogram((10, 1))
+
+
+def test_report():
+    hist = histogram.Histogram((0.5, 2))
+    hist.add(1)
+    assert hist.report("sampling.vms.duration") == {
+        "sampling.vms.duration.count": 1,
+        "sampling.vms.duration.sum": 1.0,
+        "sampling.vms.duration.max": 1.0,
+        "sampling.vms.duration.le_0_5": 0,
+        "sampling.vms.duration.le_2": 1,
+        "sampling.vms.duration.le_inf": 1,
+    }
+
+
+def test_registry():
+    hist = metrics.get_histogram("test.registry.a", (1,))
+    assert metrics.get_histogram("test.registry.a", (1,)) is hist
+    metrics.get_histogram("test.registry.b", (1,))
+    hist.add(1)
+
+    info = metrics.histograms_info("test.registry.")
+    assert sorted(info) == ["test.registry.a", "test.registry.b"]
+    assert info["test.registry.a"]["count"] == 1
+    assert info["test.registry.b"]["count"] == 0
+
+
+def test_send_histograms(monkeypatch):
+    sent = []
+
+    class Reporter(object):
+        def send(self, report):
+            sent.append(report)
+
+    monkeypatch.setattr(metrics, "_reporter", Reporter())
+    metrics.get_histogram("test.send.a", (1,)).add(2)
+    metrics.send_histograms("test.send.")
+    assert sent == [{
+        "test.send.a.count": 1,
+        "test.send.a.sum": 2.0,
+        "test.send.a.max": 2.0,
+        "test.send.a.le_1": 0,
+        "test.send.a.le_inf": 1,
+    }]
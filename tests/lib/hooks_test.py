@@ -31,6 +31,7 @@ import os.path
 import pickle
 import pytest
 import sys
+import time
 
 from collections import namedtuple
 
@@ -552,6 +553,356 @@ def test_installed_should_return_hooks_info(fake_hooks_root, expected):
     assert hooks.installed() == expected
 
 
+def plugin(name, code):
+    return FileEntry(name, 0o644, textwrap.dedent(code))
+
+
+def plugins(*entries):
+    return DirEntry(hooks._PLUGINS_DIR, 0o755, entries)
+
+
+def appender_plugin(name, exit_code=0):
+    code = """\
+        import sys
+
+        def run(domxml, env):
+            root = domxml.documentElement
+            root.appendChild(domxml.createElement("{name}"))
+            if {exit_code}:
+                sys.exit({exit_code})
+        """.format(name=name.replace(".", "_"), exit_code=exit_code)
+    return plugin(name, code)
+
+
+@pytest.fixture(autouse=True)
+def clear_plugins():
+    yield
+    hooks._plugins.clear()
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    def run(stats, env):
+                        for vm in stats:
+                            vm["hooked"] = True
+                    """),
+            ),
+        ],
+        id="modify in place"
+    ),
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    def run(stats, env):
+                        return [dict(vm, hooked=True) for vm in stats]
+                    """),
+            ),
+        ],
+        id="return new data"
+    ),
+])
+def test_plugin_json(hooks_dir):
+    result = hooks._runHooksDir([{"vmId": "vm1"}], hooks_dir.basename,
+                                hookType=hooks._JSON_HOOK)
+    assert result == [{"vmId": "vm1", "hooked": True}]
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                appender_plugin("2.py"),
+                appender_plugin("1.py"),
+            ),
+        ],
+        id="plugins order"
+    ),
+])
+def test_plugin_domxml(hooks_dir):
+    result = hooks._runHooksDir(u"<domain/>", hooks_dir.basename)
+    assert result == (u'<?xml version="1.0" encoding="utf-8"?>'
+                      u'<domain><1_py/><2_py/></domain>')
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    def run(domxml, env):
+                        assert domxml is None
+                    """),
+            ),
+        ],
+        id="no data"
+    ),
+])
+def test_plugin_domxml_no_data(hooks_dir):
+    assert hooks._runHooksDir(None, hooks_dir.basename) is None
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    def run(domxml, env):
+                        root = domxml.documentElement
+                        root.appendChild(domxml.createTextNode("plugin"))
+                    """),
+            ),
+            appender_script("script.sh"),
+        ],
+        id="plugin and script"
+    ),
+])
+def test_plugins_run_before_scripts(hooks_dir):
+    result = hooks._runHooksDir(u"<domain/>", hooks_dir.basename)
+    assert result == (u'<?xml version="1.0" encoding="utf-8"?>'
+                      u'<domain>plugin</domain>script.sh\n')
+
+
+@pytest.mark.parametrize("hooks_dir,expected", indirect=["hooks_dir"],
+                         argvalues=[
+    pytest.param(
+        [
+            plugins(
+                appender_plugin("1.py", exit_code=1),
+                appender_plugin("2.py"),
+            ),
+        ],
+        u"<domain><1_py/><2_py/></domain>",
+        id="non-fatal hook error"
+    ),
+    pytest.param(
+        [
+            plugins(
+                appender_plugin("1.py", exit_code=2),
+                appender_plugin("2.py"),
+            ),
+            appender_script("3.sh"),
+        ],
+        u"<domain><1_py/></domain>",
+        id="fatal hook error, '2.py' and '3.sh' skipped"
+    ),
+    pytest.param(
+        [
+            plugins(
+                plugin("1.py", """\
+                    def run(domxml, env):
+                        raise RuntimeError("plugin failed")
+                    """),
+                appender_plugin("2.py"),
+            ),
+        ],
+        u"<domain><2_py/></domain>",
+        id="plugin raised"
+    ),
+    pytest.param(
+        [
+            plugins(
+                plugin("1.py", "no_run = True\n"),
+                appender_plugin("2.py"),
+            ),
+        ],
+        u"<domain><2_py/></domain>",
+        id="invalid plugin"
+    ),
+])
+def test_plugin_errors(hooks_dir, expected):
+    result = hooks._runHooksDir(u"<domain/>", hooks_dir.basename,
+                                raiseError=False)
+    assert result == u'<?xml version="1.0" encoding="utf-8"?>' + expected
+
+    with pytest.raises(exception.HookError):
+        hooks._runHooksDir(u"<domain/>", hooks_dir.basename)
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("1.py", """\
+                    from vdsm.hook import hooking
+
+                    def run(domxml, env):
+                        hooking.exit_hook("vm is not supported")
+                    """),
+                appender_plugin("2.py"),
+            ),
+        ],
+        id="exit hook"
+    ),
+])
+def test_plugin_exit_hook(hooks_dir, capsys):
+    with pytest.raises(exception.HookError) as e:
+        hooks._runHooksDir(u"<domain/>", hooks_dir.basename)
+
+    assert "vm is not supported" in str(e.value)
+    assert capsys.readouterr().err == ""
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("1.py", """\
+                    import sys
+
+                    def run(domxml, env):
+                        sys.exit()
+                    """),
+                appender_plugin("2.py"),
+            ),
+        ],
+        id="exit without code"
+    ),
+    pytest.param(
+        [
+            plugins(
+                plugin("1.py", """\
+                    from vdsm.hook import hooking
+
+                    def run(domxml, env):
+                        hooking.exit_hook("nothing to do", return_code=0)
+                    """),
+                appender_plugin("2.py"),
+            ),
+        ],
+        id="exit hook with zero code"
+    ),
+])
+def test_plugin_exit_success(hooks_dir):
+    result = hooks._runHooksDir(u"<domain/>", hooks_dir.basename)
+    assert result == (u'<?xml version="1.0" encoding="utf-8"?>'
+                      u'<domain><2_py/></domain>')
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    def run(data, env):
+                        return env
+                    """),
+            ),
+        ],
+        id="env"
+    ),
+])
+def test_plugin_env(hooks_dir):
+    vmconf = {"vmId": "myvm", "custom": {"abc": "geh"}}
+    params = {"abc": "def", "other": "value"}
+    env = hooks._runHooksDir({}, hooks_dir.basename, vmconf, params=params,
+                             hookType=hooks._JSON_HOOK)
+    assert env == {"vmId": "myvm", "abc": "geh", "other": "value"}
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(
+                plugin("hook.py", """\
+                    loads = 0
+                    loads += 1
+
+                    def run(data, env):
+                        return loads
+                    """),
+            ),
+        ],
+        id="counting loads"
+    ),
+])
+def test_plugin_imported_once(hooks_dir):
+    for _ in range(3):
+        result = hooks._runHooksDir({}, hooks_dir.basename,
+                                    hookType=hooks._JSON_HOOK)
+        assert result == 1
+
+    # Modifying the plugin reloads it.
+    path = hooks_dir.join(hooks._PLUGINS_DIR, "hook.py")
+    path.write("def run(data, env):\n    return 'modified'\n")
+    stat = path.stat()
+    os.utime(str(path), ns=(stat.atime_ns + 10**9, stat.mtime_ns + 10**9))
+
+    result = hooks._runHooksDir({}, hooks_dir.basename,
+                                hookType=hooks._JSON_HOOK)
+    assert result == "modified"
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            plugins(plugin("hook.py", "abc")),
+            FileEntry("script.sh", 0o777, "def"),
+        ],
+        id="plugin and script"
+    ),
+])
+def test_get_hook_info_should_return_plugins(hooks_dir):
+    assert hooks._getHookInfo(hooks_dir.basename) == {
+        "script.sh": {"checksum": hashlib.sha256(b"def").hexdigest()},
+        "plugins/hook.py": {"checksum": hashlib.sha256(b"abc").hexdigest()},
+    }
+
+
+STATS_SCRIPT = """\
+#!{python}
+from vdsm.hook import hooking
+stats = hooking.read_json()
+for vm in stats:
+    vm["hooked"] = True
+hooking.write_json(stats)
+"""
+
+STATS_PLUGIN = """\
+def run(stats, env):
+    for vm in stats:
+        vm["hooked"] = True
+"""
+
+
+@pytest.mark.slow
+@pytest.mark.timeout(120)
+@pytest.mark.parametrize("mode", ["script", "plugin"])
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_benchmark_get_all_vm_stats(fake_hooks_root, mode, count):
+    # Time the hooks run for every getAllVmStats call.
+    for name in ("before_get_all_vm_stats", "after_get_all_vm_stats"):
+        hook_dir = fake_hooks_root.mkdir(name)
+        if mode == "plugin":
+            hook_dir = hook_dir.mkdir(hooks._PLUGINS_DIR)
+        for i in range(count):
+            if mode == "script":
+                code = STATS_SCRIPT.format(python=sys.executable)
+                FileEntry("%d.py" % i, 0o755, code).apply(hook_dir)
+            else:
+                FileEntry("%d.py" % i, 0o644, STATS_PLUGIN).apply(hook_dir)
+
+    stats = [{"vmId": str(i), "status": "Up", "cpuUser": "1.5"}
+             for i in range(100)]
+
+    def get_all_vm_stats():
+        hooks.before_get_all_vm_stats()
+        return hooks.after_get_all_vm_stats(stats)
+
+    runs = 5
+    start = time.monotonic()
+    for _ in range(runs):
+        result = get_all_vm_stats()
+    elapsed = time.monotonic() - start
+
+    assert all(vm.get("hooked") for vm in result) == (count > 0)
+    print("%d %s hooks: %.6f seconds per getAllVmStats"
+          % (count, mode, elapsed / runs))
+
+
 @pytest.fixture
 def launch_flags_path(monkeypatch, tmpdir):
     lfp = hooks._LAUNCH_FLAGS_PATH
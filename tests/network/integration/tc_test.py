@@ -21,6 +21,7 @@
 
 from binascii import unhexlify
 from collections import namedtuple
+from contextlib import nullcontext
 import os
 import time
 from unittest import mock
@@ -43,6 +44,7 @@ from vdsm.network import cmd
 from vdsm.network import tc
 from vdsm.network.configurators import qos
 from vdsm.network.ipwrapper import netns_exec, link_set_netns
+from vdsm.network.netlink import qdisc as nl_qdisc
 from vdsm.network.netinfo.qos import DEFAULT_CLASSID
 
 from .iperf import IperfServer
@@ -526,6 +528,71 @@ class TestConfigureOutbound(object):
         return _find_entity(lambda q: q['handle'] == handle, qdiscs)
 
 
+class TestBackends(object):
+    """
+    Compares the netlink qdisc listing and the batched requests with the tc
+    text parsing and single requests.
+    """
+
+    def test_bridge_qdiscs(self, bridge_dev, requires_tc):
+        tc.qdisc.replace(bridge_dev, 'prio', parent=None)
+        _assert_same_qdiscs(bridge_dev)
+
+    def test_qos_qdiscs(self, dummy):
+        qos.configure_outbound(HOST_QOS_OUTBOUND, dummy, None)
+        _assert_same_qdiscs(dummy)
+
+    def test_all_qdiscs(self, dummy):
+        qos.configure_outbound(HOST_QOS_OUTBOUND, dummy, None)
+        netlink_qdiscs = [
+            _general_attrs(q)
+            for q in nl_qdisc.iter_qdiscs()
+            if q['kind'] != 'noqueue'
+        ]
+        text_qdiscs = [
+            _general_attrs(q) for q in tc._iterate(tc.qdisc, None)
+        ]
+        assert netlink_qdiscs == text_qdiscs
+
+    def test_batched_qos(self, dummy):
+        qos.configure_outbound(HOST_QOS_OUTBOUND, dummy, None)
+        batched = _show_tc(dummy)
+
+        tc._qdisc_del(dummy)
+        tc._qdisc_del(dummy, kind='ingress')
+        with mock.patch.object(tc, 'batch', nullcontext):
+            qos.configure_outbound(HOST_QOS_OUTBOUND, dummy, None)
+        assert _show_tc(dummy) == batched
+
+
+def _general_attrs(qdisc):
+    return {
+        key: value
+        for key, value in qdisc.items()
+        if key in ('kind', 'handle', 'root', 'parent', 'dev')
+    }
+
+
+def _assert_same_qdiscs(dev):
+    netlink_qdiscs = [
+        _general_attrs(q)
+        for q in nl_qdisc.iter_qdiscs(dev)
+        if q['kind'] != 'noqueue'
+    ]
+    # Recent tc versions omit the device when listing a single device
+    text_qdiscs = [
+        dict(_general_attrs(q), dev=dev) for q in tc._iterate(tc.qdisc, dev)
+    ]
+    assert netlink_qdiscs == text_qdiscs
+
+
+def _show_tc(dev):
+    return [
+        cmd.exec_sync([EXT_TC, obj, 'show', 'dev', dev])[1]
+        for obj in ('qdisc', 'class', 'filter')
+    ]
+
+
 def _find_entity(predicate, entities):
     for ent in entities:
         if predicate(ent):
@@ -0,0 +1,158 @@
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+
+import queue
+
+import pytest
+
+from vdsm.network.netlink import reactor
+
+LINK_EVENT = {'event': 'new_link', 'name': 'eth0'}
+IFLA_EVENT = {'IFLA_EVENT': 'IFLA_EVENT_BONDING_FAILOVER'}
+ADDR4_EVENT = {'event': 'new_addr', 'family': 'inet', 'label': 'eth0'}
+ADDR6_EVENT = {'event': 'new_addr', 'family': 'inet6', 'label': 'eth0'}
+
+
+class FakeMonitor(object):
+    def __init__(self, groups):
+        self.groups = groups
+        self._events = queue.Queue()
+        self._stopped = False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self._stopped = True
+        self._events.put(None)
+
+    def is_stopped(self):
+        return self._stopped
+
+    def wait(self):
+        pass
+
+    def send(self, event):
+        self._events.put(event)
+
+    def __iter__(self):
+        return iter(self._events.get, None)
+
+
+class Handler(object):
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def __call__(self, event):
+        self.events.put(event)
+
+    def received(self, count):
+        return [self.events.get(timeout=2) for _ in range(count)]
+
+
+@pytest.fixture
+def monitors():
+    return []
+
+
+@pytest.fixture
+def nl_reactor(monitors):
+    def monitor_factory(groups):
+        monitor = FakeMonitor(groups)
+        monitors.append(monitor)
+        return monitor
+
+    nl_reactor = reactor.Reactor(monitor_factory=monitor_factory)
+    yield nl_reactor
+    nl_reactor._stop_monitor()
+
+
+def test_shared_monitor(nl_reactor, monitors):
+    link_handler = Handler()
+    addr_handler = Handler()
+    nl_reactor.subscribe(('link',), link_handler)
+    nl_reactor.subscribe(('ipv4-ifaddr', 'ipv6-ifaddr'), addr_handler)
+
+    monitor = monitors[-1]
+    assert monitor.groups == {'link', 'ipv4-ifaddr', 'ipv6-ifaddr'}
+    for event in (LINK_EVENT, ADDR4_EVENT, IFLA_EVENT, ADDR6_EVENT):
+        monitor.send(event)
+
+    assert link_handler.received(2) == [LINK_EVENT, IFLA_EVENT]
+    assert addr_handler.received(2) == [ADDR4_EVENT, ADDR6_EVENT]
+    assert link_handler.events.empty()
+
+
+def test_event_filter(nl_reactor, monitors):
+    handler = Handler()
+    nl_reactor.subscribe(
+        ('link',), handler, event_filter=lambda e: 'IFLA_EVENT' in e
+    )
+    monitors[-1].send(LINK_EVENT)
+    monitors[-1].send(IFLA_EVENT)
+    assert handler.received(1) == [IFLA_EVENT]
+
+
+def test_monitor_replaced_only_for_new_groups(nl_reactor, monitors):
+    first = nl_reactor.subscribe(('link',), Handler())
+    nl_reactor.subscribe(('link',), Handler())
+    assert len(monitors) == 1
+
+    nl_reactor.subscribe(('ipv4-ifaddr',), Handler())
+    assert len(monitors) == 2
+    assert monitors[0].is_stopped()
+
+    nl_reactor.unsubscribe(first)
+    assert len(monitors) == 2
+
+
+def test_stop_with_last_subscriber(nl_reactor, monitors):
+    subscription = nl_reactor.subscribe(('link',), Handler())
+    nl_reactor.unsubscribe(subscription)
+    assert monitors[0].is_stopped()
+
+    nl_reactor.subscribe(('link',), Handler())
+    assert len(monitors) == 2
+    assert not monitors[1].is_stopped()
+
+
+def test_handler_error(nl_reactor, monitors):
+    def failing(event):
+        raise RuntimeError('handler failed')
+
+    handler = Handler()
+    nl_reactor.subscribe(('link',), failing)
+    nl_reactor.subscribe(('link',), handler)
+    monitors[-1].send(LINK_EVENT)
+    monitors[-1].send(LINK_EVENT)
+    assert handler.received(2) == [LINK_EVENT, LINK_EVENT]
+
+
+@pytest.mark.parametrize(
+    'event,group',
+    [
+        (LINK_EVENT, 'link'),
+        (IFLA_EVENT, 'link'),
+        (ADDR4_EVENT, 'ipv4-ifaddr'),
+        (ADDR6_EVENT, 'ipv6-ifaddr'),
+        ({'event': 'del_route', 'family': 'inet6'}, 'ipv6-route'),
+        ({'event': 'new_neigh'}, None),
+    ],
+)
+def test_event_group(event, group):
+    assert reactor.event_group(event) == group
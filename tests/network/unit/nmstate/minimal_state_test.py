@@ -0,0 +1,271 @@
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+import copy
+import time
+from unittest import mock
+
+import pytest
+
+from vdsm.network import nmstate
+from vdsm.network.nmstate import api
+from vdsm.network.nmstate.state import CurrentState
+from vdsm.network.nmstate.state import minimize_state
+
+from .testlib import (
+    DNS_SERVERS1,
+    DNS_SERVERS2,
+    IFACE0,
+    IPv4_ADDRESS1,
+    IPv4_NETMASK1,
+    TESTNET1,
+    TESTNET2,
+    VLAN101,
+    VLAN102,
+    create_network_config,
+    create_static_ip_configuration,
+)
+
+
+def vlan_network(vlan, **kwargs):
+    return create_network_config(
+        'nic', IFACE0, bridged=True, vlan=vlan, **kwargs
+    )
+
+
+def apply_state(current_state_mock, state):
+    """
+    Update the current state mock as if state was applied, adding some
+    attributes reported by nmstate.
+    """
+    current = {
+        ifstate[nmstate.Interface.NAME]: ifstate
+        for ifstate in current_state_mock[nmstate.Interface.KEY]
+    }
+    for ifstate in state.get(nmstate.Interface.KEY, ()):
+        name = ifstate[nmstate.Interface.NAME]
+        if ifstate.get(nmstate.Interface.STATE) == 'absent':
+            current.pop(name, None)
+            continue
+        new_ifstate = current.setdefault(
+            name,
+            {
+                nmstate.Interface.NAME: name,
+                nmstate.Interface.TYPE: (
+                    nmstate.InterfaceType.ETHERNET
+                    if name == IFACE0
+                    else nmstate.InterfaceType.LINUX_BRIDGE
+                ),
+                'accept-all-mac-addresses': False,
+            },
+        )
+        new_ifstate.update(copy.deepcopy(ifstate))
+    current_state_mock[nmstate.Interface.KEY] = list(current.values())
+    if nmstate.DNS.KEY in state:
+        current_state_mock[nmstate.DNS.KEY] = {
+            nmstate.DNS.RUNNING: state[nmstate.DNS.KEY][nmstate.DNS.CONFIG]
+        }
+
+
+def ifnames(state):
+    return sorted(
+        ifstate[nmstate.Interface.NAME]
+        for ifstate in state.get(nmstate.Interface.KEY, ())
+    )
+
+
+def test_unchanged_network(current_state_mock, rconfig_mock):
+    networks = {TESTNET1: vlan_network(VLAN101)}
+    apply_state(
+        current_state_mock, nmstate.generate_state(networks, bondings={})
+    )
+    rconfig_mock.networks = networks
+
+    assert nmstate.generate_minimal_state(networks, bondings={}) == {}
+
+
+def test_add_network(current_state_mock, rconfig_mock):
+    networks = {TESTNET1: vlan_network(VLAN101)}
+    apply_state(
+        current_state_mock, nmstate.generate_state(networks, bondings={})
+    )
+    rconfig_mock.networks = networks
+
+    new_networks = {TESTNET2: vlan_network(VLAN102)}
+    full_state = nmstate.generate_state(new_networks, bondings={})
+    state = nmstate.generate_minimal_state(new_networks, bondings={})
+
+    assert IFACE0 in ifnames(full_state)
+    assert ifnames(state) == sorted([TESTNET2, f'{IFACE0}.{VLAN102}'])
+
+
+def test_modified_network(current_state_mock, rconfig_mock):
+    networks = {TESTNET1: vlan_network(VLAN101)}
+    apply_state(
+        current_state_mock, nmstate.generate_state(networks, bondings={})
+    )
+    rconfig_mock.networks = networks
+
+    networks = {
+        TESTNET1: vlan_network(
+            VLAN101,
+            static_ip_configuration=create_static_ip_configuration(
+                IPv4_ADDRESS1, IPv4_NETMASK1, None, None
+            ),
+        )
+    }
+    state = nmstate.generate_minimal_state(networks, bondings={})
+
+    assert ifnames(state) == [TESTNET1]
+
+
+def test_remove_network(current_state_mock, rconfig_mock):
+    networks = {TESTNET1: vlan_network(VLAN101)}
+    apply_state(
+        current_state_mock, nmstate.generate_state(networks, bondings={})
+    )
+    rconfig_mock.networks = networks
+
+    state = nmstate.generate_minimal_state(
+        {TESTNET1: {'remove': True}}, bondings={}
+    )
+    assert ifnames(state) == sorted([TESTNET1, f'{IFACE0}.{VLAN101}'])
+
+
+def test_remove_missing_interface():
+    desired = {
+        nmstate.Interface.KEY: [
+            {
+                nmstate.Interface.NAME: 'missing',
+                nmstate.Interface.STATE: nmstate.InterfaceState.ABSENT,
+            }
+        ]
+    }
+    current = CurrentState(
+        {
+            nmstate.Interface.KEY: [],
+            nmstate.DNS.KEY: {},
+            nmstate.Route.KEY: {},
+            nmstate.RouteRule.KEY: {},
+        }
+    )
+    assert minimize_state(desired, current) == {}
+
+
+def test_routes_and_dns():
+    route = {
+        nmstate.Route.DESTINATION: '0.0.0.0/0',
+        nmstate.Route.NEXT_HOP_ADDRESS: '192.0.2.254',
+        nmstate.Route.NEXT_HOP_INTERFACE: TESTNET1,
+        nmstate.Route.TABLE_ID: 0,
+    }
+    new_route = dict(route, **{nmstate.Route.TABLE_ID: 100})
+    absent_route = dict(route, **{nmstate.Route.STATE: 'absent'})
+    desired = {
+        nmstate.Route.KEY: {
+            nmstate.Route.CONFIG: [route, new_route, absent_route]
+        },
+        nmstate.DNS.KEY: {
+            nmstate.DNS.CONFIG: {nmstate.DNS.SERVER: DNS_SERVERS1}
+        },
+    }
+    current = CurrentState(
+        {
+            nmstate.Interface.KEY: [],
+            nmstate.DNS.KEY: {
+                nmstate.DNS.RUNNING: {nmstate.DNS.SERVER: DNS_SERVERS1}
+            },
+            nmstate.Route.KEY: {
+                nmstate.Route.CONFIG: [dict(route, metric=425)],
+                nmstate.Route.RUNNING: [dict(route, metric=425)],
+            },
+            nmstate.RouteRule.KEY: {},
+        }
+    )
+    assert minimize_state(desired, current) == {
+        nmstate.Route.KEY: {
+            nmstate.Route.CONFIG: [new_route, absent_route]
+        },
+    }
+
+    desired[nmstate.DNS.KEY][nmstate.DNS.CONFIG][
+        nmstate.DNS.SERVER
+    ] = DNS_SERVERS2
+    assert nmstate.DNS.KEY in minimize_state(desired, current)
+
+
+def test_running_route_not_configured():
+    # A route added by DHCP or the kernel is not saved in the profile.
+    route = {
+        nmstate.Route.DESTINATION: '0.0.0.0/0',
+        nmstate.Route.NEXT_HOP_ADDRESS: '192.0.2.254',
+        nmstate.Route.NEXT_HOP_INTERFACE: TESTNET1,
+        nmstate.Route.TABLE_ID: 0,
+    }
+    desired = {nmstate.Route.KEY: {nmstate.Route.CONFIG: [route]}}
+    current = CurrentState(
+        {
+            nmstate.Interface.KEY: [],
+            nmstate.DNS.KEY: {},
+            nmstate.Route.KEY: {
+                nmstate.Route.CONFIG: [],
+                nmstate.Route.RUNNING: [dict(route, metric=425)],
+            },
+            nmstate.RouteRule.KEY: {},
+        }
+    )
+    assert minimize_state(desired, current) == desired
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('count', [10, 100, 500])
+def test_add_network_benchmark(current_state_mock, rconfig_mock, count):
+    networks = {
+        f'net{vlan}': vlan_network(vlan) for vlan in range(1, count + 1)
+    }
+    apply_state(
+        current_state_mock, nmstate.generate_state(networks, bondings={})
+    )
+    rconfig_mock.networks = networks
+
+    new_networks = {'newnet': vlan_network(count + 1)}
+    with mock.patch.object(api, 'state_apply') as state_apply:
+        start = time.monotonic()
+        full_state = nmstate.generate_state(new_networks, bondings={})
+        nmstate.setup(full_state, verify_change=True)
+        full_time = time.monotonic() - start
+
+        start = time.monotonic()
+        state = nmstate.generate_minimal_state(new_networks, bondings={})
+        nmstate.setup(state, verify_change=True)
+        minimal_time = time.monotonic() - start
+
+    print(
+        '%d networks: full state %d interfaces in %.3f seconds, '
+        'minimal state %d interfaces in %.3f seconds'
+        % (
+            count,
+            len(full_state[nmstate.Interface.KEY]),
+            full_time,
+            len(state[nmstate.Interface.KEY]),
+            minimal_time,
+        )
+    )
+    assert state_apply.call_count == 2
+    assert ifnames(state) == sorted(['newnet', f'{IFACE0}.{count + 1}'])
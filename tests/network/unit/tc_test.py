@@ -21,11 +21,31 @@
 
 from __future__ import absolute_import
 from __future__ import division
+import errno
 import os
 
 from itertools import zip_longest
 
+import pytest
+
 from vdsm.network import tc
+from vdsm.network.netlink import qdisc as nl_qdisc
+from vdsm.network.tc import _wrapper
+
+FAKE_TC = """\
+#!/bin/sh
+echo "$@" >> {log}
+if [ "$1" = "-batch" ]; then
+    cat "$2" >> {log}
+    failed=$(grep -n fail "$2" | head -1 | cut -d: -f1)
+    if [ -n "$failed" ]; then
+        echo 'RTNETLINK answers: File exists' >&2
+        echo 'We have an error talking to the kernel' >&2
+        echo "Command failed $2:$failed" >&2
+        exit 1
+    fi
+fi
+"""
 
 
 class TestFilters(object):
@@ -369,3 +389,105 @@ class TestFilters(object):
             tc.classes(None, out=data), classes
         ):
             assert parsed == correct
+
+
+@pytest.fixture
+def fake_tc(tmpdir, monkeypatch):
+    log = tmpdir.join('tc.log')
+    script = tmpdir.join('tc')
+    script.write(FAKE_TC.format(log=log))
+    script.chmod(0o755)
+    monkeypatch.setattr(_wrapper, 'EXT_TC', str(script))
+    return log
+
+
+class TestBatch(object):
+    def test_single_process(self, fake_tc):
+        with tc.batch():
+            tc.qdisc.add('dev0', 'ingress')
+            tc.filter.replace(
+                'dev0',
+                parent='1389:',
+                protocol='all',
+                pref=16,
+                basic=['match', 'meta(vlan eq 16)', 'flowid', '1389:10'],
+            )
+            assert not fake_tc.check()
+
+        batch_cmd, qdisc_cmd, filter_cmd = fake_tc.read().splitlines()
+        assert batch_cmd.startswith('-batch ')
+        assert qdisc_cmd == 'qdisc add dev dev0 ingress'
+        assert filter_cmd == (
+            'filter replace dev dev0 protocol all parent 1389: pref 16 '
+            'basic match "meta(vlan eq 16)" flowid 1389:10'
+        )
+
+    def test_query_sends_queued_requests(self, fake_tc):
+        with tc.batch():
+            tc.qdisc.add('dev0', 'ingress')
+            tc.qdisc.show('dev0')
+            tc.qdisc.add('dev1', 'ingress')
+
+        assert [
+            line
+            for line in fake_tc.read().splitlines()
+            if not line.startswith('-batch ')
+        ] == [
+            'qdisc add dev dev0 ingress',
+            'qdisc show dev dev0',
+            'qdisc add dev dev1 ingress',
+        ]
+
+    def test_nested(self, fake_tc):
+        with tc.batch():
+            tc.qdisc.add('dev0', 'ingress')
+            with tc.batch():
+                tc.qdisc.add('dev1', 'ingress')
+            assert not fake_tc.check()
+        assert len(fake_tc.read().splitlines()) == 3
+
+    def test_failure(self, fake_tc):
+        with pytest.raises(tc.TrafficControlException) as e:
+            with tc.batch():
+                tc.qdisc.add('dev0', 'ingress')
+                tc.qdisc.add('fail0', 'ingress')
+        assert e.value.errCode == errno.EEXIST
+        assert e.value.command[1:] == [
+            'qdisc',
+            'add',
+            'dev',
+            'fail0',
+            'ingress',
+        ]
+
+        tc.qdisc.add('dev0', 'ingress')  # not batched any more
+        assert fake_tc.read().splitlines()[-1] == 'qdisc add dev dev0 ingress'
+
+    def test_error_in_block_discards_requests(self, fake_tc):
+        with pytest.raises(RuntimeError):
+            with tc.batch():
+                tc.qdisc.add('dev0', 'ingress')
+                raise RuntimeError('error in block')
+        assert not fake_tc.check()
+
+
+@pytest.mark.parametrize(
+    'handle,text',
+    [
+        (0x00010000, '1:'),
+        (0x13890010, '1389:10'),
+        (0x00000001, ':1'),
+        (0xFFFFFFF1, 'ffff:fff1'),
+    ],
+)
+def test_netlink_handle_str(handle, text):
+    assert nl_qdisc.handle_str(handle) == text
+
+
+def test_qdiscs_netlink_fallback(fake_tc, monkeypatch):
+    def iter_qdiscs(dev):
+        raise IOError(errno.EPROTO, 'netlink failure')
+
+    monkeypatch.setattr(nl_qdisc, 'iter_qdiscs', iter_qdiscs)
+    assert list(tc.qdiscs('dev0')) == []
+    assert fake_tc.read().splitlines() == ['qdisc show dev dev0']
@@ -357,6 +357,154 @@ class TestOccupiedSlots:
         assert occupied == expected
 
 
+class TestMetadataSlots:
+
+    def test_allocate(self):
+        slots = blockSD.MetadataSlots(4)
+        assert [slots.allocate() for _ in range(3)] == [4, 5, 6]
+        assert slots.occupied() == [4, 5, 6]
+
+    def test_allocate_after_occupied(self):
+        slots = blockSD.MetadataSlots(1, occupied=[1, 2, 4])
+        assert slots.allocate() == 3
+        assert slots.allocate() == 5
+
+    def test_allocate_many(self):
+        slots = blockSD.MetadataSlots(1, occupied=range(1, 2000))
+        assert slots.allocate() == 2000
+
+    def test_free(self):
+        slots = blockSD.MetadataSlots(4, occupied=[4, 5, 6])
+        slots.free(5)
+        assert 5 not in slots
+        assert slots.occupied() == [4, 6]
+        assert slots.allocate() == 5
+        assert slots.allocate() == 7
+
+    def test_free_reserved(self):
+        slots = blockSD.MetadataSlots(4)
+        slots.free(0)
+        assert slots.allocate() == 4
+
+
+class TestMetadataSlotsAllocation:
+
+    @pytest.fixture
+    def manifest(self, monkeypatch):
+        sd_uuid = str(uuid.uuid4())
+        fake_metadata = {
+            sd.DMDK_VERSION: 5,
+            sd.DMDK_LOGBLKSIZE: 512,
+            sd.DMDK_PHYBLKSIZE: 512,
+        }
+        monkeypatch.setattr(sd.StorageDomainManifest, "_makeDomainLock",
+                            lambda _: None)
+        yield blockSD.BlockStorageDomainManifest(sd_uuid, fake_metadata)
+        blockSD.invalidate_metadata_slots(sd_uuid)
+
+    def test_load_occupied_once(self, manifest, monkeypatch):
+        calls = []
+
+        def getLV(sd_uuid):
+            calls.append(sd_uuid)
+            return [make_lv(tags=("MD_1",)), make_lv(tags=("MD_3",))]
+
+        monkeypatch.setattr(lvm, "getLV", getLV)
+        allocated = []
+        for _ in range(3):
+            with manifest.acquireVolumeMetadataSlot(None) as slot:
+                allocated.append(slot)
+
+        assert allocated == [2, 4, 5]
+        assert calls == [manifest.sdUUID]
+
+    def test_release(self, manifest, monkeypatch):
+        monkeypatch.setattr(lvm, "getLV", lambda sd_uuid: [])
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 1
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 2
+
+        manifest.releaseVolumeMetadataSlots([1])
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 1
+
+    def test_failed_allocation_reloads(self, manifest, monkeypatch):
+        lvs = []
+        monkeypatch.setattr(lvm, "getLV", lambda sd_uuid: lvs)
+
+        with pytest.raises(RuntimeError):
+            with manifest.acquireVolumeMetadataSlot(None) as slot:
+                # Volume got the slot before the failure.
+                lvs.append(make_lv(tags=("MD_%d" % slot,)))
+                raise RuntimeError
+
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 2
+
+    def test_invalidate(self, manifest, monkeypatch):
+        lvs = []
+        monkeypatch.setattr(lvm, "getLV", lambda sd_uuid: lvs)
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 1
+
+        # Another host allocated slots while being the SPM.
+        lvs.extend([make_lv(tags=("MD_1",)), make_lv(tags=("MD_2",))])
+        blockSD.invalidate_metadata_slots()
+
+        with manifest.acquireVolumeMetadataSlot(None) as slot:
+            assert slot == 3
+
+
+def test_metadata_area(tmp_path, monkeypatch):
+    sd_uuid = str(uuid.uuid4())
+    fake_metadata = {
+        sd.DMDK_VERSION: 5,
+        sd.DMDK_LOGBLKSIZE: 512,
+        sd.DMDK_PHYBLKSIZE: 512,
+    }
+    monkeypatch.setattr(sd.StorageDomainManifest, "_makeDomainLock",
+                        lambda _: None)
+    manifest = blockSD.BlockStorageDomainManifest(sd_uuid, fake_metadata)
+
+    path = str(tmp_path / "metadata")
+    monkeypatch.setattr(manifest, "metadata_volume_path", lambda: path)
+
+    # Slots spanning more than one read chunk.
+    last_slot = blockSD.METADATA_READ_CHUNK // blockSD.METADATA_SLOT_SIZE_V5
+    slots = [1, 2, last_slot]
+    with open(path, "wb") as f:
+        f.truncate(manifest.metadata_offset(last_slot + 1))
+        for slot in slots:
+            f.seek(manifest.metadata_offset(slot))
+            f.write(b"DESCRIPTION=slot %d\nEOF\n" % slot)
+
+    reads = []
+
+    def readblock(name, offset, size):
+        reads.append((offset, size))
+        with open(name, "rb") as f:
+            f.seek(offset)
+            return bytearray(f.read(size))
+
+    monkeypatch.setattr(blockSD.misc, "readblock", readblock)
+
+    area = blockSD.MetadataArea(manifest, [last_slot, 2, 1])
+    assert area.slots == slots
+    assert len(reads) == 2
+    for offset, size in reads:
+        assert offset % blockSD.METADATA_READ_CHUNK == 0
+
+    for slot in slots:
+        assert area.read(slot).rstrip(b"\0") == (
+            b"DESCRIPTION=slot %d\nEOF\n" % slot)
+        md = area.dump(slot)
+        assert md["description"] == "slot %d" % slot
+        assert md["mdslot"] == slot
+        # Parsed once.
+        assert area.dump(slot) is md
+
+
 class TestDecodeValidity:
 
     def test_all_keys(self):
@@ -0,0 +1,194 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import pytest
+
+from vdsm.storage import devinventory
+
+
+class FakeStorage(object):
+
+    def __init__(self):
+        self.devices = {
+            "guid-1": ["sda", "sdb"],
+            "guid-2": ["sdc", "sdd"],
+        }
+        self.scans = []
+        self.error = None
+
+    def scan(self, guids):
+        if self.error:
+            raise self.error
+        self.scans.append(guids)
+        for guid, paths in self.devices.items():
+            if guids and guid not in guids:
+                continue
+            yield {
+                "guid": guid,
+                "paths": [{"physdev": p, "state": "active"} for p in paths],
+            }
+
+
+def mpath_event(action, guid):
+    return {
+        "ACTION": action,
+        "SUBSYSTEM": "block",
+        "DEVNAME": "/dev/dm-0",
+        "DEVTYPE": "disk",
+        "DM_NAME": guid,
+        "DM_UUID": "mpath-" + guid,
+    }
+
+
+def path_event(action, physdev):
+    return {
+        "ACTION": action,
+        "SUBSYSTEM": "block",
+        "DEVNAME": "/dev/" + physdev,
+        "DEVTYPE": "disk",
+    }
+
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
+
+
+@pytest.fixture
+def inventory(storage):
+    inventory = devinventory.Inventory(scan=storage.scan)
+    inventory.start_monitoring()
+    return inventory
+
+
+def guids(devices):
+    return sorted(dev["guid"] for dev in devices)
+
+
+def test_scan_once(storage, inventory):
+    assert guids(inventory.devices()) == ["guid-1", "guid-2"]
+    assert guids(inventory.devices()) == ["guid-1", "guid-2"]
+    assert storage.scans == [()]
+
+
+def test_filter(storage, inventory):
+    assert guids(inventory.devices(("guid-2", "guid-3"))) == ["guid-2"]
+    # Only the requested devices are read before the first full scan.
+    assert storage.scans == [("guid-2", "guid-3")]
+
+
+def test_not_monitoring(storage, inventory):
+    inventory.stop_monitoring()
+    inventory.devices()
+    inventory.devices()
+    assert storage.scans == [(), ()]
+
+
+def test_start_monitoring(storage, inventory):
+    inventory.devices()
+    # Events may have been lost while udev was not monitored.
+    inventory.stop_monitoring()
+    inventory.start_monitoring()
+    inventory.devices()
+    assert storage.scans == [(), ()]
+
+
+def test_invalidate(storage, inventory):
+    inventory.devices()
+    inventory.invalidate()
+    inventory.devices()
+    assert storage.scans == [(), ()]
+
+
+def test_device_added(storage, inventory):
+    inventory.devices()
+    storage.devices["guid-3"] = ["sde"]
+    inventory.handle_event(mpath_event("add", "guid-3"))
+    assert guids(inventory.devices()) == ["guid-1", "guid-2", "guid-3"]
+    assert storage.scans == [(), ("guid-3",)]
+
+
+def test_device_removed(storage, inventory):
+    inventory.devices()
+    del storage.devices["guid-1"]
+    inventory.handle_event(mpath_event("remove", "guid-1"))
+    assert guids(inventory.devices()) == ["guid-2"]
+    assert storage.scans == [(), ("guid-1",)]
+
+
+def test_path_removed(storage, inventory):
+    inventory.devices()
+    storage.devices["guid-2"] = ["sdc"]
+    inventory.handle_event(path_event("remove", "sdd"))
+    dev, = inventory.devices(("guid-2",))
+    assert [p["physdev"] for p in dev["paths"]] == ["sdc"]
+    assert storage.scans == [(), ("guid-2",)]
+
+
+def test_unrelated_events(storage, inventory):
+    inventory.devices()
+    inventory.handle_event(path_event("change", "vda"))
+    inventory.handle_event({"ACTION": "change", "DEVTYPE": "partition",
+                            "DEVNAME": "/dev/sda1"})
+    inventory.devices()
+    assert storage.scans == [()]
+
+
+def test_scan_error(storage, inventory):
+    storage.error = RuntimeError("scan failed")
+    with pytest.raises(RuntimeError):
+        inventory.devices()
+
+    storage.error = None
+    assert guids(inventory.devices()) == ["guid-1", "guid-2"]
+    assert storage.scans == [()]
+
+
+def test_devices_owned_by_caller(storage, inventory):
+    dev, = inventory.devices(("guid-1",))
+    dev["paths"].append({"physdev": "sdz"})
+    dev, = inventory.devices(("guid-1",))
+    assert [p["physdev"] for p in dev["paths"]] == ["sda", "sdb"]
+
+
+def test_not_monitoring_filter(storage, inventory):
+    inventory.stop_monitoring()
+    assert guids(inventory.devices(("guid-2",))) == ["guid-2"]
+    assert storage.scans == [("guid-2",)]
+
+    # Reading some devices does not make the inventory valid.
+    inventory.start_monitoring()
+    inventory.devices()
+    assert storage.scans == [("guid-2",), ()]
+
+
+def test_invalidate_filter(storage, inventory):
+    inventory.devices()
+    inventory.invalidate(("guid-1",))
+    assert guids(inventory.devices(("guid-1",))) == ["guid-1"]
+    assert storage.scans == [(), ("guid-1",)]
+
+    # The inventory remains valid.
+    inventory.devices()
+    assert storage.scans == [(), ("guid-1",)]
@@ -22,7 +22,9 @@ from __future__ import absolute_import
 from __future__ import division
 
 import os
+import time
 
+from collections import namedtuple
 from contextlib import contextmanager
 
 import pytest
@@ -37,11 +39,14 @@ from storage.storagetestlib import (
     make_qemu_chain,
 )
 
+from vdsm.common import threadlocal
 from vdsm.common.units import MiB
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import hsm
+from vdsm.storage import lvm
 from vdsm.storage import qemuimg
+from vdsm.storage import sd
 
 
 class FakeHSM(hsm.HSM):
@@ -255,3 +260,206 @@ def test_extend_volume(monkeypatch, fake_task, size, expected_size_mb):
         sdUUID=None, spUUID=None, imgUUID=None, volumeUUID=None, size=size)
 
     assert pool.size == expected_size_mb
+
+
+FakeLease = namedtuple("FakeLease", "path,offset")
+
+
+class FakeTask(object):
+    id = "fake-task-id"
+
+    def __init__(self):
+        self.locks = []
+
+    def getSharedLock(self, namespace, resName):
+        self.locks.append((namespace, resName))
+
+
+class FakeVolume(object):
+
+    def __init__(self, legality=sc.LEGAL_VOL):
+        self.legality = legality
+
+    def getLegality(self):
+        return self.legality
+
+    def updateInvalidatedSize(self):
+        pass
+
+    def getVmVolumeInfo(self):
+        return {"type": "block"}
+
+
+class FakeDomain(object):
+    """
+    Fake storage domain implementing the prepare and teardown image interface.
+    """
+
+    def __init__(self, sdUUID, images, illegal=()):
+        self.sdUUID = sdUUID
+        self.domaindir = os.path.join("/rhev/data-center/mnt", sdUUID)
+        self.images = images
+        self.illegal = illegal
+        self.activated = []
+        self.deactivated = []
+
+    def getAllVolumes(self):
+        vols = {}
+        for imgUUID, volUUIDs in self.images.items():
+            parent = sc.BLANK_UUID
+            for volUUID in volUUIDs:
+                vols[volUUID] = sd.ImgsPar((imgUUID,), parent)
+                parent = volUUID
+        return vols
+
+    def produceVolume(self, imgUUID, volUUID):
+        if volUUID in self.illegal:
+            return FakeVolume(legality=sc.ILLEGAL_VOL)
+        return FakeVolume()
+
+    def activateImages(self, images):
+        self.activated.append(images)
+        return {imgUUID: os.path.join("/run/vdsm/storage", self.sdUUID,
+                                      imgUUID)
+                for imgUUID in images}
+
+    def linkBCImage(self, imgPath, imgUUID):
+        return os.path.join(self.domaindir, "images", imgUUID)
+
+    def unlinkBCImage(self, imgUUID):
+        pass
+
+    def deactivateImages(self, imgUUIDs):
+        self.deactivated.append(imgUUIDs)
+
+    def getVolumeLease(self, imgUUID, volUUID):
+        return FakeLease(None, None)
+
+
+@pytest.fixture
+def fake_domains(monkeypatch):
+    domains = {
+        "sd-1": FakeDomain("sd-1", {
+            "img-1": ["vol-1", "vol-2"],
+            "img-2": ["vol-3"],
+            "img-3": ["vol-4"],
+        }, illegal=("vol-4",)),
+        "sd-2": FakeDomain("sd-2", {
+            "img-4": ["vol-5"],
+        }),
+    }
+    monkeypatch.setattr(threadlocal.vars, "task", FakeTask())
+    monkeypatch.setattr(hsm.sdCache, "produce", lambda sdUUID: domains[sdUUID])
+    return domains
+
+
+def test_prepare_images(fake_domains):
+    h = FakeHSM()
+    images = [
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-1",
+         "leafUUID": "vol-2"},
+        {"sdUUID": "sd-2", "spUUID": sc.BLANK_UUID, "imgUUID": "img-4",
+         "leafUUID": "vol-5"},
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-2",
+         "leafUUID": "vol-3"},
+    ]
+    res = h.prepareImages(images)["images"]
+
+    # Volumes of all images in the same domain are activated together.
+    assert fake_domains["sd-1"].activated == [
+        {"img-1": ["vol-1", "vol-2"], "img-2": ["vol-3"]},
+    ]
+    assert fake_domains["sd-2"].activated == [{"img-4": ["vol-5"]}]
+
+    # Results are returned in the request order.
+    assert [r["status"]["code"] for r in res] == [0, 0, 0]
+    assert res[0]["path"] == "/run/vdsm/storage/sd-1/img-1/vol-2"
+    assert res[1]["path"] == "/run/vdsm/storage/sd-2/img-4/vol-5"
+    assert res[2]["path"] == "/run/vdsm/storage/sd-1/img-2/vol-3"
+    assert [v["volumeID"] for v in res[0]["imgVolumesInfo"]] == [
+        "vol-1", "vol-2"]
+
+
+def test_prepare_images_partial_failure(fake_domains):
+    h = FakeHSM()
+    images = [
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-1",
+         "leafUUID": "no-such-vol"},
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-3",
+         "leafUUID": "vol-4"},
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-2",
+         "leafUUID": "vol-3"},
+    ]
+    res = h.prepareImages(images)["images"]
+
+    assert res[0]["status"]["code"] == se.VolumeDoesNotExist.code
+    assert res[1]["status"]["code"] == se.prepareIllegalVolumeError.code
+    assert res[2]["status"]["code"] == 0
+
+    # Invalid images are not activated.
+    assert fake_domains["sd-1"].activated == [{"img-2": ["vol-3"]}]
+
+
+def test_teardown_images(fake_domains):
+    h = FakeHSM()
+    images = [
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-1"},
+        {"sdUUID": "sd-2", "spUUID": sc.BLANK_UUID, "imgUUID": "img-4"},
+        {"sdUUID": "sd-1", "spUUID": sc.BLANK_UUID, "imgUUID": "img-2"},
+    ]
+    res = h.teardownImages(images)["images"]
+
+    assert [r["status"]["code"] for r in res] == [0, 0, 0]
+    assert fake_domains["sd-1"].deactivated == [["img-1", "img-2"]]
+    assert fake_domains["sd-2"].deactivated == [["img-4"]]
+
+
+class FakeInventory(object):
+
+    def __init__(self, devices):
+        self._devices = devices
+
+    def devices(self, guids=()):
+        return [dev for dev in self._devices
+                if not guids or dev["guid"] in guids]
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("count", [100, 500, 1000])
+def test_get_device_list_benchmark(monkeypatch, count):
+    guids = ["guid-%04d" % i for i in range(count)]
+    h = FakeHSM()
+    h.device_inventory = FakeInventory([
+        {"guid": guid, "devtype": "iSCSI", "discard_max_bytes": 0}
+        for guid in guids
+    ])
+
+    # Third of the devices are used by VGs, and one device in 100 cannot
+    # be checked without running pvcreate.
+    pvs = [lvm.PV.fromlvm("uuid", "/dev/mapper/" + guid, "123", "vg",
+                          "vg-uuid", "0", "1", "0", "2", "123", "1")
+           for guid in guids[1::3]]
+    probed = {"DM_UDEV_RULES_VSN": "2"}
+    pvcreate = []
+
+    def createpv(devices, metadataSize, options=()):
+        pvcreate.append(devices)
+
+    monkeypatch.setattr(lvm, "getAllPVs", lambda: pvs)
+    monkeypatch.setattr(lvm, "_createpv", createpv)
+    monkeypatch.setattr(
+        lvm.devicemapper, "getDmId", lambda guid: "dm-" + guid)
+    monkeypatch.setattr(lvm.devicemapper, "getHolders", lambda dmId: [])
+    monkeypatch.setattr(
+        lvm.multipath, "udev_properties",
+        lambda dmId: None if dmId.endswith("00") else probed)
+
+    start = time.monotonic()
+    devices = h._getDeviceList(guids=guids, refresh=False)
+    elapsed = time.monotonic() - start
+
+    print("%d devices in %.3f seconds" % (count, elapsed))
+    assert len(devices) == count
+    assert len(pvcreate) == 1
+    assert len(pvcreate[0]) == len(
+        [i for i in range(0, count, 100) if i % 3 != 1])
@@ -2315,3 +2315,99 @@ def check_stats(hits, misses):
     stats = lvm.cache_stats()
     assert stats["hits"] == hits
     assert stats["misses"] == misses
+
+
+# udev properties of multipath devices processed by device mapper rules.
+UDEV_DM_PROPS = {"DM_UDEV_RULES_VSN": "2", "DM_UUID": "mpath-guid"}
+
+
+class FakeDevices(object):
+
+    def __init__(self):
+        self.pvs = []
+        self.holders = {}
+        self.udev = {}
+        self.pvcreate = []
+        self.pvcreate_used = ()
+
+    def getDmId(self, guid):
+        if guid == "missing":
+            raise OSError("No such device")
+        return "dm-" + guid
+
+    def getHolders(self, dmId):
+        return self.holders.get(dmId[3:], [])
+
+    def udev_properties(self, dmId):
+        return self.udev.get(dmId[3:], UDEV_DM_PROPS)
+
+    def createpv(self, devices, metadataSize, options=()):
+        assert options == ("--test",)
+        self.pvcreate.append(devices)
+        used = [d for d in devices
+                if os.path.basename(d) in self.pvcreate_used]
+        if used:
+            out = ['Physical volume "%s" successfully created.' % d
+                   for d in devices if d not in used]
+            raise se.LVMCommandError(["pvcreate"], 5, out, ["error"])
+
+
+@pytest.fixture
+def fake_devices_status(monkeypatch):
+    devices = FakeDevices()
+    monkeypatch.setattr(lvm, "getAllPVs", lambda: devices.pvs)
+    monkeypatch.setattr(lvm.devicemapper, "getDmId", devices.getDmId)
+    monkeypatch.setattr(lvm.devicemapper, "getHolders", devices.getHolders)
+    monkeypatch.setattr(
+        lvm.multipath, "udev_properties", devices.udev_properties)
+    monkeypatch.setattr(lvm, "_createpv", devices.createpv)
+    return devices
+
+
+def test_pv_create_status_without_pvcreate(fake_devices_status):
+    fake_devices_status.pvs = [
+        make_pv("/dev/mapper/vg-pv", "vg"),
+        make_pv("/dev/mapper/orphan-pv", ""),
+        lvm.Unreadable("/dev/mapper/unreadable"),
+    ]
+    fake_devices_status.holders = {"held": ["dm-7"]}
+    fake_devices_status.udev = {
+        "fs": dict(UDEV_DM_PROPS, ID_FS_TYPE="xfs"),
+        "partitioned": dict(UDEV_DM_PROPS, ID_PART_TABLE_TYPE="gpt"),
+    }
+
+    unused, used = lvm.testPVCreate(
+        ["vg-pv", "orphan-pv", "held", "fs", "partitioned", "empty"],
+        metadataSize=128)
+
+    assert unused == {"orphan-pv", "empty"}
+    assert used == {"vg-pv", "held", "fs", "partitioned"}
+    assert fake_devices_status.pvcreate == []
+
+
+def test_pv_create_status_fallback(fake_devices_status):
+    fake_devices_status.pvs = [
+        make_pv("/dev/mapper/unknown-vg", lvm.UNKNOWN)]
+    fake_devices_status.udev = {
+        "not-probed": None,
+        "no-dm-rules": {},
+        "suspended": dict(UDEV_DM_PROPS, DM_SUSPENDED="1"),
+        "filtered-pv": dict(UDEV_DM_PROPS, ID_FS_TYPE="LVM2_member"),
+    }
+    fake_devices_status.pvcreate_used = ("suspended", "filtered-pv")
+
+    unused, used = lvm.testPVCreate(
+        ["unknown-vg", "missing", "not-probed", "no-dm-rules", "suspended",
+         "filtered-pv", "empty"],
+        metadataSize=128)
+
+    assert unused == {"unknown-vg", "missing", "not-probed", "no-dm-rules",
+                      "empty"}
+    assert used == {"suspended", "filtered-pv"}
+
+    # pvcreate run once, only for the devices we could not check.
+    assert fake_devices_status.pvcreate == [
+        tuple("/dev/mapper/" + guid for guid in [
+            "unknown-vg", "missing", "not-probed", "no-dm-rules",
+            "suspended", "filtered-pv"]),
+    ]
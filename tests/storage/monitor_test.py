@@ -29,6 +29,7 @@ from contextlib import contextmanager
 
 from six.moves import queue
 
+from vdsm.common import exception
 from vdsm.storage import exception as se
 from vdsm.storage import monitor
 
@@ -73,6 +74,12 @@ class FakeCheckService(object):
     def __init__(self):
         self.checkers = {}
 
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
     def start_checking(self, path, complete, interval=10.0):
         log.info("Start checking %r", path)
         if path in self.checkers:
@@ -135,7 +142,7 @@ class FakeDomain(object):
         log.debug("Performing selftest")
 
     def getMonitoringPath(self):
-        return "/path/to/metadata"
+        return "/path/to/%s/metadata" % self.sdUUID
 
     @maybefail
     def getStats(self):
@@ -218,7 +225,7 @@ class MonitorEnv(object):
 
 
 @contextmanager
-def monitor_env(shutdown=False, refresh=300):
+def monitor_env(shutdown=False, refresh=300, engine=False):
     config = make_config([
         ("irs", "repo_stats_cache_refresh_timeout", str(refresh))
     ])
@@ -228,8 +235,13 @@ def monitor_env(shutdown=False, refresh=300):
     ]):
         event = FakeEvent()
         checker = FakeCheckService()
+        if engine:
+            engine = monitor.MonitorEngine(2, 4, CYCLE_TIMEOUT)
+            engine.start()
+        else:
+            engine = None
         thread = monitor.MonitorThread('uuid', 'host_id', MONITOR_INTERVAL,
-                                       event, checker)
+                                       event, checker, engine=engine)
         try:
             yield MonitorEnv(thread, event, checker)
         finally:
@@ -238,12 +250,16 @@ def monitor_env(shutdown=False, refresh=300):
                 thread.join()
             except RuntimeError as e:
                 log.error("Error joining thread: %s", e)
+            if engine:
+                engine.stop()
 
 
 class FakeMonitorThread(object):
 
-    def __init__(self, sd_uuid, host_id, interval, event, checker):
+    def __init__(self, sd_uuid, host_id, interval, event, checker,
+                 publish=None, engine=None):
         self.sdUUID = sd_uuid
+        self.publish = publish
 
     def start(self):
         pass
@@ -460,6 +476,22 @@ class TestMonitorThreadMonitoring(VdsmTestCase):
             self.assertTrue(status.valid)
             self.assertEqual(env.event.received, [(('uuid', True), {})])
 
+    def test_publish_status(self):
+        with monitor_env() as env:
+            published = []
+            env.thread.publish = lambda *args: published.append(args)
+            domain = FakeDomain("uuid")
+            monitor.sdCache.domains["uuid"] = domain
+            env.thread.start()
+            env.wait_for_cycle()
+            self.assertEqual(published[-1], ("uuid", env.thread.getStatus()))
+
+            # Path status updates are published from the checker thread.
+            env.checker.complete(domain.getMonitoringPath(), FakeCheckResult())
+            status = env.thread.getStatus()
+            self.assertTrue(status.actual)
+            self.assertEqual(published[-1], ("uuid", status))
+
     @permutations([
         ("selftest", OSError),
         ("selftest", UnexpectedError),
@@ -831,6 +863,150 @@ class TestMonitorThreadStopping(VdsmTestCase):
         self.assertEqual(domain.state, SETUP)
 
 
+class TestMonitorThreadEngine(VdsmTestCase):
+
+    # Same flows as the tests above, but running the monitor cycles in
+    # engine workers.
+
+    def test_unknown_to_valid(self):
+        with monitor_env(engine=True) as env:
+            domain = FakeDomain("uuid")
+            monitor.sdCache.domains["uuid"] = domain
+            env.thread.start()
+            env.wait_for_cycle()
+            env.checker.complete(domain.getMonitoringPath(), FakeCheckResult())
+            env.wait_for_cycle()
+            status = env.thread.getStatus()
+            self.assertTrue(status.actual)
+            self.assertTrue(status.valid)
+            self.assertTrue(domain.acquired)
+
+    def test_setup_retry(self):
+        with monitor_env(engine=True) as env:
+            env.thread.start()
+            env.wait_for_cycle()
+            self.assertFalse(env.thread.getStatus().valid)
+            domain = FakeDomain("uuid")
+            monitor.sdCache.domains["uuid"] = domain
+            env.wait_for_cycle()
+            self.assertIn(domain.getMonitoringPath(), env.checker.checkers)
+
+    def test_stop(self):
+        with monitor_env(engine=True) as env:
+            domain = FakeDomain("uuid")
+            monitor.sdCache.domains["uuid"] = domain
+            env.thread.start()
+            env.wait_for_cycle()
+            env.checker.complete(domain.getMonitoringPath(), FakeCheckResult())
+            env.wait_for_cycle()
+        self.assertFalse(domain.acquired)
+        self.assertEqual(domain.state, TEARDOWN)
+        self.assertNotIn(domain.getMonitoringPath(), env.checker.checkers)
+
+    def test_stop_while_blocked(self):
+        with monitor_env(engine=True) as env:
+            domain = FakeDomain("uuid")
+            blocked = threading.Event()
+
+            def block():
+                blocked.set()
+                time.sleep(MONITOR_INTERVAL)
+
+            domain.selftest = block
+            monitor.sdCache.domains["uuid"] = domain
+            env.thread.start()
+            if not blocked.wait(CYCLE_TIMEOUT):
+                raise RuntimeError("Timeout waiting for calling selftest")
+
+        self.assertFalse(env.thread.getStatus().actual)
+        self.assertEqual(domain.state, TEARDOWN)
+
+    def test_blocked_domain_does_not_delay_others(self):
+        config = make_config([])
+        with MonkeyPatchScope([
+            (monitor, "sdCache", FakeStorageDomainCache()),
+            (monitor, 'config', config),
+        ]):
+            checker = FakeCheckService()
+            # Single worker, replaced quickly if blocked.
+            engine = monitor.MonitorEngine(1, 4, 0.1)
+            engine.start()
+            unblock = threading.Event()
+            try:
+                blocked = FakeDomain("blocked")
+                blocked.selftest = lambda: unblock.wait(CYCLE_TIMEOUT)
+                monitor.sdCache.domains["blocked"] = blocked
+                other = FakeDomain("other")
+                monitor.sdCache.domains["other"] = other
+
+                blocked_thread = monitor.MonitorThread(
+                    "blocked", "host_id", MONITOR_INTERVAL, FakeEvent(),
+                    checker, engine=engine)
+                other_thread = monitor.MonitorThread(
+                    "other", "host_id", MONITOR_INTERVAL, FakeEvent(),
+                    checker, engine=engine)
+                other_env = MonitorEnv(other_thread, None, checker)
+
+                blocked_thread.start()
+                other_thread.start()
+                try:
+                    other_env.wait_for_cycle()
+                    checker.complete(
+                        other.getMonitoringPath(), FakeCheckResult())
+                    other_env.wait_for_cycle()
+                    self.assertTrue(other_thread.getStatus().actual)
+                    self.assertFalse(blocked_thread.getStatus().actual)
+                finally:
+                    unblock.set()
+                    for thread in (blocked_thread, other_thread):
+                        thread.stop()
+                        thread.join()
+            finally:
+                engine.stop()
+
+    @MonkeyPatch(monitor, "DISPATCH_RETRY_DELAY", 0.01)
+    def test_retry_dispatch_when_queue_full(self):
+        engine = monitor.MonitorEngine(1, 1, CYCLE_TIMEOUT)
+        engine.start()
+        try:
+            called = threading.Event()
+            dispatch = engine.dispatch
+            failures = [exception.ResourceExhausted("Too many tasks")]
+
+            def fail_once(func):
+                if failures:
+                    raise failures.pop()
+                dispatch(func)
+
+            engine.dispatch = fail_once
+            engine.schedule(0, called.set)
+            self.assertTrue(called.wait(CYCLE_TIMEOUT))
+            self.assertEqual(failures, [])
+        finally:
+            engine.stop()
+
+    @MonkeyPatch(monitor, "DISPATCH_RETRY_DELAY", 0.01)
+    def test_stop_when_queue_full(self):
+        with monitor_env(engine=True) as env:
+            monitor.sdCache.domains["uuid"] = FakeDomain("uuid")
+            env.thread.start()
+            env.wait_for_cycle()
+
+            engine = env.thread.engine
+            dispatch = engine.dispatch
+            failures = [exception.ResourceExhausted("Too many tasks")]
+
+            def fail_once(func):
+                if failures:
+                    raise failures.pop()
+                dispatch(func)
+
+            engine.dispatch = fail_once
+            env.thread.stop()
+            self.assertTrue(env.thread._stopped.wait(CYCLE_TIMEOUT))
+            self.assertEqual(failures, [])
+
+
 @expandPermutations
 class TestStatus(VdsmTestCase):
 
@@ -946,3 +1122,99 @@ class TestDomainMonitor:
         assert mon.domains == []
         assert mon.poolDomains == []
         assert mon.getDomainsStatus() == []
+
+    def test_status_snapshot(self, monkeypatch):
+        monkeypatch.setattr(monitor, "MonitorThread", FakeMonitorThread)
+
+        mon = monitor.DomainMonitor(MONITOR_INTERVAL)
+        empty = mon.getStatusSnapshot()
+        assert empty.statuses == {}
+
+        # Starting to monitor publishes a new snapshot.
+        mon.startMonitoring("uuid", "host-id")
+        started = mon.getStatusSnapshot()
+        assert started.version > empty.version
+        assert list(started.statuses) == ["uuid"]
+
+        # Nothing changed, the same snapshot is returned.
+        assert mon.getStatusSnapshot() is started
+
+        # Monitor publishing a new status creates a new snapshot, without
+        # modifying the previous one.
+        old_status = started.statuses["uuid"]
+        new_status = monitor.Status(
+            monitor.PathStatus(), monitor.DomainStatus())
+        mon._monitors["uuid"].publish("uuid", new_status)
+        updated = mon.getStatusSnapshot()
+        assert updated.version > started.version
+        assert updated.statuses["uuid"] is new_status
+        assert started.statuses["uuid"] is old_status
+        assert mon.getDomainsStatus() == [("uuid", new_status)]
+
+        # Stopping to monitor removes the domain from the snapshot.
+        mon.stopMonitoring(["uuid"])
+        stopped = mon.getStatusSnapshot()
+        assert stopped.version > updated.version
+        assert stopped.statuses == {}
+
+    def test_ignore_status_of_unmonitored_domain(self, monkeypatch):
+        monkeypatch.setattr(monitor, "MonitorThread", FakeMonitorThread)
+
+        mon = monitor.DomainMonitor(MONITOR_INTERVAL)
+        mon.startMonitoring("uuid", "host-id")
+        publish = mon._monitors["uuid"].publish
+        mon.stopMonitoring(["uuid"])
+        stopped = mon.getStatusSnapshot()
+
+        # A late update from a stopped monitor is ignored.
+        publish("uuid", monitor.Status(
+            monitor.PathStatus(), monitor.DomainStatus()))
+        assert mon.getStatusSnapshot() is stopped
+
+    def test_many_domains(self, monkeypatch):
+        # Simulate a large setup monitored by a small number of workers.
+        domains = 200
+        workers = 4
+        max_workers = 8
+        monkeypatch.setattr(monitor, "sdCache", FakeStorageDomainCache())
+        monkeypatch.setattr(monitor, "config", make_config([
+            ("irs", "monitor_workers", str(workers)),
+            ("irs", "monitor_max_workers", str(max_workers)),
+        ]))
+        monkeypatch.setattr(monitor.check, "CheckService", FakeCheckService)
+
+        uuids = ["uuid-%03d" % i for i in range(domains)]
+        for sd_uuid in uuids:
+            monitor.sdCache.domains[sd_uuid] = FakeDomain(sd_uuid)
+
+        existing = set(threading.enumerate())
+        mon = monitor.DomainMonitor(MONITOR_INTERVAL)
+        try:
+            for sd_uuid in uuids:
+                mon.startMonitoring(sd_uuid, "host-id")
+
+            wait_for(lambda: len(mon._checker.checkers) == domains)
+
+            for path in list(mon._checker.checkers):
+                mon._checker.complete(path, FakeCheckResult())
+
+            wait_for(lambda: all(
+                status.actual and status.valid
+                for _, status in mon.getDomainsStatus()))
+
+            # Monitoring threads are the workers and the scheduler.
+            threads = [t for t in threading.enumerate()
+                       if t not in existing and t.name.startswith("monitor/")]
+            assert len(threads) <= max_workers + 1
+        finally:
+            mon.shutdown()
+
+        assert mon.domains == []
+
+
+def wait_for(predicate, timeout=CYCLE_TIMEOUT * 2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timeout waiting for %s" % predicate)
+        time.sleep(0.05)
@@ -21,6 +21,10 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import os
+import threading
+import time
+
 import pytest
 
 from vdsm.common import cmdutils
@@ -156,3 +160,145 @@ def test_scsi_id_fails(fake_scsi_id):
 
     scsi_serial = multipath.get_scsi_serial("fake_device")
     assert scsi_serial == ""
+
+
+@pytest.fixture
+def fake_maps(monkeypatch):
+    # Map guid to (map size, slaves sizes).
+    maps = {
+        "guid-1": (100, (100, 100)),
+        "guid-2": (100, (200, 200)),
+        "guid-3": (100, (200, 200)),
+        "guid-4": (100, ()),
+    }
+    sizes = {}
+    for guid, (map_size, slaves_sizes) in maps.items():
+        sizes["dm-" + guid] = map_size
+        for i, size in enumerate(slaves_sizes):
+            sizes["sd-{}-{}".format(guid, i)] = size
+
+    monkeypatch.setattr(
+        multipath, "getMPDevsIter",
+        lambda: (("dm-" + guid, guid) for guid in sorted(maps)))
+    monkeypatch.setattr(
+        multipath.devicemapper, "getDmId", lambda guid: "dm-" + guid)
+    monkeypatch.setattr(
+        multipath.devicemapper, "getSlaves",
+        lambda name: ["sd-{}-{}".format(name[3:], i)
+                      for i in range(len(maps[name[3:]][1]))])
+    monkeypatch.setattr(multipath, "getDeviceSize", lambda name: sizes[name])
+    return maps
+
+
+def test_resize_devices_batch(monkeypatch, fake_maps):
+    calls = []
+
+    def resize_maps(names):
+        calls.append(names)
+        return {"guid-3": "resize failed"}
+
+    monkeypatch.setattr(multipath, "resize_maps", resize_maps)
+
+    timings = multipath.resize_devices()
+
+    # Only maps with larger slaves resized, in one call.
+    assert calls == [["guid-2", "guid-3"]]
+    assert sorted(timings) == ["check", "resize"]
+
+
+def test_resize_devices_nothing_to_do(monkeypatch, fake_maps):
+    del fake_maps["guid-2"]
+    del fake_maps["guid-3"]
+
+    def resize_maps(names):
+        raise AssertionError("Unexpected call")
+
+    monkeypatch.setattr(multipath, "resize_maps", resize_maps)
+    multipath.resize_devices()
+
+
+@requires_root
+def test_resize_maps(monkeypatch):
+    def resize_map(name):
+        if name == "bad":
+            raise multipath.Error("resize failed")
+
+    monkeypatch.setattr(multipath, "resize_map", resize_map)
+
+    names = ["map-{}".format(i) for i in range(20)] + ["bad"]
+    assert multipath.resize_maps(names) == {"bad": "resize failed"}
+
+
+@pytest.fixture
+def fake_udev(tmpdir, monkeypatch):
+    sys_block = tmpdir.mkdir("block")
+    udev_data = tmpdir.mkdir("data")
+    monkeypatch.setattr(multipath, "SYS_BLOCK", str(sys_block))
+    monkeypatch.setattr(multipath, "UDEV_DATA", str(udev_data))
+    monkeypatch.setattr(multipath, "UDEV_POLL_INTERVAL", 0.01)
+
+    for i, name in enumerate(["sda", "sdb", "vda"]):
+        disk = sys_block.mkdir(name)
+        disk.join("dev").write("8:{}\n".format(i))
+        disk.join("size").write("2097152\n")
+
+    return udev_data
+
+
+def test_unprocessed_scsi_disks(fake_udev):
+    fake_udev.join("b8:0").write("")
+    # Non SCSI disks are ignored.
+    assert multipath._unprocessed_scsi_disks() == {"sdb"}
+
+
+def test_wait_for_udev(fake_udev):
+    fake_udev.join("b8:0").write("")
+    fake_udev.join("b8:1").write("")
+    multipath._wait_for_udev(time.monotonic() + 10)
+
+
+def test_wait_for_udev_timeout(fake_udev):
+    start = time.monotonic()
+    multipath._wait_for_udev(start + 0.1)
+    assert time.monotonic() - start < 1
+
+
+def test_resized_scsi_disks(fake_udev):
+    fake_udev.join("b8:0").write("")
+    fake_udev.join("b8:1").write("")
+    disks = multipath._scsi_disks()
+    assert sorted(disks) == ["sda", "sdb"]
+
+    sys_block = fake_udev.dirpath("block")
+    sys_block.join("sda", "size").write("4194304\n")
+    mtime = disks["sda"][1]
+    assert multipath._resized_scsi_disks(disks) == {"sda": mtime}
+
+    # udev processed the change event.
+    os.utime(str(fake_udev.join("b8:0")), ns=(mtime + 10**9, mtime + 10**9))
+    assert multipath._resized_scsi_disks(disks) == {}
+
+
+def test_wait_for_udev_resized(fake_udev):
+    fake_udev.join("b8:0").write("")
+    fake_udev.join("b8:1").write("")
+    disks = multipath._scsi_disks()
+    fake_udev.dirpath("block").join("sda", "size").write("4194304\n")
+    mtime = disks["sda"][1]
+
+    def process_change_event():
+        time.sleep(0.2)
+        os.utime(str(fake_udev.join("b8:0")),
+                 ns=(mtime + 10**9, mtime + 10**9))
+
+    t = threading.Thread(target=process_change_event)
+    t.start()
+    try:
+        start = time.monotonic()
+        multipath._wait_for_udev(start + 10, disks)
+        elapsed = time.monotonic() - start
+    finally:
+        t.join()
+
+    # Waited for the change event.
+    assert 0.2 <= elapsed < 5
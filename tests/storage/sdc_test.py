@@ -0,0 +1,269 @@
+#
+# Copyright 2021 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import os
+
+import pytest
+
+from vdsm.storage import blockSD
+from vdsm.storage import constants as sc
+from vdsm.storage import exception as se
+from vdsm.storage import fileSD
+from vdsm.storage import glusterSD
+from vdsm.storage import localFsSD
+from vdsm.storage import lvm
+from vdsm.storage import mount
+from vdsm.storage import multipath
+from vdsm.storage import nfsSD
+from vdsm.storage import sdc
+
+BLOCK_UUID = "11111111-1111-1111-1111-111111111111"
+NFS_UUID = "22222222-2222-2222-2222-222222222222"
+GLUSTER_UUID = "33333333-3333-3333-3333-333333333333"
+LOCAL_UUID = "44444444-4444-4444-4444-444444444444"
+UNMOUNTED_UUID = "55555555-5555-5555-5555-555555555555"
+
+NFS_MOUNT = os.path.join(sc.REPO_MOUNT_DIR, "server:_nfs")
+GLUSTER_MOUNT = os.path.join(sc.REPO_MOUNT_DIR, "glusterSD", "server:_vol")
+LOCAL_MOUNT = os.path.join(sc.REPO_MOUNT_DIR, "_data_local")
+UNMOUNTED_MOUNT = os.path.join(sc.REPO_MOUNT_DIR, "server:_gone")
+
+
+class FakeVG(object):
+
+    def __init__(self, name, tags=()):
+        self.name = name
+        self.tags = tags
+
+
+class FakeDomain(object):
+
+    def __init__(self, path):
+        self.path = path
+
+
+class BlockDomain(FakeDomain):
+    pass
+
+
+class NfsDomain(FakeDomain):
+    pass
+
+
+class GlusterDomain(FakeDomain):
+    pass
+
+
+class LocalDomain(FakeDomain):
+    pass
+
+
+class FakeStorage(object):
+
+    def __init__(self):
+        self.vgs = [
+            FakeVG(BLOCK_UUID, tags=(blockSD.STORAGE_DOMAIN_TAG,)),
+            FakeVG("not-a-domain"),
+        ]
+        self.domains = [
+            (NFS_UUID, os.path.join(NFS_MOUNT, NFS_UUID)),
+            (GLUSTER_UUID, os.path.join(GLUSTER_MOUNT, GLUSTER_UUID)),
+            (LOCAL_UUID, os.path.join(LOCAL_MOUNT, LOCAL_UUID)),
+            (UNMOUNTED_UUID, os.path.join(UNMOUNTED_MOUNT, UNMOUNTED_UUID)),
+        ]
+        self.mounts = [NFS_MOUNT, GLUSTER_MOUNT]
+        self.vg_scans = 0
+        self.file_scans = 0
+        self.lookups = []
+        self.vgs_error = None
+
+    def getAllVGs(self):
+        self.vg_scans += 1
+        if self.vgs_error:
+            raise self.vgs_error
+        return self.vgs
+
+    def findDomain(self, sd_uuid):
+        self.lookups.append(sd_uuid)
+        if any(vg.name == sd_uuid and vg.tags for vg in self.vgs):
+            return BlockDomain(sd_uuid)
+        for uuid, path in self.domains:
+            if uuid == sd_uuid and os.path.dirname(path) in self.mounts:
+                return NfsDomain(path)
+        raise se.StorageDomainDoesNotExist(sd_uuid)
+
+    def findNothing(self, sd_uuid):
+        raise se.StorageDomainDoesNotExist(sd_uuid)
+
+    def scanDomains(self, pattern="*"):
+        assert pattern == "*"
+        self.file_scans += 1
+        return iter(self.domains)
+
+    def iterMounts(self):
+        for target in self.mounts:
+            yield mount.Mount("server:/export", target)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(lvm, "getAllVGs", storage.getAllVGs)
+    monkeypatch.setattr(lvm, "invalidateCache", lambda: None)
+    monkeypatch.setattr(lvm, "invalidateVG", lambda *a, **kw: None)
+    monkeypatch.setattr(multipath, "rescan", lambda: None)
+    monkeypatch.setattr(multipath, "resize_devices", lambda: None)
+    monkeypatch.setattr(fileSD, "scanDomains", storage.scanDomains)
+    monkeypatch.setattr(mount, "iterMounts", storage.iterMounts)
+    monkeypatch.setattr(blockSD, "BlockStorageDomain", BlockDomain)
+    monkeypatch.setattr(nfsSD, "NfsStorageDomain", NfsDomain)
+    monkeypatch.setattr(glusterSD, "GlusterStorageDomain", GlusterDomain)
+    monkeypatch.setattr(localFsSD, "LocalFsStorageDomain", LocalDomain)
+    monkeypatch.setattr(blockSD, "findDomain", storage.findDomain)
+    monkeypatch.setattr(glusterSD, "findDomain", storage.findNothing)
+    monkeypatch.setattr(localFsSD, "findDomain", storage.findNothing)
+    monkeypatch.setattr(nfsSD, "findDomain", storage.findNothing)
+    return storage
+
+
+@pytest.mark.parametrize("sd_uuid,domain_class,path", [
+    (BLOCK_UUID, BlockDomain, BLOCK_UUID),
+    (NFS_UUID, NfsDomain, os.path.join(NFS_MOUNT, NFS_UUID)),
+    (GLUSTER_UUID, GlusterDomain, os.path.join(GLUSTER_MOUNT, GLUSTER_UUID)),
+    (LOCAL_UUID, LocalDomain, os.path.join(LOCAL_MOUNT, LOCAL_UUID)),
+])
+def test_produce(storage, sd_uuid, domain_class, path):
+    cache = sdc.StorageDomainCache()
+    dom = cache.produce(sd_uuid).getRealDomain()
+    assert type(dom) is domain_class
+    assert dom.path == path
+
+
+@pytest.mark.parametrize("sd_uuid", [
+    # Not a storage domain VG.
+    "not-a-domain",
+    # File domain which is not mounted.
+    UNMOUNTED_UUID,
+    # Not found anywhere.
+    "66666666-6666-6666-6666-666666666666",
+])
+def test_produce_missing(storage, sd_uuid):
+    cache = sdc.StorageDomainCache()
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.produce(sd_uuid)
+
+
+def test_scan_once_per_epoch(storage):
+    cache = sdc.StorageDomainCache()
+    for sd_uuid in (BLOCK_UUID, NFS_UUID, GLUSTER_UUID, LOCAL_UUID):
+        cache.produce(sd_uuid)
+
+    # Missing domains use the same scan, and a lookup of the missing domain.
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.produce(UNMOUNTED_UUID)
+
+    assert storage.vg_scans == 1
+    assert storage.file_scans == 1
+    assert storage.lookups == [UNMOUNTED_UUID]
+
+
+def test_lookup_missing_domain(storage):
+    cache = sdc.StorageDomainCache()
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.produce(UNMOUNTED_UUID)
+
+    # The domain becomes available without invalidating the storage.
+    storage.mounts.append(UNMOUNTED_MOUNT)
+
+    dom = cache.produce(UNMOUNTED_UUID).getRealDomain()
+    assert type(dom) is NfsDomain
+    assert storage.file_scans == 1
+
+
+def test_failed_scan_not_reused(storage):
+    storage.vgs_error = RuntimeError("lvm failed")
+    cache = sdc.StorageDomainCache()
+    cache.produce(NFS_UUID)
+    assert storage.vg_scans == 1
+
+    storage.vgs_error = None
+    cache.produce(LOCAL_UUID)
+    assert storage.vg_scans == 2
+
+    cache.produce(BLOCK_UUID)
+    assert storage.vg_scans == 2
+
+
+def test_rescan_after_invalidate(storage):
+    cache = sdc.StorageDomainCache()
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.produce(UNMOUNTED_UUID)
+
+    # Mounting the domain is followed by invalidating the storage.
+    storage.mounts.append(UNMOUNTED_MOUNT)
+    cache.invalidateStorage()
+
+    dom = cache.produce(UNMOUNTED_UUID).getRealDomain()
+    assert type(dom) is NfsDomain
+    assert storage.file_scans == 2
+
+
+def test_block_domain_found_first(storage):
+    storage.domains.append((BLOCK_UUID, os.path.join(NFS_MOUNT, BLOCK_UUID)))
+    cache = sdc.StorageDomainCache()
+    dom = cache.produce(BLOCK_UUID).getRealDomain()
+    assert type(dom) is BlockDomain
+
+
+def test_refresh_domain(storage):
+    cache = sdc.StorageDomainCache()
+    old = cache.produce(NFS_UUID).getRealDomain()
+
+    # Refreshing a domain does not scan all domains.
+    calls = []
+
+    def findDomain(sd_uuid):
+        calls.append(sd_uuid)
+        return NfsDomain(os.path.join(NFS_MOUNT, sd_uuid))
+
+    cache.knownSDs[NFS_UUID] = findDomain
+    new = cache.refreshDomain(NFS_UUID)
+
+    assert calls == [NFS_UUID]
+    assert new is not old
+    assert cache.produce(NFS_UUID).getRealDomain() is new
+    assert storage.vg_scans == 1
+    assert storage.file_scans == 1
+
+
+def test_refresh_missing_domain(storage):
+    cache = sdc.StorageDomainCache()
+    cache.produce(NFS_UUID)
+
+    def findDomain(sd_uuid):
+        raise se.StorageDomainDoesNotExist(sd_uuid)
+
+    cache.knownSDs[NFS_UUID] = findDomain
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.refreshDomain(NFS_UUID)
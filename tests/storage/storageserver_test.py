@@ -18,10 +18,15 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
+import threading
+import time
+
 import pytest
 
+from vdsm.storage import exception as se
 from vdsm.storage import sd
 from vdsm.storage import storageServer
+from vdsm.storage.mount import MountError
 from vdsm.storage.storageServer import GlusterFSConnection
 from vdsm.storage.storageServer import IscsiConnection
 from vdsm.storage.storageServer import MountConnection
@@ -322,3 +327,122 @@ def test_prepare_connection_without_initiator_name():
     # Unset keys raise KeyError
     with pytest.raises(KeyError):
         con.iface.initiatorName
+
+
+class FakeConnection(object):
+
+    def __init__(self, id, error=None, block=None, delay=0):
+        self.id = id
+        self.error = error
+        self.block = block
+        self.delay = delay
+        self.connected = 0
+
+    def connect(self):
+        self.connected += 1
+        if self.block:
+            self.block.wait()
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+
+    def __repr__(self):
+        return "<FakeConnection id={}>".format(self.id)
+
+
+class TestConnectConcurrently:
+
+    def test_results_order(self):
+        cons = [
+            FakeConnection("a", delay=0.2),
+            FakeConnection("b", error=MountError(["mount"], 32, b"", b"")),
+            FakeConnection("c"),
+        ]
+        results = MountConnection._connect_concurrently(
+            cons, max_workers=3, timeout=10, name="test")
+        assert results == [
+            (cons[0], 0),
+            (cons[1], se.MountError.code),
+            (cons[2], 0),
+        ]
+
+    @pytest.mark.parametrize("max_workers", [1, 2, 10])
+    def test_max_workers(self, monkeypatch, max_workers):
+        lock = threading.Lock()
+        running = []
+        max_running = [0]
+
+        class Connection(FakeConnection):
+            def connect(self):
+                with lock:
+                    running.append(self)
+                    max_running[0] = max(max_running[0], len(running))
+                time.sleep(0.05)
+                with lock:
+                    running.remove(self)
+
+        cons = [Connection(str(i)) for i in range(6)]
+        results = MountConnection._connect_concurrently(
+            cons, max_workers=max_workers, timeout=10, name="test")
+
+        assert [status for con, status in results] == [0] * 6
+        assert max_running[0] == min(len(cons), max_workers)
+
+    def test_timeout(self):
+        block = threading.Event()
+        cons = [
+            FakeConnection("a", block=block),
+            FakeConnection("b", delay=0.05),
+            FakeConnection("c", delay=0.05),
+        ]
+        try:
+            start = time.monotonic()
+            # A hung connection does not delay other connections, even when
+            # using one worker.
+            results = MountConnection._connect_concurrently(
+                cons, max_workers=1, timeout=0.5, name="test")
+            elapsed = time.monotonic() - start
+        finally:
+            block.set()
+
+        assert results == [
+            (cons[0], se.MountError.code),
+            (cons[1], 0),
+            (cons[2], 0),
+        ]
+        assert elapsed < 2
+
+    def test_timeout_still_connecting(self):
+        block = threading.Event()
+        con = FakeConnection("a", block=block)
+        try:
+            results = MountConnection._connect_concurrently(
+                [con], max_workers=1, timeout=0.1, name="test")
+            assert results == [(con, se.MountError.code)]
+
+            # The first connect is still running, so we don't connect again.
+            results = MountConnection._connect_concurrently(
+                [con], max_workers=1, timeout=0.1, name="test")
+            assert results == [(con, se.MountError.code)]
+            assert con.connected == 1
+        finally:
+            block.set()
+
+        # When the first connect completes, we can connect again.
+        con.block = None
+        deadline = time.monotonic() + 5
+        while con in MountConnection._connecting:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        results = MountConnection._connect_concurrently(
+            [con], max_workers=1, timeout=10, name="test")
+        assert results == [(con, 0)]
+        assert con.connected == 2
+
+    def test_equal_connections(self):
+        con = FakeConnection("a")
+        results = MountConnection._connect_concurrently(
+            [con, con], max_workers=2, timeout=10, name="test")
+        assert results == [(con, 0), (con, 0)]
+        assert con.connected == 1
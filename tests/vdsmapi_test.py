@@ -290,7 +290,13 @@ class DataVerificationTests(TestCaseBase):
                u"vmActive": 0,
                u"v2vJobs": {},
                u"cpuSysVdsmd": u"0.53",
-               u"multipathHealth": {}}
+               u"multipathHealth": {},
+               u"samplingStats": {
+                   u"sampling.vms.skipped": {
+                       u"count": 2,
+                       u"sum": 1.0,
+                       u"max": 1.0,
+                       u"buckets": {u"0": 1, u"1": 2, u"inf": 2}}}}
 
         _schema.verify_retval(vdsmapi.MethodRep('Host', 'getStats'), ret)
 
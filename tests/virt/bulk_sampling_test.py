@@ -175,7 +175,7 @@ class FakeStatsCache(object):
         self.expected = 1
         self._count = 0
 
-    def put(self, bulk_stats, timestamp):
+    def put(self, bulk_stats, timestamp, stats_types=None):
         self.data.append(CacheSample(bulk_stats, timestamp))
         self._count += 1
         if self._count >= self.expected:
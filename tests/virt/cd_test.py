@@ -915,3 +915,4 @@ class ClientIF(clientIF.clientIF):
         self.irs = fake.IRS()
         self.channelListener = None
         self.vmContainer = {}
+        self._prepared_images = {}
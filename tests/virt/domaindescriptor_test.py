@@ -24,7 +24,8 @@ from __future__ import division
 
 from vdsm.common import xmlutils
 from vdsm.virt.domain_descriptor import (DomainDescriptor,
-                                         MutableDomainDescriptor)
+                                         MutableDomainDescriptor,
+                                         XmlSource)
 from testlib import VdsmTestCase, XMLTestCase, permutations, expandPermutations
 
 
@@ -287,3 +288,68 @@ class DomainDescriptorTests(XMLTestCase):
         desc = DomainDescriptor(NO_PINNED_CPUS)
         pinning = desc.pinned_cpus
         assert pinning == {}
+
+
+ALIASED_DEVICES = """
+<domain>
+    <uuid>xyz</uuid>
+    <metadata>
+        <foo>bar</foo>
+    </metadata>
+    <devices>
+        <disk device="disk"><alias name="ua-disk"/></disk>
+        <interface type="bridge"><alias name="ua-nic"/></interface>
+    </devices>
+</domain>
+"""
+
+
+class IncrementalUpdateTests(XMLTestCase):
+
+    def test_device_removed(self):
+        desc = DomainDescriptor(ALIASED_DEVICES)
+        # Compute the device hashes, so only the changes are hashed.
+        desc.devices_hash
+        desc2 = desc.with_device_removed('ua-nic')
+        expected = DomainDescriptor(ALIASED_DEVICES.replace(
+            '<interface type="bridge"><alias name="ua-nic"/></interface>',
+            ''))
+        self.assertXMLEqual(desc2.xml, expected.xml)
+        assert desc2.devices_hash == expected.devices_hash
+        assert len(list(desc2.get_device_elements('interface'))) == 0
+        # The original descriptor is not modified.
+        assert len(list(desc.get_device_elements('interface'))) == 1
+        self.assertXMLEqual(desc.xml, ALIASED_DEVICES)
+
+    def test_missing_device(self):
+        desc = DomainDescriptor(ALIASED_DEVICES)
+        with self.assertRaises(LookupError):
+            desc.with_device_removed('ua-missing')
+        with self.assertRaises(LookupError):
+            desc.find_device('ua-missing')
+
+    def test_metadata(self):
+        desc = DomainDescriptor(ALIASED_DEVICES)
+        md_elem = xmlutils.fromstring('<foo>baz</foo>')
+        desc2 = desc.with_metadata(md_elem)
+        self.assertXMLEqual(
+            desc2.xml, ALIASED_DEVICES.replace('>bar<', '>baz<'))
+        assert desc2.devices_hash == desc.devices_hash
+        self.assertXMLEqual(desc.xml, ALIASED_DEVICES)
+
+    def test_generation(self):
+        desc = DomainDescriptor(ALIASED_DEVICES, generation=3)
+        assert desc.with_device_removed('ua-nic').generation == 3
+        desc2 = desc.with_device_removed('ua-nic', generation=4)
+        assert desc2.generation == 4
+
+    def test_initial_hash(self):
+        desc = DomainDescriptor(ALIASED_DEVICES, xml_source=XmlSource.INITIAL)
+        assert desc.with_device_removed('ua-nic').devices_hash is None
+
+    def test_hash_ignores_formatting(self):
+        desc1 = DomainDescriptor(SOME_DEVICES)
+        desc2 = DomainDescriptor(
+            '<domain><uuid>xyz</uuid><devices><device name="foo"/>'
+            '<device name="bar"/></devices></domain>')
+        assert desc1.devices_hash == desc2.devices_hash
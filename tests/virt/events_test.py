@@ -21,10 +21,18 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import threading
+
+import libvirt
+import pytest
+
 from vdsm.virt import events
 
 from testlib import VdsmTestCase as TestCaseBase
 
+LIFECYCLE = libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE
+REBOOT = libvirt.VIR_DOMAIN_EVENT_ID_REBOOT
+
 
 class TestEventName(TestCaseBase):
 
@@ -37,3 +45,89 @@ class TestEventName(TestCaseBase):
         # given unknown events, it must still return a meaningful string)
         assert UNKNOWN_FAKE_EVENT_ID not in events.LIBVIRT_EVENTS
         assert events.event_name(UNKNOWN_FAKE_EVENT_ID)
+
+
+@pytest.fixture
+def dispatcher():
+    d = events.Dispatcher("test/events", 4)
+    d.start()
+    yield d
+    d.stop()
+
+
+def wait_for(dispatcher, event_id, handled, timeout=5):
+    done = threading.Event()
+    dispatcher.dispatch("wait-%d" % handled, event_id, done.set)
+    assert done.wait(timeout)
+    # The waiter event itself is counted after it was handled.
+    for _ in range(100):
+        stats = dispatcher.stats()[events.event_name(event_id)]
+        if stats["handled"] >= handled:
+            return stats
+        threading.Event().wait(0.05)
+    raise AssertionError("Timeout waiting for %d events" % handled)
+
+
+def test_dispatch_per_vm_ordered(dispatcher):
+    handled = {"vm1": [], "vm2": []}
+    done = threading.Event()
+
+    def handler(vm_id, n):
+        handled[vm_id].append(n)
+        if len(handled["vm1"]) == len(handled["vm2"]) == 50:
+            done.set()
+
+    for n in range(50):
+        for vm_id in ("vm1", "vm2"):
+            dispatcher.dispatch(
+                vm_id, LIFECYCLE, lambda vm_id=vm_id, n=n: handler(vm_id, n))
+
+    assert done.wait(5)
+    assert handled["vm1"] == list(range(50))
+    assert handled["vm2"] == list(range(50))
+
+
+def test_dispatch_slow_vm_does_not_block_others(dispatcher):
+    release = threading.Event()
+    other = threading.Event()
+
+    dispatcher.dispatch("slow", LIFECYCLE, release.wait)
+    dispatcher.dispatch("fast", LIFECYCLE, other.set)
+    try:
+        assert other.wait(5)
+    finally:
+        release.set()
+
+
+def test_dispatch_handler_error(dispatcher):
+    def fail():
+        raise RuntimeError("handler failed")
+
+    done = threading.Event()
+    dispatcher.dispatch("vm1", LIFECYCLE, fail)
+    dispatcher.dispatch("vm1", LIFECYCLE, done.set)
+    assert done.wait(5)
+
+
+def test_stats(dispatcher):
+    release = threading.Event()
+    dispatcher.dispatch("vm1", REBOOT, release.wait)
+    dispatcher.dispatch("vm1", REBOOT, lambda: None)
+    dispatcher.dispatch("vm1", REBOOT, lambda: None)
+    release.set()
+
+    stats = wait_for(dispatcher, REBOOT, 4)
+    assert stats["queued"] == 4
+    assert stats["handled"] == 4
+    assert stats["pending"] == 0
+    assert stats["max_depth"] == 3
+    assert stats["max_latency"] >= stats["avg_latency"] >= 0
+    assert stats["max_time"] >= stats["avg_time"] >= 0
+
+
+def test_dispatch_not_running():
+    d = events.Dispatcher("test/events", 1)
+    handled = []
+    d.dispatch("vm1", LIFECYCLE, lambda: handled.append(1))
+    assert handled == []
+    assert d.stats() == {}
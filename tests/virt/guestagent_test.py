@@ -217,17 +217,39 @@ class TestGuestIF(TestCaseBase):
         ]):
             guest_info = fake_guest_agent.getGuestInfo()
             for k in _OUTPUTS[0]:
-                value = guest_info[k]
-                if isinstance(value, list):
-                    value.append('modified')
-                elif isinstance(value, dict):
-                    value['modified'] = 'modified'
-                else:
-                    value = 'modified'
-                guest_info[k] = value
+                guest_info[k] = 'modified'
+            guest_info = fake_guest_agent.getGuestInfo()
+            for (k, v) in six.iteritems(_OUTPUTS[0]):
+                assert guest_info[k] == v
+
+    def test_guestinfo_snapshot(self):
+        fake_guest_agent = guestagent.GuestAgent(None, None, self.log,
+                                                 lambda: None, lambda: None)
+        fake_guest_agent._handleMessage(_MSG_TYPES[0], _INPUTS[0])
+        with MonkeyPatchScope([
+                (fake_guest_agent, 'isResponsive', lambda: True)
+        ]):
             guest_info = fake_guest_agent.getGuestInfo()
+            fake_guest_agent._handleMessage(
+                'heartbeat',
+                {'free-ram': 0, 'memory-stat': {'mem_total': 42}})
+            # New data does not change info returned earlier.
             for (k, v) in six.iteritems(_OUTPUTS[0]):
                 assert guest_info[k] == v
+            guest_info = fake_guest_agent.getGuestInfo()
+            assert guest_info['memoryStats']['mem_total'] == '42'
+
+    def test_guestinfo_qga_snapshot(self):
+        qga_info = {'diskMapping': {'serial': {'name': '/dev/vda'}},
+                    'appsList': ('qemu-guest-agent-1.0',)}
+        fake_guest_agent = guestagent.GuestAgent(
+            None, None, self.log, lambda: None, lambda: qga_info)
+        guest_info = fake_guest_agent.getGuestInfo()
+        assert guest_info['appsList'] == ('qemu-guest-agent-1.0',)
+        assert 'diskMapping' not in guest_info
+        # The QEMU-GA snapshot is not modified.
+        assert 'diskMapping' in qga_info
+        assert 'appsList' in qga_info
 
 
 class TestGuestIFHandleData(TestCaseBase):
@@ -179,6 +179,7 @@ class RunningVM(Vm):
         self.log = logging.getLogger()
         self.cif = fake.ClientIF()
         self._domain = DomainDescriptor(config.xmls["00-before.xml"])
+        self._domain_generation = 0
         self.id = self._domain.id
         self._md_desc = metadata.Descriptor.from_xml(
             config.xmls["00-before.xml"])
@@ -532,6 +532,104 @@ class DescriptorTests(XMLTestCase):
         assert list(self.md_desc.all_devices(type='fancydev')) == \
             [{'mode': 1}, {'mode': 2}]
 
+    def test_flush_unchanged(self):
+        dom = FakeDomain.with_metadata(
+            u'<vm><foobar type="int">42</foobar></vm>')
+        self.md_desc.load(dom)
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 42
+        with self.md_desc.device(id='alias0') as dev:
+            assert dev == {}
+        dom.xml.clear()
+
+        assert not self.md_desc.dirty
+        assert not self.md_desc.flush(dom)
+        assert dom.xml == {}
+
+    def test_flush_changed(self):
+        dom = FakeDomain.with_metadata(
+            u'<vm><foobar type="int">21</foobar></vm>')
+        self.md_desc.load(dom)
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 42
+        with self.md_desc.device(id='alias0') as dev:
+            dev['mode'] = 1
+
+        assert self.md_desc.dirty
+        assert self.md_desc.flush(dom)
+        assert not self.md_desc.dirty
+        self.assertXMLEqual(
+            dom.xml.get(xmlconstants.METADATA_VM_VDSM_URI),
+            u'''<vm>
+              <foobar type="int">42</foobar>
+              <device id="alias0">
+                <mode type="int">1</mode>
+              </device>
+            </vm>'''
+        )
+        dom.xml.clear()
+        assert not self.md_desc.flush(dom)
+        assert dom.xml == {}
+
+    def test_flush_error(self):
+        class BrokenDomain(FakeDomain):
+            def setMetadata(self, *args):
+                raise libvirt.libvirtError("no metadata for you")
+
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 42
+        with pytest.raises(libvirt.libvirtError):
+            self.md_desc.flush(BrokenDomain())
+
+        # The changes will be written by the next flush.
+        assert self.md_desc.dirty
+        dom = FakeDomain()
+        assert self.md_desc.flush(dom)
+        self.assertXMLEqual(
+            dom.xml.get(xmlconstants.METADATA_VM_VDSM_URI),
+            u'<vm><foobar type="int">42</foobar></vm>'
+        )
+
+    def test_values_view(self):
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 21
+        view = self.md_desc.values_view()
+        with pytest.raises(TypeError):
+            view['foobar'] = 42
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 42
+        # The view is a snapshot.
+        assert view == {'foobar': 21}
+        assert self.md_desc.values_view() == {'foobar': 42}
+
+    def test_build_changed_sections_only(self):
+        dom_xml = u'''<vm>
+            <foobar type="int">42</foobar>
+            <device id='alias0'>
+                <mode type="int">1</mode>
+            </device>
+            <device id='alias1'>
+                <mode type="int">2</mode>
+            </device>
+        </vm>'''
+        dom = FakeDomain.with_metadata(dom_xml)
+        self.md_desc.load(dom)
+        old = list(self.md_desc.to_tree())
+        with self.md_desc.device(id='alias1') as dev:
+            dev['mode'] = 3
+        new = list(self.md_desc.to_tree())
+
+        assert new[0] is old[0]
+        assert new[1] is old[1]
+        assert new[2] is not old[2]
+        self.assertXMLEqual(
+            xmlutils.tostring(new[2]),
+            u'''<ovirt-vm:device xmlns:ovirt-vm="http://ovirt.org/vm/1.0"
+                id="alias1">
+              <ovirt-vm:mode type="int">3</ovirt-vm:mode>
+            </ovirt-vm:device>'''
+        )
+
     def test_device_from_xml_tree(self):
         test_xml = u'''<?xml version="1.0" encoding="utf-8"?>
 <domain type="kvm" xmlns:ovirt-vm="http://ovirt.org/vm/1.0">
@@ -0,0 +1,219 @@
+#
+# Copyright 2022 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+
+import pytest
+
+from vdsm.common.units import MiB, GiB
+from vdsm.virt import migration_bandwidth as mbw
+
+log = logging.getLogger("test")
+
+
+def test_allocate_empty():
+    assert mbw.allocate(100, {}) == {}
+
+
+def test_allocate_equal_completion():
+    demands = {
+        "small": mbw.Demand(1 * GiB, 10 * MiB),
+        "large": mbw.Demand(3 * GiB, 10 * MiB),
+    }
+    bandwidth = mbw.allocate(100, demands)
+
+    # 80 MiB/s spare bandwidth, split 1:3.
+    assert bandwidth == {"small": 30, "large": 70}
+    small = demands["small"].data_remaining / (20 * MiB)
+    large = demands["large"].data_remaining / (60 * MiB)
+    assert small == large
+
+
+def test_allocate_cannot_converge():
+    demands = {
+        "a": mbw.Demand(1 * GiB, 80 * MiB),
+        "b": mbw.Demand(3 * GiB, 80 * MiB),
+    }
+    assert mbw.allocate(100, demands) == {"a": 50, "b": 50}
+
+
+def test_allocate_minimum():
+    demands = {
+        "done": mbw.Demand(0, 0),
+        "busy": mbw.Demand(8 * GiB, 0),
+    }
+    bandwidth = mbw.allocate(100, demands)
+    assert bandwidth == {"done": mbw.MIN_BANDWIDTH, "busy": 100}
+
+
+class FakeMigration(object):
+
+    def __init__(self):
+        self.speeds = []
+
+    def set_speed(self, bandwidth):
+        self.speeds.append(bandwidth)
+
+
+def test_scheduler_redistribute():
+    scheduler = mbw.Scheduler()
+    a = FakeMigration()
+    b = FakeMigration()
+    scheduler.register("a", 50, a.set_speed)
+    scheduler.register("b", 50, b.set_speed)
+
+    # Without progress, migrations keep their limit.
+    assert scheduler.bandwidth("a") == 50
+    assert scheduler.bandwidth("b") == 50
+
+    scheduler.update("a", 1 * GiB, 0)
+    # Only "a" progress is known, it cannot use "b" bandwidth.
+    assert scheduler.bandwidth("a") == 50
+    assert a.speeds == []
+
+    scheduler.update("b", 3 * GiB, 0)
+    assert scheduler.bandwidth("a") == 25
+    assert scheduler.bandwidth("b") == 75
+    assert a.speeds == [25]
+    assert b.speeds == [75]
+
+    # The bandwidth of a completed migration is given to the others.
+    scheduler.unregister("a")
+    assert scheduler.bandwidth("b") == 100
+    assert b.speeds == [75, 100]
+
+
+def test_scheduler_small_changes_ignored():
+    scheduler = mbw.Scheduler()
+    a = FakeMigration()
+    b = FakeMigration()
+    scheduler.register("a", 50, a.set_speed)
+    scheduler.register("b", 50, b.set_speed)
+    scheduler.update("a", 1000 * MiB, 0)
+    scheduler.update("b", 1040 * MiB, 0)
+    assert a.speeds == []
+    assert b.speeds == []
+
+
+def test_scheduler_set_limit():
+    scheduler = mbw.Scheduler()
+    a = FakeMigration()
+    b = FakeMigration()
+    scheduler.register("a", 50, a.set_speed)
+    scheduler.register("b", 50, b.set_speed)
+    scheduler.update("a", 1 * GiB, 0)
+    scheduler.update("b", 1 * GiB, 0)
+
+    # Lowering a limit lowers the total bandwidth.
+    scheduler.set_limit("a", 10)
+    assert scheduler.bandwidth("a") == 30
+    assert scheduler.bandwidth("b") == 30
+
+
+def test_scheduler_set_speed_error():
+    def fail(bandwidth):
+        raise RuntimeError("no speed for you")
+
+    scheduler = mbw.Scheduler()
+    scheduler.register("a", 50, fail)
+    scheduler.register("b", 50, fail)
+    scheduler.update("a", 1 * GiB, 0)
+    scheduler.update("b", 3 * GiB, 0)
+    assert scheduler.bandwidth("b") == 75
+
+
+# Simulation of host evacuation.
+
+# Migration completes when remaining data is small enough to be sent
+# within the allowed downtime.
+DONE_THRESHOLD = 64 * MiB
+
+# Simulation step, in seconds.
+STEP = 1
+
+
+class SimulatedMigration(object):
+
+    def __init__(self, name, memory, dirty_rate):
+        self.name = name
+        self.remaining = memory
+        self.dirty_rate = dirty_rate
+        self.bandwidth = 0
+        self.completed = None
+
+    def set_speed(self, bandwidth):
+        self.bandwidth = bandwidth
+
+    def step(self, now):
+        sent = self.bandwidth * MiB * STEP
+        self.remaining = max(
+            0, self.remaining - sent + self.dirty_rate * STEP)
+        if self.remaining <= DONE_THRESHOLD:
+            self.completed = now
+
+
+def evacuate(vms, link, scheduler=None):
+    """
+    Migrate all vms concurrently, using link MiB/s split evenly by Engine.
+    Returns the time when the last migration completed.
+    """
+    limit = link // len(vms)
+    for vm in vms:
+        vm.set_speed(limit)
+        if scheduler:
+            scheduler.register(vm.name, limit, vm.set_speed)
+
+    now = 0
+    running = list(vms)
+    while running:
+        assert now < 24 * 3600, "Migrations do not converge"
+        now += STEP
+        for vm in running:
+            vm.step(now)
+            if scheduler:
+                if vm.completed:
+                    scheduler.unregister(vm.name)
+                else:
+                    scheduler.update(vm.name, vm.remaining, vm.dirty_rate)
+        running = [vm for vm in running if vm.completed is None]
+
+    return max(vm.completed for vm in vms)
+
+
+def evacuation_vms():
+    return [
+        SimulatedMigration("small-idle", 1 * GiB, 1 * MiB),
+        SimulatedMigration("small-busy", 2 * GiB, 10 * MiB),
+        SimulatedMigration("large-idle", 16 * GiB, 2 * MiB),
+        SimulatedMigration("large-busy", 32 * GiB, 20 * MiB),
+    ]
+
+
+@pytest.mark.parametrize("link", [128, 256, 1024])
+def test_simulated_evacuation(link):
+    static = evacuate(evacuation_vms(), link)
+    scheduled = evacuate(evacuation_vms(), link, mbw.Scheduler())
+    log.info("Evacuation time with %d MiB/s link: static=%ds scheduled=%ds",
+             link, static, scheduled)
+    assert scheduled < static
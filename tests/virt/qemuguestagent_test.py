@@ -30,6 +30,7 @@ import logging
 import pytest
 
 from vdsm import utils
+from vdsm.common.time import monotonic_time
 from vdsm.virt import qemuguestagent
 
 from testlib import make_config
@@ -99,6 +100,9 @@ def _fake_qemuAgentCommand(domain, command, timeout, flags):
 
 
 class FakeDomain(object):
+    def __init__(self):
+        self.guest_info_types = []
+
     def interfaceAddresses(self, source):
         if source != libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_AGENT:
             return None
@@ -114,6 +118,7 @@ class FakeDomain(object):
         return ifdata
 
     def guestInfo(self, types, flags):
+        self.guest_info_types.append(types)
         return {
             'user.count': 2,
             'user.0.name': 'root',
@@ -167,6 +172,13 @@ class FakeVM(object):
     def __init__(self):
         self._dom = FakeDomain()
         self.guestAgent = FakeGuestAgent()
+        self.start_time = 0
+
+    def isDomainRunning(self):
+        return True
+
+    def last_disk_hotplug(self):
+        return None
 
     @property
     def id(self):
@@ -269,6 +281,23 @@ class QemuGuestAgentTests(TestCaseBase):
         assert self.qga_poller.get_guest_info(
             "99999999-9999-9999-9999-999999999999") is None
 
+    def test_guest_info_snapshot(self):
+        """ Updates replace the snapshot returned earlier. """
+        self.qga_poller.update_guest_info(self.vm.id, {"a": 1})
+        info1 = self.qga_poller.get_guest_info(self.vm.id)
+        assert self.qga_poller.get_guest_info(self.vm.id) is info1
+        self.qga_poller.update_guest_info(self.vm.id, {"b": 2})
+        info2 = self.qga_poller.get_guest_info(self.vm.id)
+        assert info1 == {"a": 1}
+        assert info2 == {"a": 1, "b": 2}
+
+    def test_caps_snapshot(self):
+        """ Stored capabilities are not affected by the caller. """
+        caps = {"version": "1.0", "commands": ["foo"]}
+        self.qga_poller.update_caps(self.vm.id, caps)
+        caps["commands"].append("bar")
+        assert self.qga_poller.get_caps(self.vm.id)["commands"] == ["foo"]
+
     def test_capability_check(self):
         self.qga_poller.update_caps(
             self.vm.id,
@@ -384,3 +413,66 @@ class QemuGuestAgentTests(TestCaseBase):
         with pytest.raises(TypeError):
             self.qga_poller.channel_state_changed(
                 self.vm.id, 'abc', 0)
+
+    def test_throttling_interval(self):
+        vm_id = self.vm.id
+        assert self.qga_poller.throttling_interval(vm_id) == 0
+        intervals = []
+        for i in range(7):
+            self.qga_poller.set_failure(vm_id)
+            intervals.append(self.qga_poller.throttling_interval(vm_id))
+        assert intervals == [60, 120, 240, 480, 960, 960, 960]
+        self.qga_poller.reset_failure(vm_id)
+        assert self.qga_poller.throttling_interval(vm_id) == 0
+
+    def test_due_commands(self):
+        poller = self.qga_poller
+        vm_id = self.vm.id
+        caps = poller.get_caps(vm_id)
+        now = 1000
+        period = poller._period
+        users = qemuguestagent.VIR_DOMAIN_GUEST_INFO_USERS
+        users_period = qemuguestagent._QEMU_COMMAND_PERIODS[users]
+        hostname = qemuguestagent.VIR_DOMAIN_GUEST_INFO_HOSTNAME
+        for command in qemuguestagent._QEMU_COMMANDS:
+            poller.set_last_check(vm_id, command, now)
+        assert poller._due_commands(self.vm, caps, now) == 0
+
+        # Users are due before the next run, hostname is not.
+        poller.set_last_check(vm_id, users, now - users_period + period - 1)
+        poller.set_last_check(vm_id, hostname, now - period)
+        assert poller._due_commands(self.vm, caps, now) == users
+
+    def test_poll_commands_batched(self):
+        poller = self.qga_poller
+        vm_id = self.vm.id
+        poller.set_last_check(
+            vm_id, qemuguestagent.VDSM_GUEST_INFO, monotonic_time())
+        poller._poll(self.vm)
+
+        # All the libvirt guest info types are queried in one call.
+        assert len(self.vm._dom.guest_info_types) == 1
+        types = self.vm._dom.guest_info_types[0]
+        assert types & qemuguestagent.VIR_DOMAIN_GUEST_INFO_USERS
+        assert types & qemuguestagent.VIR_DOMAIN_GUEST_INFO_HOSTNAME
+        assert not types & qemuguestagent.VDSM_GUEST_INFO_NETWORK
+        assert poller.get_guest_info(vm_id)['username'] == \
+            'root, frodo@hobbits'
+        assert 'netIfaces' in poller.get_guest_info(vm_id)
+
+        stats = poller.poll_stats(vm_id)
+        assert stats['latency'] >= 0
+        assert stats['staleness'] >= 0
+
+        # Nothing is due on the next poll.
+        poller._poll(self.vm)
+        assert len(self.vm._dom.guest_info_types) == 1
+
+    def test_poll_resets_failures(self):
+        poller = self.qga_poller
+        vm_id = self.vm.id
+        poller.set_failure(vm_id)
+        # Make the VM runnable again.
+        poller._last_failure[vm_id] -= qemuguestagent._THROTTLING_INTERVAL
+        poller._poll(self.vm)
+        assert poller.throttling_interval(vm_id) == 0
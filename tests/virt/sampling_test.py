@@ -24,11 +24,14 @@ from __future__ import division
 import itertools
 import threading
 
+import libvirt
+
 from vdsm.virt import sampling
 from vdsm import numa
 
-from monkeypatch import MonkeyPatchScope
+from monkeypatch import MonkeyPatch, MonkeyPatchScope
 
+from testlib import make_config
 from testlib import permutations, expandPermutations
 from testlib import VdsmTestCase as TestCaseBase
 
@@ -206,11 +209,138 @@ class StatsCacheTests(TestCaseBase):
         assert res.is_empty()
         assert res.stats_age == 100
 
+    def test_get_groups(self):
+        fast = libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+        slow = libvirt.VIR_DOMAIN_STATS_BLOCK
+        self.cache.put({'a': {'cpu.time': 1}}, 1, fast)
+        self.cache.put({'a': {'block.count': 1}}, 2, slow)
+        self.cache.put({'a': {'cpu.time': 2}}, 3, fast)
+        self.cache.put({'a': {'cpu.time': 3}}, 4, fast)
+        self.cache.put({'a': {'block.count': 2}}, 5, slow)
+        self.fake_monotonic_time.freeze(value=6)
+
+        res = self.cache.get('a')
+        assert res.first_value == {'cpu.time': 2, 'block.count': 1}
+        assert res.last_value == {'cpu.time': 3, 'block.count': 2}
+        assert res.intervals == {fast: 1, slow: 3}
+        # The age of the oldest group.
+        assert res.stats_age == 2
+
+    @MonkeyPatch(sampling, 'config', make_config([
+        ('vars', 'vm_command_timeout', '10'),
+        ('vars', 'vm_sample_interval', '1'),
+        ('vars', 'vm_sample_vcpu_interval', '1'),
+        ('vars', 'vm_sample_block_interval', '1'),
+    ]))
+    def test_get_groups_stale(self):
+        fast = libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+        slow = libvirt.VIR_DOMAIN_STATS_BLOCK
+        self.cache.put({'a': {'block.count': 1}}, 1, slow)
+        self.cache.put({'a': {'block.count': 2}}, 2, slow)
+        self.cache.put({'a': {'cpu.time': 1}}, 19, fast)
+        self.cache.put({'a': {'cpu.time': 2}}, 20, fast)
+
+        # Slow stats are stuck, but not stale yet.
+        self.fake_monotonic_time.freeze(value=12)
+        res = self.cache.get('a')
+        assert res.last_value == {'cpu.time': 2, 'block.count': 2}
+        assert res.stats_age == 10
+
+        # Slow stats are stale.
+        self.fake_monotonic_time.freeze(value=21)
+        res = self.cache.get('a')
+        assert res.last_value == {'cpu.time': 2}
+        assert res.intervals == {fast: 1}
+        assert res.stats_age == 19
+
+        res = self.cache.get_batch()
+        assert res['a'].last_value == {'cpu.time': 2}
+
+    @MonkeyPatch(sampling, 'config', make_config([
+        ('vars', 'vm_command_timeout', '10'),
+        ('vars', 'vm_sample_interval', '1'),
+        ('vars', 'vm_sample_vcpu_interval', '1'),
+        ('vars', 'vm_sample_block_interval', '20'),
+    ]))
+    def test_get_groups_slow_interval(self):
+        fast = sampling.BULK_STATS_TYPES & ~libvirt.VIR_DOMAIN_STATS_BLOCK
+        slow = libvirt.VIR_DOMAIN_STATS_BLOCK
+        self.cache.put({'a': {'block.count': 1}}, 1, slow)
+        self.cache.put({'a': {'block.count': 2}}, 21, slow)
+        self.cache.put({'a': {'cpu.time': 1}}, 39, fast)
+        self.cache.put({'a': {'cpu.time': 2}}, 40, fast)
+
+        # Slow stats are older than timeout, but sampled on time.
+        self.fake_monotonic_time.freeze(value=40)
+        res = self.cache.get('a')
+        assert res.last_value == {'cpu.time': 2, 'block.count': 2}
+        assert res.stats_age == 0
+
+        # Slow stats are late by more than timeout.
+        self.cache.put({'a': {'cpu.time': 3}}, 55, fast)
+        self.fake_monotonic_time.freeze(value=55)
+        res = self.cache.get('a')
+        assert res.last_value == {'cpu.time': 3}
+        assert res.stats_age == 15
+
+    def test_get_groups_not_enough_samples(self):
+        fast = libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+        slow = libvirt.VIR_DOMAIN_STATS_BLOCK
+        self.cache.put({'a': {'cpu.time': 1}}, 1, fast)
+        self.cache.put({'a': {'block.count': 1}}, 2, slow)
+        self.cache.put({'a': {'cpu.time': 2}}, 3, fast)
+
+        # Slow stats are not available yet.
+        res = self.cache.get('a')
+        assert res.first_value == {'cpu.time': 1}
+        assert res.last_value == {'cpu.time': 2}
+        assert res.intervals == {fast: 2}
+
+    def test_get_batch_groups(self):
+        fast = libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+        slow = libvirt.VIR_DOMAIN_STATS_BLOCK
+        self.cache.put({'a': {'cpu.time': 1}, 'b': {'cpu.time': 1}}, 1, fast)
+        self.cache.put({'a': {'block.count': 1}}, 2, slow)
+        self.cache.put({'a': {'cpu.time': 2}, 'b': {'cpu.time': 2}}, 3, fast)
+        self.cache.put({'a': {'block.count': 2}}, 4, slow)
+
+        res = self.cache.get_batch()
+        assert sorted(res) == ['a', 'b']
+        assert res['a'].last_value == {'cpu.time': 2, 'block.count': 2}
+        assert res['b'].last_value == {'cpu.time': 2}
+
     def _feed_cache(self, samples):
         for sample in samples:
             self.cache.put(*sample)
 
 
+@pytest.mark.parametrize("intervals,groups", [
+    pytest.param(
+        ('15', '15', '15'),
+        [(sampling.BULK_STATS_TYPES, 15)],
+        id="all together"),
+    pytest.param(
+        ('15', '15', '30'),
+        [(sampling.BULK_STATS_TYPES & ~libvirt.VIR_DOMAIN_STATS_BLOCK, 15),
+         (libvirt.VIR_DOMAIN_STATS_BLOCK, 30)],
+        id="slow block"),
+    pytest.param(
+        ('15', '60', '60'),
+        [(libvirt.VIR_DOMAIN_STATS_VCPU | libvirt.VIR_DOMAIN_STATS_BLOCK, 60),
+         (sampling.BULK_STATS_TYPES & ~(libvirt.VIR_DOMAIN_STATS_VCPU |
+                                        libvirt.VIR_DOMAIN_STATS_BLOCK), 15)],
+        id="slow vcpu and block"),
+])
+def test_stats_groups(monkeypatch, intervals, groups):
+    default, vcpu, block = intervals
+    monkeypatch.setattr(sampling, 'config', make_config([
+        ('vars', 'vm_sample_interval', default),
+        ('vars', 'vm_sample_vcpu_interval', vcpu),
+        ('vars', 'vm_sample_block_interval', block),
+    ]))
+    assert sampling.stats_groups() == sorted(groups)
+
+
 class NumaNodeMemorySampleTests(TestCaseBase):
 
     def _monkeyPatchedMemorySample(self, freeMemory, totalMemory):
@@ -568,6 +568,7 @@ class FakeVM(Vm):
 
     def __init__(self, drive_infos):
         self._dom = FakeDomain()
+        self._domain_generation = 0
         self.cif = FakeClientIF(FakeIRS())
         self.id = 'volume_monitor_vm'
         self.volume_monitor = thinp.VolumeMonitor(self, self.log)
@@ -22,8 +22,10 @@ from __future__ import division
 
 from contextlib import contextmanager
 import io
+import json
 import subprocess
 import tarfile
+import threading
 import time
 import uuid
 import zipfile
@@ -126,6 +128,10 @@ sourceAllocationSettingData">
 </Envelope>"""
 
 
+def _fail_block_info(source, flags=0):
+    raise fake.Error(libvirt.VIR_ERR_INTERNAL_ERROR, "blockInfo failed")
+
+
 @contextmanager
 def temporary_ovf_dir():
     with namedTemporaryDir() as base:
@@ -175,6 +181,7 @@ class v2vTests(TestCaseBase):
 
     def tearDown(self):
         v2v._jobs.clear()
+        v2v._vms_cache.clear()
 
     def testGetExternalVMs(self):
         def _connect(uri, username, passwd):
@@ -221,6 +228,126 @@ class v2vTests(TestCaseBase):
             self._assertVmMatchesSpec(vm, spec)
             self._assertVmDisksMatchSpec(vm, spec)
 
+    def testGetExternalVMsOrder(self):
+        opened = []
+
+        def _connect(uri, username, passwd):
+            conn = MockVirConnect(vms=self._vms)
+            opened.append(conn)
+            return conn
+
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _connect)]):
+            vms = v2v.get_external_vms('esx://mydomain', 'user',
+                                       ProtectedPassword('password'),
+                                       None)['vmList']
+
+        assert [vm['vmName'] for vm in vms] == \
+            [spec.name for spec in VM_SPECS]
+        assert 1 <= len(opened) <= len(VM_SPECS)
+
+    def testGetExternalVMsCached(self):
+        def _connect(uri, username, passwd):
+            return MockVirConnect(vms=self._vms)
+
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _connect)]):
+            v2v.get_external_vms('esx://mydomain', 'user',
+                                 ProtectedPassword('password'), None)
+
+            # Disks information of unmodified VMs is not fetched again.
+            for vm in self._vms:
+                vm.blockInfo = _fail_block_info
+            self._vms[0]._active = False
+
+            vms = v2v.get_external_vms('esx://mydomain', 'user',
+                                       ProtectedPassword('password'),
+                                       None)['vmList']
+
+        assert len(vms) == len(VM_SPECS)
+        for vm, spec in zip(vms, VM_SPECS):
+            self._assertVmDisksMatchSpec(vm, spec)
+        assert vms[0]['status'] == 'Down'
+
+    def testConnectionPoolSize(self):
+        main = MockVirConnect(vms=self._vms)
+        opened = []
+
+        def _connect(uri, username, passwd):
+            time.sleep(0.1)
+            conn = MockVirConnect(vms=self._vms)
+            opened.append(conn)
+            return conn
+
+        pool = v2v._ConnectionPool(main, 'esx://mydomain', 'user',
+                                   'password', 2)
+
+        def use():
+            with pool.connection():
+                time.sleep(0.05)
+
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _connect)]):
+            threads = [threading.Thread(target=use) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        # The main connection and a single opened connection.
+        assert len(opened) == 1
+
+    def testConnectionPoolOpenFailed(self):
+        main = MockVirConnect(vms=self._vms)
+        opened = []
+
+        def _fail(uri, username, passwd):
+            # Another caller returns the main connection meanwhile.
+            pool._idle.put(main)
+            raise fake.Error(libvirt.VIR_ERR_INTERNAL_ERROR, "open failed")
+
+        def _connect(uri, username, passwd):
+            conn = MockVirConnect(vms=self._vms)
+            opened.append(conn)
+            return conn
+
+        pool = v2v._ConnectionPool(main, 'esx://mydomain', 'user',
+                                   'password', 2)
+        assert pool._get() is main
+
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _fail)]):
+            # Opening fails, so we wait for an idle connection.
+            assert pool._get() is main
+
+        # The slot of the failed connection can be used again.
+        assert pool._reserved == 0
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _connect)]):
+            assert pool._get() is opened[0]
+
+    def testGetExternalVMsModified(self):
+        def _connect(uri, username, passwd):
+            return MockVirConnect(vms=self._vms)
+
+        with MonkeyPatchScope([(libvirtconnection, 'open_connection',
+                                _connect)]):
+            v2v.get_external_vms('esx://mydomain', 'user',
+                                 ProtectedPassword('password'), None)
+
+            # Modifying the VM changes its xml.
+            self._vms[4]._mac_address = '52:54:00:00:00:01'
+            for vm in self._vms:
+                vm.blockInfo = _fail_block_info
+
+            vms = v2v.get_external_vms('esx://mydomain', 'user',
+                                       ProtectedPassword('password'),
+                                       None)['vmList']
+
+        # VM 4 disks information cannot be fetched now.
+        assert [vm['vmName'] for vm in vms] == \
+            [spec.name for spec in VM_SPECS if spec.id != 4]
+
     def testGetExternalVMNames(self):
         def _connect(uri, username, passwd):
             return MockVirConnect(vms=self._vms)
@@ -743,6 +870,156 @@ class TestGetOVAInfo(TestCaseBase):
         assert network['dev'] == 'Ethernet 1'
 
 
+STREAM_OVF = u"""<?xml version="1.0" encoding="UTF-8"?>
+<Envelope xmlns="http://schemas.dmtf.org/ovf/envelope/1"
+          xmlns:ovf="http://schemas.dmtf.org/ovf/envelope/1">
+  <References>
+    <File ovf:href="images/disk1" ovf:id="file1" ovf:size="1024"/>
+    <File ovf:href="images/disk2" ovf:id="file2" ovf:size="3072"/>
+  </References>
+  <DiskSection>
+    <Disk ovf:capacity="1024" ovf:fileRef="file1"
+        ovf:format="http://en.wikipedia.org/wiki/Byte"/>
+    <Disk ovf:capacity="3072" ovf:fileRef="file2"
+        ovf:format="http://www.gnome.org/~markmc/qcow-image-format.html"/>
+  </DiskSection>
+</Envelope>"""
+
+
+class FakeOperation(object):
+
+    def __init__(self, job, src, dst):
+        self.job = job
+        self.src = src
+        self.dst = dst
+        self.progress = 0.0
+        self.job_progress = []
+
+    def run(self):
+        self.job_progress.append(self.job.progress)
+        self.progress = 50.0
+        self.job_progress.append(self.job.progress)
+        self.progress = 100.0
+
+    def abort(self):
+        pass
+
+
+class TestOvaStream(TestCaseBase):
+
+    def setUp(self):
+        self.vminfo = {
+            'vmName': 'First',
+            'poolID': str(uuid.uuid4()),
+            'domainID': str(uuid.uuid4()),
+            'streaming': True,
+            'format': 'cow',
+            'disks': [{'imageID': str(uuid.uuid4()),
+                       'volumeID': str(uuid.uuid4())} for i in range(2)],
+        }
+
+    def tearDown(self):
+        v2v._jobs.clear()
+
+    @contextmanager
+    def temporary_ova(self):
+        with namedTemporaryDir() as base:
+            files = {
+                'vm.ovf': STREAM_OVF.encode('utf-8'),
+                'images/disk1': b'1' * 1024,
+                'images/disk2': b'2' * 3072,
+            }
+            ovapath = os.path.join(base, 'vm.ova')
+            with tarfile.open(ovapath, 'w') as tar:
+                for name, data in sorted(files.items()):
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            yield base, ovapath, files
+
+    def test_index(self):
+        with self.temporary_ova() as (base, ovapath, files):
+            members = v2v._index_tar_ova(ovapath)
+            assert sorted(m.name for m in members) == sorted(files)
+            with open(ovapath, 'rb') as f:
+                for m in members:
+                    f.seek(m.offset)
+                    assert f.read(m.size) == files[m.name]
+
+            ovf = v2v._read_ovf_from_ova_index(ovapath, members)
+            disks = v2v._ova_disks(ovf, members)
+            assert [(m.name, fmt) for m, fmt in disks] == [
+                ('images/disk1', 'raw'),
+                ('images/disk2', 'qcow2'),
+            ]
+
+    def test_index_compressed(self):
+        with self.temporary_ova() as (base, ovapath, files):
+            gzpath = os.path.join(base, 'vm.ova.gz')
+            with tarfile.open(gzpath, 'w:gz') as tar:
+                tar.add(ovapath, arcname='vm.ova')
+            with pytest.raises(v2v.ClientError):
+                v2v._index_tar_ova(gzpath)
+
+    @MonkeyPatch(v2v, '_VIRT_V2V', FAKE_VIRT_V2V)
+    def test_import(self):
+        operations = []
+
+        def convert(src, dst, srcFormat=None, dstFormat=None, create=True):
+            assert dstFormat == 'qcow2'
+            assert not create
+            op = FakeOperation(job, (src, srcFormat), dst)
+            operations.append(op)
+            return op
+
+        with self.temporary_ova() as (base, ovapath, files), \
+                MonkeyPatchScope([(v2v, '_V2V_DIR', base),
+                                  (v2v.qemuimg, 'convert', convert)]):
+            job_id = str(uuid.uuid4())
+            command = v2v.OvaStreamCommand(ovapath, self.vminfo, job_id,
+                                           FakeIRS())
+            job = v2v.OvaStreamImport(job_id, command)
+            job.start()
+            job.wait()
+
+            assert job.status == v2v.STATUS.DONE
+            assert job.progress == 100
+            # Progress is weighted by the disks size.
+            assert [op.job_progress for op in operations] == \
+                [[0, 12], [25, 62]]
+
+            members = {m.name: m for m in v2v._index_tar_ova(ovapath)}
+            for op, name, fmt, disk in zip(
+                    operations, ('images/disk1', 'images/disk2'),
+                    ('raw', 'qcow2'), self.vminfo['disks']):
+                src, src_format = op.src
+                assert src_format == fmt
+                assert json.loads(src[len('json:'):]) == {
+                    'file': {
+                        'driver': 'raw',
+                        'offset': members[name].offset,
+                        'size': members[name].size,
+                        'file': {'driver': 'file', 'filename': ovapath},
+                    },
+                }
+                assert op.dst.endswith(disk['volumeID'])
+
+            # The OVA ovf is the converted VM ovf.
+            assert v2v._read_ovf(job_id) == STREAM_OVF
+
+    @MonkeyPatch(v2v, '_VIRT_V2V', FAKE_VIRT_V2V)
+    def test_import_disks_mismatch(self):
+        del self.vminfo['disks'][1]
+        with self.temporary_ova() as (base, ovapath, files):
+            job_id = str(uuid.uuid4())
+            command = v2v.OvaStreamCommand(ovapath, self.vminfo, job_id,
+                                           FakeIRS())
+            job = v2v.OvaStreamImport(job_id, command)
+            job.start()
+            job.wait()
+            assert job.status == v2v.STATUS.FAILED
+
+
 class UtilsTests(TestCaseBase):
     def test_units_parser(self):
         assert v2v._parse_allocation_units("byte") == 1
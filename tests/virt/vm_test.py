@@ -27,6 +27,7 @@ import logging
 import os.path
 import threading
 import time
+import types
 import uuid
 
 from contextlib import contextmanager
@@ -1036,6 +1037,15 @@ _VM_PARAMS = {'displayPort': -1, 'displaySecurePort': -1,
               'vmType': 'kvm', 'memSize': 1024}
 
 
+def _read_only(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType(
+            {k: _read_only(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_read_only(v) for v in value)
+    return value
+
+
 class TestVmStats(TestCaseBase):
 
     def testGetNicStats(self):
@@ -1097,6 +1107,41 @@ class TestVmStats(TestCaseBase):
             testvm.guestAgent.diskMappingHash += 1
             assert res['hash'] != testvm.getStats()['hash']
 
+    def testBalloonStatsKeepGuestInfo(self):
+        with fake.VM(_VM_PARAMS) as testvm:
+            # The guest agent returns a shallow copy of its state.
+            guest_info = testvm.guestAgent.getGuestInfo()
+            guest_info['memoryStats'] = {'mem_total': '42'}
+            balloon_stats = {'memoryStats': {'mem_free': '1024'}}
+            with MonkeyPatchScope([
+                (testvm, '_getRunningVmStats', lambda: balloon_stats),
+                (testvm.guestAgent, 'getGuestInfo',
+                 lambda: dict(guest_info)),
+            ]):
+                res = testvm.getStats()
+            assert res['memoryStats'] == {
+                'mem_total': '42', 'mem_free': '1024'}
+            assert guest_info['memoryStats'] == {'mem_total': '42'}
+
+    def testGuestInfoNotModified(self):
+        with fake.VM(_VM_PARAMS) as testvm:
+            guest_info = testvm.guestAgent.getGuestInfo()
+            guest_info['memoryStats'] = {'mem_total': '42'}
+            guest_info['appsList'] = ['kernel-5.14']
+            guest_info['netIfaces'] = [
+                {'name': 'eth0', 'inet': ['192.0.2.1'], 'inet6': []}]
+            # The values are shared with the guest agent, so modifying them
+            # raises.
+            shared = {k: _read_only(v) for k, v in guest_info.items()}
+            balloon_stats = {'memoryStats': {'mem_free': '1024'}}
+            with MonkeyPatchScope([
+                (testvm, '_getRunningVmStats', lambda: balloon_stats),
+                (testvm.guestAgent, 'getGuestInfo', lambda: dict(shared)),
+            ]):
+                res = testvm.getStats()
+            assert res['memoryStats'] == {
+                'mem_total': '42', 'mem_free': '1024'}
+
     @MonkeyPatch(vm, 'config',
                  make_config([('vars', 'vm_command_timeout', '10')]))
     def testMonitorTimeoutResponsive(self):
@@ -1180,6 +1225,25 @@ class TestLibVirtCallbacks(TestCaseBase):
             assert set([d.alias for group in testvm._devices.values()
                         for d in group]) == kept_aliases
 
+    def test_onDeviceRemoved_domain_descriptor(self):
+        devices = '''
+<interface type='bridge'>
+  <alias name="net1"/>
+  <mac address='00:11:22:33:44:55'/>
+  <source bridge='ovirtmgmt'/>
+  <model type='virtio'/>
+</interface>
+'''
+        with fake.VM(_VM_PARAMS, xmldevices=devices,
+                     create_device_objects=True) as testvm:
+
+            def updateDomainDescriptor(*args):
+                raise AssertionError("Domain XML should not be read")
+
+            testvm._updateDomainDescriptor = updateDomainDescriptor
+            testvm.onDeviceRemoved('net1')
+            assert not list(testvm._domain.get_device_elements('interface'))
+
 
 class TestVmStatusTransitions(TestCaseBase):
     @pytest.mark.slow
@@ -90,6 +90,16 @@ class IRS(object):
 
     def prepareImage(
             self, sdUUID, spUUID, imgUUID, leafUUID, allowIllegal=False):
+        return self._prepare_image(sdUUID, imgUUID, leafUUID)
+
+    def prepareImages(self, images):
+        results = [
+            self._prepare_image(img["sdUUID"], img["imgUUID"], img["leafUUID"])
+            for img in images
+        ]
+        return response.success(images=results)
+
+    def _prepare_image(self, sdUUID, imgUUID, leafUUID):
         key = (sdUUID, imgUUID, leafUUID)
         path = "/run/storage/{}/{}/{}".format(sdUUID, imgUUID, leafUUID)
         self.prepared_volumes[key] = {"path": path}
@@ -460,8 +470,9 @@ def default_domain_xml(vm_id='TESTING', features='', devices='', metadata=''):
 domain_descriptor_init = DomainDescriptor.__init__
 
 
-def fake_domain_descriptor_init(self, xmlStr, xml_source=XmlSource.LIBVIRT):
-    domain_descriptor_init(self, xmlStr)
+def fake_domain_descriptor_init(self, xmlStr, xml_source=XmlSource.LIBVIRT,
+                                generation=0):
+    domain_descriptor_init(self, xmlStr, generation=generation)
 
 
 @contextmanager
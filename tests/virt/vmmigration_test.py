@@ -35,6 +35,7 @@ from six.moves import zip
 
 from vdsm.common import exception
 from vdsm.common import response
+from vdsm.common.units import MiB
 from vdsm.config import config
 import vdsm.virt
 from vdsm.virt import cpumanagement
@@ -48,6 +49,7 @@ from testlib import permutations, expandPermutations
 from testlib import make_config
 
 from . import vmfakelib as fake
+import vmfakecon
 import pytest
 
 
@@ -525,6 +527,180 @@ class SourceThreadTests(TestCaseBase):
         assert src.tunneled
 
 
+def migration_job_stats(remaining, bps, iteration):
+    stats = {
+        'type': libvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+        libvirt.VIR_DOMAIN_JOB_TIME_ELAPSED: 1000,
+        libvirt.VIR_DOMAIN_JOB_DATA_TOTAL: 1024 * MiB,
+        libvirt.VIR_DOMAIN_JOB_DATA_PROCESSED: 1024 * MiB - remaining,
+        libvirt.VIR_DOMAIN_JOB_DATA_REMAINING: remaining,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_TOTAL: 1024 * MiB,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_PROCESSED: 1024 * MiB - remaining,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_REMAINING: remaining,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_BPS: bps,
+        'memory_dirty_rate': 100,
+        'memory_iteration': iteration,
+    }
+    if getattr(libvirt, 'VIR_DOMAIN_JOB_OPERATION_MIGRATION_OUT', None):
+        stats['operation'] = libvirt.VIR_DOMAIN_JOB_OPERATION_MIGRATION_OUT
+    return stats
+
+
+class MonitoredVM(FakeVM):
+
+    def __init__(self, job_stats):
+        super(MonitoredVM, self).__init__(FakeMigratingDomain())
+        self._job_stats = list(job_stats)
+
+    def job_stats(self):
+        stats = self._job_stats.pop(0)
+        if isinstance(stats, Exception):
+            raise stats
+        return stats
+
+    def send_migration_status_event(self):
+        pass
+
+
+class FakeMonitorService(object):
+
+    def __init__(self):
+        self.monitors = []
+        self.wakeups = 0
+
+    def add(self, monitor):
+        self.monitors.append(monitor)
+
+    def wakeup(self, monitor):
+        self.wakeups += 1
+
+
+def conv_schedule():
+    return {
+        'init': [{'name': 'setDowntime', 'params': ['100']}],
+        'stalling': [
+            {'action': {'name': 'setDowntime', 'params': ['200']},
+             'limit': 10},
+            {'action': {'name': 'abort', 'params': []}, 'limit': -1},
+        ],
+    }
+
+
+class TestMigrationMonitor(object):
+
+    @pytest.fixture(autouse=True)
+    def interval(self, monkeypatch):
+        monkeypatch.setattr(
+            migration.MonitorThread, '_MIGRATION_MONITOR_INTERVAL', 10)
+
+    def test_adaptive_interval(self):
+        vm = MonitoredVM([
+            migration_job_stats(100 * MiB, MiB, 1),
+            migration_job_stats(5 * MiB, MiB, 2),
+            migration_job_stats(MiB // 10, MiB, 3),
+            migration_job_stats(MiB // 10, MiB, 4),
+            vmfakecon.Error(libvirt.VIR_ERR_OPERATION_INVALID),
+        ])
+        service = FakeMonitorService()
+        monitor = migration.MonitorThread(
+            vm, 0, conv_schedule(), service=service)
+        monitor.start()
+        assert service.monitors == [monitor]
+
+        # Initial actions.
+        assert monitor.check() == 10
+
+        # Far from converging.
+        assert monitor.check() == 10
+        # Polling faster when about to converge.
+        assert monitor.check() == 5
+        assert monitor.check() == migration._MIN_MONITOR_INTERVAL
+
+        # Iteration events make the adaptive polling unneeded.
+        monitor.on_iteration(4)
+        assert service.wakeups == 1
+        assert monitor.check() == 10
+
+        # Migration finished.
+        assert monitor.check() is None
+        monitor.join()
+
+        assert [s.data_remaining for s in monitor.history] == [
+            100 * MiB, 5 * MiB, MiB // 10, MiB // 10]
+        assert monitor.progress.mem_iteration == 4
+
+    def test_stop(self):
+        service = FakeMonitorService()
+        monitor = migration.MonitorThread(
+            MonitoredVM([]), 0, conv_schedule(), service=service)
+        monitor.start()
+        monitor.stop()
+        assert service.wakeups == 1
+        assert monitor.check() is None
+        monitor.join()
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(
+            migration.MonitorThread, '_MIGRATION_MONITOR_INTERVAL', 0)
+        service = FakeMonitorService()
+        monitor = migration.MonitorThread(
+            MonitoredVM([]), 0, conv_schedule(), service=service)
+        monitor.start()
+        assert service.monitors == []
+        monitor.join()
+
+
+class CountingMonitor(object):
+
+    def __init__(self, checks, interval):
+        self.checks = checks
+        self.interval = interval
+        self.calls = 0
+        self.done = threading.Event()
+
+    def check(self):
+        self.calls += 1
+        if self.calls == self.checks:
+            self.done.set()
+            return None
+        return self.interval
+
+
+class TestMonitorService(object):
+
+    def test_monitors_share_thread(self):
+        service = migration.MonitorService(name='test/migmon')
+        monitors = [CountingMonitor(5, 0.01) for i in range(3)]
+        for m in monitors:
+            service.add(m)
+        for m in monitors:
+            assert m.done.wait(5)
+            assert m.calls == 5
+
+    def test_wakeup(self):
+        service = migration.MonitorService(name='test/migmon')
+        monitor = CountingMonitor(2, 60)
+        service.add(monitor)
+        # Wait for the first check, scheduling the next one in a minute.
+        for _ in range(100):
+            if monitor.calls == 1:
+                break
+            threading.Event().wait(0.05)
+        service.wakeup(monitor)
+        assert monitor.done.wait(5)
+
+    def test_thread_exits_when_idle(self):
+        service = migration.MonitorService(name='test/migmon')
+        monitor = CountingMonitor(1, 0)
+        service.add(monitor)
+        assert monitor.done.wait(5)
+        for _ in range(100):
+            if service._thread is None:
+                break
+            threading.Event().wait(0.05)
+        assert service._thread is None
+
+
 # stolen^Wborrowed from itertools recipes
 def pairwise(iterable):
     "s -> (s0,s1), (s1,s2), (s2, s3), ..."